@@ -25,6 +25,11 @@ from .db_tables.daily_transaction_count_by_gas_burnt_ranges import (
 )
 from .db_tables.daily_transactions_count import DailyTransactionsCount
 from .db_tables.deployed_contracts import DeployedContracts
+from .db_tables.monthly_active_accounts_count import MonthlyActiveAccountsCount
+from .db_tables.monthly_gas_used import MonthlyGasUsed
+from .db_tables.monthly_new_accounts_count import MonthlyNewAccountsCount
+from .db_tables.monthly_tokens_spent_on_fees import MonthlyTokensSpentOnFees
+from .db_tables.monthly_transactions_count import MonthlyTransactionsCount
 from .db_tables.unique_contracts import UniqueContracts
 from .db_tables.weekly_active_accounts_count import WeeklyActiveAccountsCount
 from .db_tables.near_ecosystem_entities import NearEcosystemEntities
@@ -8,6 +8,12 @@ import psycopg2
 class BaseAggregations(abc.ABC):
     analytics_connection: psycopg2.extensions.connection
     indexer_connection: psycopg2.extensions.connection
+    # Compute the aggregation from other tables in Analytics DB if it's possible,
+    # see `ROLLUP_DEPENDENCIES`
+    rollup: bool = False
+    # Create the table partitioned by months if the aggregation supports it,
+    # see `PARTITION_COLUMN` in `PeriodicAggregations`
+    partitioned: bool = False
 
     # Collects the aggregations for the requested_timestamp.
     # If it's not possible to compute aggregations for given requested_timestamp,
@@ -19,8 +25,10 @@ class BaseAggregations(abc.ABC):
     def collect(self, requested_timestamp: int) -> list:
         pass
 
+    # Stores the values returned by `collect` (or any iterable of such values).
+    # Returns the number of the stored values
     @abc.abstractmethod
-    def store(self, parameters: list):
+    def store(self, parameters: list) -> int:
         pass
 
     @abc.abstractmethod
@@ -34,3 +42,15 @@ class BaseAggregations(abc.ABC):
 
 # Be careful, don't create circular dependencies
 BaseAggregations.DEPENDENCIES = []
+# The tables in Analytics DB the aggregation is computed from in `rollup` mode.
+# They are the dependencies of the aggregation only in `rollup` mode
+BaseAggregations.ROLLUP_DEPENDENCIES = []
+
+# Set to False if the stored data depends on the order the periods are stored in
+# (e.g. we keep only the first appearance of the contract).
+# Such aggregations are never backfilled in parallel
+BaseAggregations.ORDER_INDEPENDENT = True
+
+# Aggregations reading the same Indexer DB table for the same period could share one query,
+# see `scan_groups.py`
+BaseAggregations.SCAN_GROUP = None
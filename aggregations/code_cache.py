@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import typing
+import zlib
+
+"""
+Local content-addressed cache of the contract code, keyed by `contract_code_sha256`.
+The same code is usually deployed many times, and the archival RPC is slow and rate-limited,
+so `unique_contracts` rebuild should not download everything again.
+The content is checked against the key on each read and write, the broken files are removed.
+The least recently used files are evicted when the cache is bigger than `max_size_bytes`.
+"""
+
+_BASE58_ALPHABET = b"123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_COMPRESSED_SUFFIX = ".z"
+
+
+class ContractCodeCache:
+    def __init__(
+        self,
+        directory: str,
+        max_size_bytes: typing.Optional[int] = None,
+        compress: bool = True,
+    ):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.compress = compress
+        self._lock = threading.Lock()
+        # path -> size, in the order of the last use (the oldest first), loaded lazily
+        self._entries: typing.Optional[typing.Dict[str, int]] = None
+        os.makedirs(directory, exist_ok=True)
+
+    # The cache configured by the environment, None if `CONTRACT_CODE_CACHE_DIR` is not set
+    @classmethod
+    def from_env(cls) -> typing.Optional["ContractCodeCache"]:
+        directory = os.getenv("CONTRACT_CODE_CACHE_DIR")
+        if not directory:
+            return None
+        max_size_bytes = os.getenv("CONTRACT_CODE_CACHE_MAX_BYTES")
+        return cls(
+            directory,
+            max_size_bytes=int(max_size_bytes) if max_size_bytes else None,
+            compress=os.getenv("CONTRACT_CODE_CACHE_COMPRESS", "1") != "0",
+        )
+
+    def get(self, contract_code_sha256: str) -> typing.Optional[bytes]:
+        for path in self._paths(contract_code_sha256):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                code = (
+                    zlib.decompress(data) if path.endswith(_COMPRESSED_SUFFIX) else data
+                )
+            except FileNotFoundError:
+                continue
+            except zlib.error:
+                code = None
+            if code is None or not matches_sha256(code, contract_code_sha256):
+                print(f"WARN: Removing broken cache entry {path}")
+                self._remove(path)
+                continue
+            self._touch(path, len(data))
+            return code
+        return None
+
+    # The code not matching the hash is not stored, e.g. the empty code returned for the deleted account
+    def put(self, contract_code_sha256: str, code: bytes):
+        if not matches_sha256(code, contract_code_sha256):
+            return
+        path = self._paths(contract_code_sha256)[0 if self.compress else 1]
+        data = zlib.compress(code) if self.compress else code
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writing to the temporary file first, so the readers never see the partial content
+        fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        self._touch(path, len(data))
+        self._evict()
+
+    def _paths(self, contract_code_sha256: str) -> typing.List[str]:
+        # The key could be base64 with `/` and `+`, so the file is named by the hex digest of the key
+        name = hashlib.sha256(contract_code_sha256.encode()).hexdigest()
+        path = os.path.join(self.directory, name[:2], name)
+        return [path + _COMPRESSED_SUFFIX, path]
+
+    def _load_entries(self) -> typing.Dict[str, int]:
+        if self._entries is None:
+            files = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, path, stat.st_size))
+            self._entries = {path: size for (_, path, size) in sorted(files)}
+        return self._entries
+
+    def _touch(self, path: str, size: int):
+        with self._lock:
+            entries = self._load_entries()
+            entries.pop(path, None)
+            entries[path] = size
+        try:
+            # The modification time keeps the order of the use between the runs
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove(self, path: str):
+        with self._lock:
+            self._load_entries().pop(path, None)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        if self.max_size_bytes is None:
+            return
+        with self._lock:
+            entries = self._load_entries()
+            total_size = sum(entries.values())
+            while total_size > self.max_size_bytes and entries:
+                path = next(iter(entries))
+                total_size -= entries.pop(path)
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+# The hash could come in hex, base58 or base64, depending on the source
+def matches_sha256(code: bytes, contract_code_sha256: str) -> bool:
+    digest = hashlib.sha256(code).digest()
+    return contract_code_sha256 in (
+        digest.hex(),
+        _base58(digest),
+        base64.b64encode(digest).decode(),
+    )
+
+
+def _base58(data: bytes) -> str:
+    number = int.from_bytes(data, "big")
+    result = bytearray()
+    while number:
+        number, remainder = divmod(number, 58)
+        result.append(_BASE58_ALPHABET[remainder])
+    leading_zeros = len(data) - len(data.lstrip(b"\0"))
+    return (_BASE58_ALPHABET[0:1] * leading_zeros + bytes(reversed(result))).decode()
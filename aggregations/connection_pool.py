@@ -0,0 +1,55 @@
+import contextlib
+import psycopg2
+import psycopg2.pool
+
+
+# Bounded pool of connections to one DB.
+# The connections are checked before giving them away, the broken ones are replaced with the new ones.
+# Don't share the pool between the processes, each process should create its own one
+class ConnectionPool:
+    def __init__(self, database_url: str, max_connections: int = 2):
+        self.database_url = database_url
+        self.max_connections = max_connections
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            0, max_connections, database_url
+        )
+
+    # Gives the connection for the time of `with` block.
+    # If the connection is broken inside the block, it will be closed on return.
+    # The unfinished transaction is rolled back on return
+    @contextlib.contextmanager
+    def connection(self):
+        connection = self._get_alive_connection()
+        try:
+            yield connection
+        finally:
+            self._pool.putconn(connection, close=bool(connection.closed))
+
+    def close(self):
+        if not self._pool.closed:
+            self._pool.closeall()
+
+    def _get_alive_connection(self) -> psycopg2.extensions.connection:
+        # All idle connections could be broken at once (e.g. DB restart),
+        # the last attempt is always made with the new connection
+        for _ in range(self.max_connections + 1):
+            connection = self._pool.getconn()
+            if self._is_alive(connection):
+                return connection
+            print("WARN: Replacing broken connection...")
+            self._pool.putconn(connection, close=True)
+        raise psycopg2.OperationalError(
+            f"Could not get the working connection after {self.max_connections + 1} attempts"
+        )
+
+    @staticmethod
+    def _is_alive(connection: psycopg2.extensions.connection) -> bool:
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
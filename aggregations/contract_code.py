@@ -0,0 +1,205 @@
+import atexit
+import base64
+import concurrent.futures
+import multiprocessing
+import near_api
+import random
+import threading
+import time
+import traceback
+import typing
+
+from .code_cache import ContractCodeCache
+from .metrics import METRICS
+from .sdk_type import DEFAULT_CLASSIFIER
+
+"""
+Downloading the contract code from NEAR RPC and detecting the SDK the contract is built with.
+The code is downloaded by the pool of threads (it's I/O), the classification runs in the pool of processes,
+one pool of processes is shared by the whole run.
+"""
+
+# The number of contract codes downloaded from RPC at the same time
+DEFAULT_FETCH_WORKERS = 8
+# The number of processes classifying the contracts, 0 means the classification runs in the current process
+DEFAULT_CLASSIFY_WORKERS = 2
+
+DOWNLOAD_ATTEMPTS = 10
+# The delay before the retry is doubled after each attempt, up to the maximum
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 30
+
+# The number of contracts classified and updated at once by `unique_contracts`
+SDK_TYPE_UPDATE_CHUNK_SIZE = 100
+
+# {the number of workers: the pool}. Starting the spawned processes takes a while,
+# so the pool is created once and reused by all the classifiers of the run
+_classify_pools: typing.Dict[int, concurrent.futures.ProcessPoolExecutor] = {}
+_classify_pools_lock = threading.Lock()
+
+
+class ContractToClassify(typing.NamedTuple):
+    contract_code_sha256: str
+    account_id: str
+    block_hash: str
+
+
+def download_contract_code(
+    near_rpc: near_api.providers.JsonProvider,
+    account_id: str,
+    block_id: str,
+    attempts: int = DOWNLOAD_ATTEMPTS,
+) -> bytes:
+    for attempt in range(attempts):
+        if attempt > 0:
+            delay = min(
+                RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1), RETRY_MAX_DELAY_SECONDS
+            )
+            # The jitter spreads the retries of the parallel downloads
+            time.sleep(delay * random.uniform(0.5, 1))
+            METRICS.increment("contract_code_download_retries_total")
+        try:
+            response = near_rpc.json_rpc(
+                "query",
+                {
+                    "request_type": "view_code",
+                    "account_id": account_id,
+                    "block_id": block_id,
+                },
+            )
+        except near_api.providers.JsonProviderError as e:
+            if e.args[0].get("cause", {}).get("name") == "UNKNOWN_ACCOUNT":
+                return b""
+            print("WARN: Retrying fetching contract code...")
+            traceback.print_exc()
+        except Exception:
+            print("WARN: Retrying fetching contract code...")
+            traceback.print_exc()
+        else:
+            return base64.b64decode(response["code_base64"])
+
+    raise Exception(f"Could not download contract code after {attempts} attempts")
+
+
+# The rules are in `sdk_type.py`
+def get_contract_sdk_type(contract_code: bytes, contract_code_sha256: str) -> str:
+    return DEFAULT_CLASSIFIER.classify(contract_code, contract_code_sha256)
+
+
+# Downloads and classifies the contracts, yields (contract_code_sha256, contract_sdk_type) as soon as they are ready.
+# The contracts we could not download are skipped, they will be picked up next time
+class ContractClassifier:
+    def __init__(
+        self,
+        near_rpc_url: str,
+        fetch_workers: int = DEFAULT_FETCH_WORKERS,
+        classify_workers: int = DEFAULT_CLASSIFY_WORKERS,
+        cache: typing.Optional[ContractCodeCache] = None,
+    ):
+        self.near_rpc_url = near_rpc_url
+        self.cache = cache
+        self._local = threading.local()
+        self._fetch_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=fetch_workers
+        )
+        self._classify_pool = (
+            classify_pool(classify_workers) if classify_workers > 0 else None
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # The classification pool is shared, it's shut down when the run is over
+    def close(self):
+        self._fetch_pool.shutdown()
+
+    def classify(
+        self, contracts: typing.Iterable[ContractToClassify]
+    ) -> typing.Iterator[typing.Tuple[str, str]]:
+        downloads = {
+            self._fetch_pool.submit(self._download, contract): contract
+            for contract in contracts
+        }
+        classifications = {}
+        for download in concurrent.futures.as_completed(downloads):
+            contract = downloads[download]
+            try:
+                contract_code = download.result()
+            except Exception:
+                print(
+                    f"WARN: Skipping contract {contract.account_id} at block {contract.block_hash}"
+                )
+                traceback.print_exc()
+                continue
+            if self._classify_pool is None:
+                yield contract.contract_code_sha256, get_contract_sdk_type(
+                    contract_code, contract.contract_code_sha256
+                )
+                continue
+            classifications[
+                self._classify_pool.submit(
+                    get_contract_sdk_type, contract_code, contract.contract_code_sha256
+                )
+            ] = contract
+        for classification in concurrent.futures.as_completed(classifications):
+            try:
+                contract_sdk_type = classification.result()
+            except concurrent.futures.process.BrokenProcessPool:
+                # The broken pool refuses all the tasks, the next classifier gets the new one
+                discard_classify_pool(self._classify_pool)
+                raise
+            yield classifications[
+                classification
+            ].contract_code_sha256, contract_sdk_type
+
+    def _download(self, contract: ContractToClassify) -> bytes:
+        if self.cache is not None:
+            contract_code = self.cache.get(contract.contract_code_sha256)
+            if contract_code is not None:
+                return contract_code
+        # The provider keeps HTTP session, each thread has its own one
+        near_rpc = getattr(self._local, "near_rpc", None)
+        if near_rpc is None:
+            near_rpc = near_api.providers.JsonProvider(self.near_rpc_url)
+            self._local.near_rpc = near_rpc
+        print(
+            f"INFO: Fetching contract code for {contract.account_id} at block {contract.block_hash}..."
+        )
+        contract_code = download_contract_code(
+            near_rpc, contract.account_id, contract.block_hash
+        )
+        if self.cache is not None:
+            self.cache.put(contract.contract_code_sha256, contract_code)
+        return contract_code
+
+
+def classify_pool(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    with _classify_pools_lock:
+        pool = _classify_pools.get(workers)
+        if pool is None:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _classify_pools[workers] = pool
+        return pool
+
+
+def discard_classify_pool(pool: concurrent.futures.ProcessPoolExecutor):
+    with _classify_pools_lock:
+        for workers, shared_pool in list(_classify_pools.items()):
+            if shared_pool is pool:
+                del _classify_pools[workers]
+    pool.shutdown(wait=False)
+
+
+@atexit.register
+def shutdown_classify_pools():
+    with _classify_pools_lock:
+        pools = list(_classify_pools.values())
+        _classify_pools.clear()
+    for pool in pools:
+        pool.shutdown()
@@ -0,0 +1,88 @@
+import random
+import time
+import typing
+
+from .granularity import DAILY, Granularity
+from .periodic_aggregations import INDEXER_LAG_SECONDS, PeriodicAggregations
+
+"""
+Scheduling for `--daemon` mode: the aggregations are computed as soon as their periods are finished
+in Indexer DB, the missed periods are caught up from `backfill_journal`.
+The failed (aggregation, period) pairs are retried with the exponential backoff,
+the other aggregations and periods go on meanwhile.
+"""
+
+RETRY_BASE_DELAY_SECONDS = 60
+RETRY_MAX_DELAY_SECONDS = 60 * 60
+
+
+class RetryBackoff:
+    def __init__(
+        self,
+        base_delay_seconds: float = RETRY_BASE_DELAY_SECONDS,
+        max_delay_seconds: float = RETRY_MAX_DELAY_SECONDS,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._clock = clock
+        # key -> (failed attempts, the moment the next attempt is allowed)
+        self._failures: typing.Dict[typing.Hashable, typing.Tuple[int, float]] = {}
+
+    def is_ready(self, key: typing.Hashable) -> bool:
+        failure = self._failures.get(key)
+        return failure is None or self._clock() >= failure[1]
+
+    # Returns the delay before the next attempt
+    def record_failure(self, key: typing.Hashable) -> float:
+        attempts = self._failures.get(key, (0, 0))[0] + 1
+        delay = min(
+            self.base_delay_seconds * 2 ** (attempts - 1), self.max_delay_seconds
+        )
+        # The jitter spreads the retries of the aggregations failed at the same time
+        delay *= random.uniform(0.5, 1)
+        self._failures[key] = (attempts, self._clock() + delay)
+        return delay
+
+    def record_success(self, key: typing.Hashable):
+        self._failures.pop(key, None)
+
+
+# The aggregations without periods (e.g. `unique_contracts`) are recomputed daily, as the cron job did
+def granularity_of(statistics) -> Granularity:
+    if isinstance(statistics, PeriodicAggregations):
+        return statistics.granularity
+    return DAILY
+
+
+# The finished periods that are not computed yet, as one window [from, to) aligned to the periods.
+# `computed_until` is the end of the last computed period, None if nothing is computed:
+# only the last finished period is computed then.
+# `dependencies_until` limits the window by the periods computed by the dependencies.
+# None if there is nothing to compute
+def due_window(
+    statistics,
+    computed_until: typing.Optional[int],
+    latest_timestamp: int,
+    max_window_seconds: int,
+    dependencies_until: typing.Optional[int] = None,
+) -> typing.Optional[typing.Tuple[int, int]]:
+    granularity = granularity_of(statistics)
+    # The start of the first unfinished period, see `PeriodicAggregations.is_period_finished`
+    finished_until = granularity.start_of_range(latest_timestamp - INDEXER_LAG_SECONDS)
+    if dependencies_until is not None:
+        finished_until = min(
+            finished_until, granularity.start_of_range(dependencies_until)
+        )
+    if computed_until is None:
+        from_timestamp = granularity.start_of_range(finished_until - 1)
+    else:
+        from_timestamp = granularity.start_of_range(computed_until)
+    if from_timestamp >= finished_until:
+        return None
+    to_timestamp = min(
+        finished_until, granularity.start_of_range(from_timestamp + max_window_seconds)
+    )
+    if to_timestamp <= from_timestamp:
+        to_timestamp = granularity.end_of_range(from_timestamp)
+    return from_timestamp, to_timestamp
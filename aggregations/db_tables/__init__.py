@@ -16,6 +16,18 @@ def query_genesis_timestamp(indexer_connection) -> int:
         return int(indexer_cursor.fetchone()[0])
 
 
+def query_latest_timestamp(indexer_connection) -> int:
+    select_latest_timestamp = """
+                SELECT DIV(block_timestamp, 1000 * 1000 * 1000)
+                FROM blocks
+                ORDER BY block_timestamp DESC
+                LIMIT 1
+            """
+    with indexer_connection.cursor() as indexer_cursor:
+        indexer_cursor.execute(select_latest_timestamp)
+        return int(indexer_cursor.fetchone()[0])
+
+
 def daily_start_of_range(timestamp: int) -> int:
     return timestamp - timestamp % DAY_LEN_SECONDS
 
@@ -40,3 +52,19 @@ def time_range_json(from_timestamp, duration):
 
 def time_json(timestamp):
     return {"timestamp": to_nanos(timestamp)}
+
+
+# Analytics DB stores the days as DATE, that's more convenient than nanoseconds there
+def date_range_json(from_timestamp, duration):
+    return {
+        "from_day": datetime.utcfromtimestamp(from_timestamp).strftime("%Y-%m-%d"),
+        "to_day": datetime.utcfromtimestamp(from_timestamp + duration).strftime(
+            "%Y-%m-%d"
+        ),
+    }
+
+
+def day_to_timestamp(day: str) -> int:
+    return round(
+        (datetime.strptime(day, "%Y-%m-%d") - datetime(1970, 1, 1)).total_seconds()
+    )
@@ -1,4 +1,4 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 """
@@ -10,6 +10,8 @@ and is originally intended to be used for tracking new accounts added to each en
 
 class DailyAccountsAddedPerEcosystemEntity(PeriodicAggregations):
     DEPENDENCIES = ["near_ecosystem_entities"]
+    # Only the first appearance is stored, the periods should go one by one
+    ORDER_INDEPENDENT = False
 
     @property
     def sql_create_table(self):
@@ -29,39 +31,38 @@ class DailyAccountsAddedPerEcosystemEntity(PeriodicAggregations):
             DROP TABLE IF EXISTS daily_accounts_added_per_ecosystem_entity
             """
 
+    # The map of entity slug/contract-id pairs from Analytics DB,
+    # each entity may be associated with more than one contract
     @property
-    def sql_select(self):
-        # grab map of entity slug/contract-id pairs from near analytics db
-        # and apply that mapping to receiver entity ID's from near explore indexer db
-        # because each entity may be associated with more than one contract
-        entity_contracts_sql = """
+    def sql_select_entity_contracts(self):
+        return """
             SELECT
-                REPLACE(TRIM(slug),$$'$$,'')          AS entity 
-                , REPLACE(TRIM(contract_id),$$'$$,'') AS contract_id
+                TRIM(slug)          AS entity_id
+                , TRIM(contract_id) AS contract_id
             FROM public.near_ecosystem_entities e, unnest(string_to_array(e.contract, ', ')) s(contract_id)
-            WHERE length(contract) > 0
+            WHERE length(TRIM(contract_id)) > 0
             """
 
-        with self.analytics_connection.cursor() as analytics_cursor:
-            analytics_cursor.execute(entity_contracts_sql)
-            entity_contracts = analytics_cursor.fetchall()
-
-        indented_newline = "                    \n"
-        cases_sql = indented_newline.join(
-            [f"WHEN '{c}' THEN '{e}'" for e, c in entity_contracts]
-        )
-
+    # The map is given as the arrays in `entity_ids` and `contract_ids` parameters and joined
+    # with the receiver of the added key, so the query text does not depend on the entities
+    @property
+    def sql_select(self):
         return """
             WITH
+            entity_contracts AS
+            (
+                SELECT entity_id, contract_id
+                FROM unnest(%(entity_ids)s::text[], %(contract_ids)s::text[]) AS e(entity_id, contract_id)
+            ),
             added_to_entity_events AS
             (
                 SELECT
-                    CASE (args -> 'access_key' -> 'permission' -> 'permission_details' ->> 'receiver_id')
-                        {cases_sql}
-                        END                         AS entity_id
+                    entity_contracts.entity_id      AS entity_id
                     , receipt_receiver_account_id AS account_id
                     , receipt_included_in_block_timestamp as added_at_timestamp
                 FROM public.action_receipt_actions
+                JOIN entity_contracts
+                    ON entity_contracts.contract_id = args -> 'access_key' -> 'permission' -> 'permission_details' ->> 'receiver_id'
                 WHERE action_kind IN ('ADD_KEY')
                     AND args ->'access_key' -> 'permission' ->> 'permission_kind' = 'FUNCTION_CALL'
                     AND receipt_included_in_block_timestamp  >= %(from_timestamp)s
@@ -74,9 +75,16 @@ class DailyAccountsAddedPerEcosystemEntity(PeriodicAggregations):
             FROM added_to_entity_events
             WHERE entity_id NOT IN (account_id, 'near')
             GROUP BY 1, 2
-            """.format(
-            cases_sql=cases_sql
-        )
+            """
+
+    def query_parameters(self) -> dict:
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(self.sql_select_entity_contracts)
+            entity_contracts = analytics_cursor.fetchall()
+        return {
+            "entity_ids": [entity_id for (entity_id, _) in entity_contracts],
+            "contract_ids": [contract_id for (_, contract_id) in entity_contracts],
+        }
 
     @property
     def sql_insert(self):
@@ -86,11 +94,8 @@ class DailyAccountsAddedPerEcosystemEntity(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
 
     @staticmethod
     def prepare_data(parameters: list, **kwargs) -> list:
@@ -1,8 +1,11 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyActiveAccountsCount(PeriodicAggregations):
+    ROLLUP_DEPENDENCIES = ["daily_outgoing_transactions_per_account_count"]
+    SCAN_GROUP = "transactions"
+
     @property
     def sql_create_table(self):
         # For September 2021, we have 10^6 accounts on the Mainnet.
@@ -30,6 +33,45 @@ class DailyActiveAccountsCount(PeriodicAggregations):
                 AND transactions.block_timestamp < %(to_timestamp)s
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(transactions.block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                COUNT(DISTINCT transactions.signer_account_id)
+            FROM transactions
+            WHERE transactions.block_timestamp >= %(from_timestamp)s
+                AND transactions.block_timestamp < %(to_timestamp)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_rollup_select(self):
+        return """
+            SELECT COUNT(*)
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    @property
+    def sql_rollup_select_range(self):
+        return """
+            SELECT
+                EXTRACT(EPOCH FROM collected_for_day) AS start_of_range,
+                COUNT(*)
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+            GROUP BY collected_for_day
+            ORDER BY start_of_range
+        """
+
+    @staticmethod
+    def rows_from_scan(rows: list) -> list:
+        return [(active_accounts_count,) for (_, active_accounts_count) in rows]
+
     @property
     def sql_insert(self):
         return """
@@ -38,8 +80,5 @@ class DailyActiveAccountsCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
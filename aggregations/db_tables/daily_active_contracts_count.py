@@ -1,8 +1,10 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyActiveContractsCount(PeriodicAggregations):
+    ROLLUP_DEPENDENCIES = ["daily_receipts_per_contract_count"]
+
     @property
     def sql_create_table(self):
         # For September 2021, we have 10^6 accounts on the Mainnet.
@@ -31,6 +33,42 @@ class DailyActiveContractsCount(PeriodicAggregations):
                 AND action_receipt_actions.action_kind = 'FUNCTION_CALL'
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(action_receipt_actions.receipt_included_in_block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                COUNT(DISTINCT action_receipt_actions.receipt_receiver_account_id)
+            FROM action_receipt_actions
+            WHERE action_receipt_actions.receipt_included_in_block_timestamp >= %(from_timestamp)s
+                AND action_receipt_actions.receipt_included_in_block_timestamp < %(to_timestamp)s
+                AND action_receipt_actions.action_kind = 'FUNCTION_CALL'
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_rollup_select(self):
+        return """
+            SELECT COUNT(*)
+            FROM daily_receipts_per_contract_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    @property
+    def sql_rollup_select_range(self):
+        return """
+            SELECT
+                EXTRACT(EPOCH FROM collected_for_day) AS start_of_range,
+                COUNT(*)
+            FROM daily_receipts_per_contract_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+            GROUP BY collected_for_day
+            ORDER BY start_of_range
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -39,8 +77,5 @@ class DailyActiveContractsCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
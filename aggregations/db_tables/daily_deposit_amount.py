@@ -1,8 +1,10 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyDepositAmount(PeriodicAggregations):
+    ADDITIVE = True
+
     @property
     def sql_create_table(self):
         # For September 2021, the biggest value here is 10^34.
@@ -37,6 +39,24 @@ class DailyDepositAmount(PeriodicAggregations):
                 AND execution_outcomes.status IN ('SUCCESS_VALUE', 'SUCCESS_RECEIPT_ID')
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(execution_outcomes.executed_in_block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                SUM((action_receipt_actions.args->>'deposit')::numeric)
+            FROM action_receipt_actions
+            JOIN execution_outcomes ON execution_outcomes.receipt_id = action_receipt_actions.receipt_id
+            WHERE execution_outcomes.executed_in_block_timestamp >= %(from_timestamp)s
+                AND execution_outcomes.executed_in_block_timestamp < %(to_timestamp)s
+                AND action_receipt_actions.receipt_predecessor_account_id != 'system'
+                AND action_receipt_actions.action_kind IN ('FUNCTION_CALL', 'TRANSFER')
+                AND (action_receipt_actions.args->>'deposit')::numeric > 0
+                AND execution_outcomes.status IN ('SUCCESS_VALUE', 'SUCCESS_RECEIPT_ID')
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -45,8 +65,5 @@ class DailyDepositAmount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
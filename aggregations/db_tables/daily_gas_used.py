@@ -1,8 +1,11 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyGasUsed(PeriodicAggregations):
+    SCAN_GROUP = "blocks_chunks"
+    ADDITIVE = True
+
     @property
     def sql_create_table(self):
         # In Indexer, we store `chunks.gas_used` in numeric(20,0).
@@ -33,6 +36,24 @@ class DailyGasUsed(PeriodicAggregations):
                 AND blocks.block_timestamp < %(to_timestamp)s
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(blocks.block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                SUM(chunks.gas_used)
+            FROM blocks
+            JOIN chunks ON chunks.included_in_block_hash = blocks.block_hash
+            WHERE blocks.block_timestamp >= %(from_timestamp)s
+                AND blocks.block_timestamp < %(to_timestamp)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @staticmethod
+    def rows_from_scan(rows: list) -> list:
+        return [(gas_used,) for (gas_used, _) in rows]
+
     @property
     def sql_insert(self):
         return """
@@ -41,8 +62,5 @@ class DailyGasUsed(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
@@ -1,24 +1,29 @@
 import datetime
+import typing
 
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyIngoingTransactionsPerAccountCount(PeriodicAggregations):
+    COPY_TABLE = "daily_ingoing_transactions_per_account_count"
+    STREAMING = True
+    PARTITION_COLUMN = "collected_for_day"
+
     @property
     def sql_create_table(self):
         # Suppose we have at most 10^5 (100K) transactions per second.
         # In the worst case, they are all from one account.
         # It gives ~10^10 transactions per day.
         # It means we fit into BIGINT (10^18)
-        return """
+        return f"""
             CREATE TABLE IF NOT EXISTS daily_ingoing_transactions_per_account_count
             (
                 collected_for_day          DATE   NOT NULL,
                 account_id                 TEXT   NOT NULL,
                 ingoing_transactions_count BIGINT NOT NULL,
                 CONSTRAINT daily_ingoing_transactions_per_account_count_pk PRIMARY KEY (collected_for_day, account_id)
-            );
+            ) {self.sql_partition_by};
             CREATE INDEX IF NOT EXISTS daily_ingoing_transactions_per_account_count_idx
                 ON daily_ingoing_transactions_per_account_count (account_id, ingoing_transactions_count);
             CREATE INDEX IF NOT EXISTS daily_ingoing_transactions_chart_idx
@@ -39,7 +44,7 @@ class DailyIngoingTransactionsPerAccountCount(PeriodicAggregations):
         # with all their receipts together, or the numbers will not be accurate.
         # Other receipts from the next day will be naturally ignored.
         # Transactions border remains the same, taking only transactions for the specified day.
-        # If you want to change 10 minutes constant, fix it also in PeriodicAggregations.is_indexer_ready
+        # If you want to change 10 minutes constant, fix it also in PeriodicAggregations.is_period_finished
 
         # Conditions on receipts timestamps are added because of performance issues:
         # Joining 2 relatively small tables work much faster (4-6s VS 70-150s)
@@ -60,6 +65,27 @@ class DailyIngoingTransactionsPerAccountCount(PeriodicAggregations):
             GROUP BY receipts.receiver_account_id
         """
 
+    @property
+    def sql_select_range(self):
+        # The same query as `sql_select`, see the comments there.
+        # The 10 minutes border for receipts is applied to each day separately
+        return """
+            SELECT
+                DIV(transactions.block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                receipts.receiver_account_id,
+                COUNT(DISTINCT transactions.transaction_hash) AS ingoing_transactions_count
+            FROM transactions
+            LEFT JOIN receipts ON receipts.originated_from_transaction_hash = transactions.transaction_hash
+                AND transactions.block_timestamp >= %(from_timestamp)s
+                AND transactions.block_timestamp < %(to_timestamp)s
+            WHERE receipts.included_in_block_timestamp >= %(from_timestamp)s
+                AND receipts.included_in_block_timestamp < (%(to_timestamp)s + 600000000000)
+                AND receipts.included_in_block_timestamp < (DIV(transactions.block_timestamp, 86400000000000) + 1) * 86400000000000 + 600000000000
+                AND transactions.signer_account_id != receipts.receiver_account_id 
+            GROUP BY start_of_range, receipts.receiver_account_id
+            ORDER BY start_of_range
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -68,15 +94,14 @@ class DailyIngoingTransactionsPerAccountCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
 
     @staticmethod
-    def prepare_data(parameters: list, *, start_of_range=None, **kwargs) -> list:
+    def prepare_data(
+        parameters: typing.Iterable[tuple], *, start_of_range=None, **kwargs
+    ) -> typing.Iterable[tuple]:
         computed_for = datetime.datetime.utcfromtimestamp(start_of_range).strftime(
             "%Y-%m-%d"
         )
-        return [(computed_for, account_id, count) for (account_id, count) in parameters]
+        return ((computed_for, account_id, count) for (account_id, count) in parameters)
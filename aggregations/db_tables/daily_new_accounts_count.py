@@ -1,8 +1,11 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyNewAccountsCount(PeriodicAggregations):
+    SCAN_GROUP = "accounts_receipts"
+    ADDITIVE = True
+
     @property
     def sql_create_table(self):
         # Suppose we have at most 10^4 (10K) new accounts per second.
@@ -32,6 +35,24 @@ class DailyNewAccountsCount(PeriodicAggregations):
                 AND receipts.included_in_block_timestamp < %(to_timestamp)s
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(receipts.included_in_block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                COUNT(created_by_receipt_id)
+            FROM accounts
+            JOIN receipts ON receipts.receipt_id = accounts.created_by_receipt_id
+            WHERE receipts.included_in_block_timestamp >= %(from_timestamp)s
+                AND receipts.included_in_block_timestamp < %(to_timestamp)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @staticmethod
+    def rows_from_scan(rows: list) -> list:
+        return [(new_accounts_count,) for (new_accounts_count, _) in rows]
+
     @property
     def sql_insert(self):
         return """
@@ -40,8 +61,5 @@ class DailyNewAccountsCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
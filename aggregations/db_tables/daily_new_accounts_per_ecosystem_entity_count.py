@@ -1,6 +1,6 @@
 import datetime
 
-from . import DAY_LEN_SECONDS, daily_start_of_range, time_range_json
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
@@ -55,17 +55,14 @@ class DailyNewAccountsPerEcosystemEntityCount(PeriodicAggregations):
         with self.analytics_connection.cursor() as analytics_cursor:
             analytics_cursor.execute(
                 new_entity_users_select,
-                time_range_json(from_timestamp, self.duration_seconds),
+                self.time_parameters(from_timestamp),
             )
             result = analytics_cursor.fetchall()
             return self.prepare_data(result, start_of_range=from_timestamp)
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
 
     @staticmethod
     def prepare_data(parameters: list, **kwargs) -> list:
@@ -1,7 +1,9 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
+# Not computed from `deployed_contracts` in `rollup` mode: that table has only the successful deployments,
+# bound to the block the receipt was executed in, so the numbers would differ from `sql_select`
 class DailyNewContractsCount(PeriodicAggregations):
     @property
     def sql_create_table(self):
@@ -32,6 +34,21 @@ class DailyNewContractsCount(PeriodicAggregations):
                 AND action_receipt_actions.action_kind = 'DEPLOY_CONTRACT'
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(receipts.included_in_block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                COUNT(DISTINCT receipts.receiver_account_id)
+            FROM action_receipt_actions
+            JOIN receipts ON receipts.receipt_id = action_receipt_actions.receipt_id
+            WHERE receipts.included_in_block_timestamp >= %(from_timestamp)s
+                AND receipts.included_in_block_timestamp < %(to_timestamp)s
+                AND action_receipt_actions.action_kind = 'DEPLOY_CONTRACT'
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -40,8 +57,5 @@ class DailyNewContractsCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
@@ -1,6 +1,6 @@
 import datetime
 
-from . import DAY_LEN_SECONDS, daily_start_of_range, time_range_json
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
@@ -57,14 +57,11 @@ class DailyNewUniqueContractsCount(PeriodicAggregations):
         with self.analytics_connection.cursor() as analytics_cursor:
             analytics_cursor.execute(
                 new_unique_hashes_select,
-                time_range_json(from_timestamp, self.duration_seconds),
+                self.time_parameters(from_timestamp),
             )
             result = analytics_cursor.fetchall()
             return self.prepare_data(result, start_of_range=from_timestamp)
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
@@ -1,24 +1,33 @@
 import datetime
+import typing
 
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyOutgoingTransactionsPerAccountCount(PeriodicAggregations):
+    COPY_TABLE = "daily_outgoing_transactions_per_account_count"
+    STREAMING = True
+    PARTITION_COLUMN = "collected_for_day"
+    ADDITIVE = True
+    ADDITIVE_KEY_COLUMNS = 1
+    # The sketch of the active accounts of the day
+    SKETCH_TYPE = "daily_active_accounts"
+
     @property
     def sql_create_table(self):
         # Suppose we have at most 10^5 (100K) transactions per second.
         # In the worst case, they are all from one account.
         # It gives ~10^10 transactions per day.
         # It means we fit into BIGINT (10^18)
-        return """
+        return f"""
             CREATE TABLE IF NOT EXISTS daily_outgoing_transactions_per_account_count
             (
                 collected_for_day           DATE   NOT NULL,
                 account_id                  TEXT   NOT NULL,
                 outgoing_transactions_count BIGINT NOT NULL,
                 CONSTRAINT daily_outgoing_transactions_per_account_count_pk PRIMARY KEY (collected_for_day, account_id)
-            );
+            ) {self.sql_partition_by};
             CREATE INDEX IF NOT EXISTS daily_outgoing_transactions_per_account_count_idx
                 ON daily_outgoing_transactions_per_account_count (account_id, outgoing_transactions_count);
             CREATE INDEX IF NOT EXISTS daily_outgoing_transactions_chart_idx
@@ -43,6 +52,29 @@ class DailyOutgoingTransactionsPerAccountCount(PeriodicAggregations):
             GROUP BY signer_account_id
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(transactions.block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                signer_account_id,
+                COUNT(*) AS outgoing_transactions_count
+            FROM transactions
+            WHERE transactions.block_timestamp >= %(from_timestamp)s
+                AND transactions.block_timestamp < %(to_timestamp)s
+            GROUP BY start_of_range, signer_account_id
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_select_sketch_values(self):
+        return """
+            SELECT account_id
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -51,15 +83,14 @@ class DailyOutgoingTransactionsPerAccountCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
 
     @staticmethod
-    def prepare_data(parameters: list, *, start_of_range=None, **kwargs) -> list:
+    def prepare_data(
+        parameters: typing.Iterable[tuple], *, start_of_range=None, **kwargs
+    ) -> typing.Iterable[tuple]:
         computed_for = datetime.datetime.utcfromtimestamp(start_of_range).strftime(
             "%Y-%m-%d"
         )
-        return [(computed_for, account_id, count) for (account_id, count) in parameters]
+        return ((computed_for, account_id, count) for (account_id, count) in parameters)
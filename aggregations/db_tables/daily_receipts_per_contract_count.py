@@ -1,24 +1,33 @@
 import datetime
+import typing
 
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyReceiptsPerContractCount(PeriodicAggregations):
+    COPY_TABLE = "daily_receipts_per_contract_count"
+    STREAMING = True
+    PARTITION_COLUMN = "collected_for_day"
+    ADDITIVE = True
+    ADDITIVE_KEY_COLUMNS = 1
+    # The sketch of the active contracts of the day
+    SKETCH_TYPE = "daily_active_contracts"
+
     @property
     def sql_create_table(self):
         # Suppose we have at most 10^5 (100K) transactions per second.
         # In the worst case, they are all from one account.
         # It gives ~10^10 transactions per day.
         # It means we fit into BIGINT (10^18)
-        return """
+        return f"""
             CREATE TABLE IF NOT EXISTS daily_receipts_per_contract_count
             (
                 collected_for_day DATE NOT NULL,
                 contract_id       TEXT NOT NULL,
                 receipts_count    BIGINT NOT NULL,
                 CONSTRAINT daily_receipts_per_contract_count_pk PRIMARY KEY (collected_for_day, contract_id)
-            );
+            ) {self.sql_partition_by};
             CREATE INDEX IF NOT EXISTS daily_receipts_per_contract_count_idx
                 ON daily_receipts_per_contract_count (collected_for_day, receipts_count DESC)
         """
@@ -42,6 +51,30 @@ class DailyReceiptsPerContractCount(PeriodicAggregations):
             GROUP BY action_receipt_actions.receipt_receiver_account_id
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(action_receipt_actions.receipt_included_in_block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                action_receipt_actions.receipt_receiver_account_id,
+                COUNT(action_receipt_actions.receipt_id) AS receipts_count
+            FROM action_receipt_actions
+            WHERE action_receipt_actions.action_kind = 'FUNCTION_CALL'
+                AND action_receipt_actions.receipt_included_in_block_timestamp >= %(from_timestamp)s
+                AND action_receipt_actions.receipt_included_in_block_timestamp < %(to_timestamp)s
+            GROUP BY start_of_range, action_receipt_actions.receipt_receiver_account_id
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_select_sketch_values(self):
+        return """
+            SELECT contract_id
+            FROM daily_receipts_per_contract_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -50,17 +83,16 @@ class DailyReceiptsPerContractCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
 
     @staticmethod
-    def prepare_data(parameters: list, *, start_of_range=None, **kwargs) -> list:
+    def prepare_data(
+        parameters: typing.Iterable[tuple], *, start_of_range=None, **kwargs
+    ) -> typing.Iterable[tuple]:
         computed_for = datetime.datetime.utcfromtimestamp(start_of_range).strftime(
             "%Y-%m-%d"
         )
-        return [
+        return (
             (computed_for, contract_id, count) for (contract_id, count) in parameters
-        ]
+        )
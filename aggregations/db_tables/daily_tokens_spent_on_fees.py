@@ -1,4 +1,4 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
@@ -7,6 +7,9 @@ from ..periodic_aggregations import PeriodicAggregations
 # Part of this sum goes to royalty for contract creators. See the example of computation here:
 # https://github.com/telezhnaya/docs/blob/master/docs/tokens/balances.md#calling-a-function
 class DailyTokensSpentOnFees(PeriodicAggregations):
+    SCAN_GROUP = "blocks_chunks"
+    ADDITIVE = True
+
     @property
     def sql_create_table(self):
         # In Indexer, we store all the balances in numeric(45,0), including total_supply.
@@ -36,6 +39,24 @@ class DailyTokensSpentOnFees(PeriodicAggregations):
                 AND blocks.block_timestamp < %(to_timestamp)s
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(blocks.block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                SUM(chunks.gas_used * blocks.gas_price)
+            FROM blocks
+            JOIN chunks ON chunks.included_in_block_hash = blocks.block_hash
+            WHERE blocks.block_timestamp >= %(from_timestamp)s
+                AND blocks.block_timestamp < %(to_timestamp)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @staticmethod
+    def rows_from_scan(rows: list) -> list:
+        return [(tokens_spent_on_fees,) for (_, tokens_spent_on_fees) in rows]
+
     @property
     def sql_insert(self):
         return """
@@ -44,8 +65,5 @@ class DailyTokensSpentOnFees(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
@@ -1,6 +1,6 @@
 import datetime
 
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
@@ -43,6 +43,23 @@ class DailyTransactionCountByGasBurntRanges(PeriodicAggregations):
             GROUP BY range_in_teragas
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT start_of_range, (range_in_teragas + 1) * 50, count(transaction_hash)
+            FROM (
+                SELECT DIV(receipts.included_in_block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                    receipts.originated_from_transaction_hash AS transaction_hash,
+                    round(div(sum(execution_outcomes.gas_burnt), CAST(power(10, 12) * 50 AS BIGINT))) as range_in_teragas
+                FROM execution_outcomes JOIN receipts ON receipts.receipt_id = execution_outcomes.receipt_id
+                WHERE receipts.included_in_block_timestamp >= %(from_timestamp)s
+                    AND receipts.included_in_block_timestamp < %(to_timestamp)s
+                GROUP BY start_of_range, receipts.originated_from_transaction_hash
+            ) a
+            GROUP BY start_of_range, range_in_teragas
+            ORDER BY start_of_range
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -51,11 +68,8 @@ class DailyTransactionCountByGasBurntRanges(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
 
     @staticmethod
     def prepare_data(parameters: list, *, start_of_range=None, **kwargs) -> list:
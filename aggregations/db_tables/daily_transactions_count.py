@@ -1,8 +1,12 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DailyTransactionsCount(PeriodicAggregations):
+    ROLLUP_DEPENDENCIES = ["daily_outgoing_transactions_per_account_count"]
+    SCAN_GROUP = "transactions"
+    ADDITIVE = True
+
     @property
     def sql_create_table(self):
         # Suppose we have at most 10^5 (100K) transactions per second.
@@ -30,6 +34,45 @@ class DailyTransactionsCount(PeriodicAggregations):
                 AND block_timestamp < %(to_timestamp)s
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                COUNT(*)
+            FROM transactions
+            WHERE block_timestamp >= %(from_timestamp)s
+                AND block_timestamp < %(to_timestamp)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_rollup_select(self):
+        return """
+            SELECT SUM(outgoing_transactions_count)
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    @property
+    def sql_rollup_select_range(self):
+        return """
+            SELECT
+                EXTRACT(EPOCH FROM collected_for_day) AS start_of_range,
+                SUM(outgoing_transactions_count)
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+            GROUP BY collected_for_day
+            ORDER BY start_of_range
+        """
+
+    @staticmethod
+    def rows_from_scan(rows: list) -> list:
+        return [(transactions_count,) for (transactions_count, _) in rows]
+
     @property
     def sql_insert(self):
         return """
@@ -38,8 +81,5 @@ class DailyTransactionsCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
@@ -1,8 +1,20 @@
-from . import DAY_LEN_SECONDS, daily_start_of_range
+import typing
+
+from ..granularity import DAILY
 from ..periodic_aggregations import PeriodicAggregations
 
 
 class DeployedContracts(PeriodicAggregations):
+    COPY_TABLE = "deployed_contracts"
+    STREAMING = True
+    COPY_COLUMNS = [
+        "contract_code_sha256",
+        "deployed_to_account_id",
+        "deployed_by_receipt_id",
+        "deployed_at_block_timestamp",
+        "deployed_at_block_hash",
+    ]
+
     @property
     def sql_create_table(self):
         return """
@@ -49,6 +61,25 @@ class DeployedContracts(PeriodicAggregations):
             ORDER BY execution_outcomes.executed_in_block_timestamp
         """
 
+    @property
+    def sql_select_range(self):
+        return """
+            SELECT
+                DIV(execution_outcomes.executed_in_block_timestamp, 86400000000000) * 86400 AS start_of_range,
+                action_receipt_actions.args->>'code_sha256' as contract_code_sha256,
+                action_receipt_actions.receipt_receiver_account_id as deployed_to_account_id,
+                action_receipt_actions.receipt_id as deployed_by_receipt_id,
+                execution_outcomes.executed_in_block_timestamp as deployed_at_block_timestamp,
+                execution_outcomes.executed_in_block_hash as deployed_at_block_hash
+            FROM action_receipt_actions
+            JOIN execution_outcomes ON execution_outcomes.receipt_id = action_receipt_actions.receipt_id
+            WHERE action_receipt_actions.action_kind = 'DEPLOY_CONTRACT'
+                AND execution_outcomes.status = 'SUCCESS_VALUE'
+                AND execution_outcomes.executed_in_block_timestamp >= %(from_timestamp)s
+                AND execution_outcomes.executed_in_block_timestamp < %(to_timestamp)s
+            ORDER BY execution_outcomes.executed_in_block_timestamp
+        """
+
     @property
     def sql_insert(self):
         return """
@@ -63,12 +94,11 @@ class DeployedContracts(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return DAY_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return daily_start_of_range(timestamp)
+    def granularity(self):
+        return DAILY
 
     @staticmethod
-    def prepare_data(parameters: list, *, start_of_range=None, **kwargs) -> list:
+    def prepare_data(
+        parameters: typing.Iterable[tuple], *, start_of_range=None, **kwargs
+    ) -> typing.Iterable[tuple]:
         return parameters
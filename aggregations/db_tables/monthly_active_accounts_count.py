@@ -0,0 +1,63 @@
+from .daily_outgoing_transactions_per_account_count import (
+    DailyOutgoingTransactionsPerAccountCount,
+)
+from ..granularity import MONTHLY
+from ..periodic_aggregations import PeriodicAggregations
+from ..sketches import DistinctCountSketches
+
+
+# This metric is computed based on the sketches stored by `daily_outgoing_transactions_per_account_count`.
+# The value is estimated, the error is below 1%
+class MonthlyActiveAccountsCount(PeriodicAggregations):
+    DEPENDENCIES = ["daily_outgoing_transactions_per_account_count"]
+
+    @property
+    def sql_create_table(self):
+        # For September 2021, we have 10^6 accounts on the Mainnet.
+        # It means we fit into integer (10^9)
+        return """
+            CREATE TABLE IF NOT EXISTS monthly_active_accounts_count
+            (
+                collected_for_month   DATE PRIMARY KEY, -- the first day of the month
+                active_accounts_count INTEGER NOT NULL
+            )
+        """
+
+    @property
+    def sql_drop_table(self):
+        return """
+            DROP TABLE IF EXISTS monthly_active_accounts_count
+        """
+
+    @property
+    def sql_select(self):
+        raise NotImplementedError(
+            "No requests to Indexer DB needed for monthly_active_accounts_count"
+        )
+
+    def collect(self, requested_timestamp: int) -> list:
+        from_timestamp = self.start_of_range(requested_timestamp)
+        if not self.is_indexer_ready(self.end_of_range(from_timestamp)):
+            return []
+        # Raises `MissingSketchesError` if some days of the month have no sketch,
+        # the period fails instead of storing the underestimated value for good
+        active_accounts_count = DistinctCountSketches(
+            self.analytics_connection
+        ).estimate_window(
+            DailyOutgoingTransactionsPerAccountCount.SKETCH_TYPE,
+            *self.granularity.data_range(from_timestamp),
+        )
+        return self.prepare_data(
+            [(active_accounts_count,)], start_of_range=from_timestamp
+        )
+
+    @property
+    def sql_insert(self):
+        return """
+            INSERT INTO monthly_active_accounts_count VALUES %s
+            ON CONFLICT DO NOTHING
+        """
+
+    @property
+    def granularity(self):
+        return MONTHLY
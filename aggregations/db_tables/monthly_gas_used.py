@@ -0,0 +1,58 @@
+from ..granularity import MONTHLY
+from ..rollup_aggregations import RollupAggregations
+
+
+# This metric is computed based on `daily_gas_used` table in Analytics DB
+class MonthlyGasUsed(RollupAggregations):
+    DEPENDENCIES = ["daily_gas_used"]
+    SOURCE = "daily_gas_used"
+
+    @property
+    def sql_create_table(self):
+        # Month is ~31 days, so we need 2 extra digits comparing to the daily table
+        return """
+            CREATE TABLE IF NOT EXISTS monthly_gas_used
+            (
+                collected_for_month DATE PRIMARY KEY, -- the first day of the month
+                gas_used            numeric(35, 0) NOT NULL
+            )
+        """
+
+    @property
+    def sql_drop_table(self):
+        return """
+            DROP TABLE IF EXISTS monthly_gas_used
+        """
+
+    @property
+    def sql_rollup_select(self):
+        return """
+            SELECT SUM(gas_used)
+            FROM daily_gas_used
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    @property
+    def sql_rollup_select_range(self):
+        return """
+            SELECT
+                EXTRACT(EPOCH FROM DATE_TRUNC('month', collected_for_day)::date) AS start_of_range,
+                SUM(gas_used)
+            FROM daily_gas_used
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_insert(self):
+        return """
+            INSERT INTO monthly_gas_used VALUES %s
+            ON CONFLICT DO NOTHING
+        """
+
+    @property
+    def granularity(self):
+        return MONTHLY
@@ -0,0 +1,58 @@
+from ..granularity import MONTHLY
+from ..rollup_aggregations import RollupAggregations
+
+
+# This metric is computed based on `daily_new_accounts_count` table in Analytics DB
+class MonthlyNewAccountsCount(RollupAggregations):
+    DEPENDENCIES = ["daily_new_accounts_count"]
+    SOURCE = "daily_new_accounts_count"
+
+    @property
+    def sql_create_table(self):
+        # The month can't have more new accounts than the whole network, so we fit into integer
+        return """
+            CREATE TABLE IF NOT EXISTS monthly_new_accounts_count
+            (
+                collected_for_month DATE PRIMARY KEY, -- the first day of the month
+                new_accounts_count  INTEGER NOT NULL
+            )
+        """
+
+    @property
+    def sql_drop_table(self):
+        return """
+            DROP TABLE IF EXISTS monthly_new_accounts_count
+        """
+
+    @property
+    def sql_rollup_select(self):
+        return """
+            SELECT SUM(new_accounts_count)
+            FROM daily_new_accounts_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    @property
+    def sql_rollup_select_range(self):
+        return """
+            SELECT
+                EXTRACT(EPOCH FROM DATE_TRUNC('month', collected_for_day)::date) AS start_of_range,
+                SUM(new_accounts_count)
+            FROM daily_new_accounts_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_insert(self):
+        return """
+            INSERT INTO monthly_new_accounts_count VALUES %s
+            ON CONFLICT DO NOTHING
+        """
+
+    @property
+    def granularity(self):
+        return MONTHLY
@@ -0,0 +1,58 @@
+from ..granularity import MONTHLY
+from ..rollup_aggregations import RollupAggregations
+
+
+# This metric is computed based on `daily_tokens_spent_on_fees` table in Analytics DB
+class MonthlyTokensSpentOnFees(RollupAggregations):
+    DEPENDENCIES = ["daily_tokens_spent_on_fees"]
+    SOURCE = "daily_tokens_spent_on_fees"
+
+    @property
+    def sql_create_table(self):
+        # Month is ~31 days, so we need 2 extra digits comparing to the daily table
+        return """
+            CREATE TABLE IF NOT EXISTS monthly_tokens_spent_on_fees
+            (
+                collected_for_month  DATE PRIMARY KEY, -- the first day of the month
+                tokens_spent_on_fees numeric(55, 0) NOT NULL
+            )
+        """
+
+    @property
+    def sql_drop_table(self):
+        return """
+            DROP TABLE IF EXISTS monthly_tokens_spent_on_fees
+        """
+
+    @property
+    def sql_rollup_select(self):
+        return """
+            SELECT SUM(tokens_spent_on_fees)
+            FROM daily_tokens_spent_on_fees
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    @property
+    def sql_rollup_select_range(self):
+        return """
+            SELECT
+                EXTRACT(EPOCH FROM DATE_TRUNC('month', collected_for_day)::date) AS start_of_range,
+                SUM(tokens_spent_on_fees)
+            FROM daily_tokens_spent_on_fees
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
+        """
+
+    @property
+    def sql_insert(self):
+        return """
+            INSERT INTO monthly_tokens_spent_on_fees VALUES %s
+            ON CONFLICT DO NOTHING
+        """
+
+    @property
+    def granularity(self):
+        return MONTHLY
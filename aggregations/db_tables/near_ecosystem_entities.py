@@ -1,8 +1,17 @@
-import json
-import requests
+import psycopg2.extras
+import typing
 
+from ..ecosystem_entities_source import EcosystemEntitiesSource
+from ..metrics import METRICS
 from ..sql_aggregations import SqlAggregations
 
+"""
+The table is refreshed in place: the new list is loaded into the temporary table,
+only the changed rows are updated, and the entities removed from the list are deleted,
+all in one transaction. The readers (e.g. `daily_accounts_added_per_ecosystem_entity`)
+see either the old list or the new one, never the empty table.
+"""
+
 
 class NearEcosystemEntities(SqlAggregations):
     @property
@@ -41,17 +50,72 @@ class NearEcosystemEntities(SqlAggregations):
     @property
     def sql_insert(self):
         return """
-            INSERT INTO near_ecosystem_entities VALUES %s
-            ON CONFLICT DO NOTHING
+            INSERT INTO near_ecosystem_entities_staging VALUES %s
         """
 
-    def collect(self, requested_timestamp: int) -> list:
-        # Dirty hack to enforce the DB rewrite all the data each time
-        self.drop_table()
-        self.create_table()
+    # `ordinal` is the position of the entity in the list
+    @property
+    def sql_create_staging_table(self):
+        return """
+            CREATE TEMPORARY TABLE near_ecosystem_entities_staging
+            (
+                LIKE near_ecosystem_entities INCLUDING DEFAULTS,
+                ordinal INTEGER NOT NULL
+            )
+            ON COMMIT DROP
+        """
 
-        url = "https://raw.githubusercontent.com/near/ecosystem/main/entities.json"
-        data = json.loads(requests.get(url).text)
+    # The rows equal to the existing ones are not touched at all.
+    # The list could have the same slug twice, the first one in the list wins
+    @property
+    def sql_upsert_from_staging(self):
+        return """
+            INSERT INTO near_ecosystem_entities
+            SELECT DISTINCT ON (slug)
+                slug,
+                title,
+                oneliner,
+                website,
+                category,
+                status,
+                contract,
+                logo,
+                is_app,
+                is_nft,
+                is_guild,
+                is_defi,
+                is_dao
+            FROM near_ecosystem_entities_staging
+            ORDER BY slug, ordinal
+            ON CONFLICT (slug) DO UPDATE SET
+                title    = EXCLUDED.title,
+                oneliner = EXCLUDED.oneliner,
+                website  = EXCLUDED.website,
+                category = EXCLUDED.category,
+                status   = EXCLUDED.status,
+                contract = EXCLUDED.contract,
+                logo     = EXCLUDED.logo,
+                is_app   = EXCLUDED.is_app,
+                is_nft   = EXCLUDED.is_nft,
+                is_guild = EXCLUDED.is_guild,
+                is_defi  = EXCLUDED.is_defi,
+                is_dao   = EXCLUDED.is_dao
+            WHERE (near_ecosystem_entities.*) IS DISTINCT FROM (EXCLUDED.*)
+        """
+
+    @property
+    def sql_delete_missing(self):
+        return """
+            DELETE FROM near_ecosystem_entities
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM near_ecosystem_entities_staging
+                WHERE near_ecosystem_entities_staging.slug = near_ecosystem_entities.slug
+            )
+        """
+
+    def collect(self, requested_timestamp: int) -> list:
+        data = EcosystemEntitiesSource.from_env().load()
 
         return [
             [
@@ -71,3 +135,32 @@ class NearEcosystemEntities(SqlAggregations):
             ]
             for record in data
         ]
+
+    # Replaces the content of the table with the given rows in one transaction.
+    # The empty list is most likely the broken source, the table is kept as is then
+    def store(self, parameters: typing.Iterable[list]) -> int:
+        parameters = list(parameters)
+        if not parameters:
+            return 0
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(self.sql_create_staging_table)
+                psycopg2.extras.execute_values(
+                    analytics_cursor,
+                    self.sql_insert,
+                    [[*row, ordinal] for ordinal, row in enumerate(parameters)],
+                    page_size=1000,
+                )
+                analytics_cursor.execute(self.sql_upsert_from_staging)
+                changed_count = analytics_cursor.rowcount
+                analytics_cursor.execute(self.sql_delete_missing)
+                deleted_count = analytics_cursor.rowcount
+                self.analytics_connection.commit()
+                METRICS.increment("aggregation_rows_inserted_total", changed_count)
+            except Exception:
+                self.analytics_connection.rollback()
+                raise
+        print(
+            f"INFO: near_ecosystem_entities: {changed_count} added or changed, {deleted_count} deleted"
+        )
+        return len(parameters)
@@ -1,8 +1,12 @@
-from . import WEEK_LEN_SECONDS, weekly_start_of_range
+from ..granularity import WEEKLY
 from ..periodic_aggregations import PeriodicAggregations
 
 
+# This metric is computed based on `daily_outgoing_transactions_per_account_count` table in Analytics DB
 class WeeklyActiveAccountsCount(PeriodicAggregations):
+    DEPENDENCIES = ["daily_outgoing_transactions_per_account_count"]
+    SKETCH_TYPE = "weekly_active_accounts"
+
     @property
     def sql_create_table(self):
         # For September 2021, we have 10^6 accounts on the Mainnet.
@@ -23,13 +27,50 @@ class WeeklyActiveAccountsCount(PeriodicAggregations):
 
     @property
     def sql_select(self):
+        raise NotImplementedError(
+            "No requests to Indexer DB needed for weekly_active_accounts_count"
+        )
+
+    # Analytics DB already has all the signers for each day,
+    # it's much cheaper than `COUNT(DISTINCT signer_account_id)` over the week of transactions.
+    # The query works for any window of days, not only for the weeks
+    @property
+    def sql_rollup_select(self):
+        return """
+            SELECT COUNT(DISTINCT account_id)
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    @property
+    def sql_rollup_select_range(self):
+        # ISODOW is 1 for Monday
         return """
-            SELECT COUNT(DISTINCT transactions.signer_account_id)
-            FROM transactions
-            WHERE transactions.block_timestamp >= %(from_timestamp)s
-                AND transactions.block_timestamp < %(to_timestamp)s
+            SELECT
+                EXTRACT(EPOCH FROM collected_for_day - (EXTRACT(ISODOW FROM collected_for_day)::integer - 1)) AS start_of_range,
+                COUNT(DISTINCT account_id)
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+            GROUP BY start_of_range
+            ORDER BY start_of_range
         """
 
+    # The duplicates don't change the sketch, no need in DISTINCT here
+    @property
+    def sql_select_sketch_values(self):
+        return """
+            SELECT account_id
+            FROM daily_outgoing_transactions_per_account_count
+            WHERE collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+
+    # Computed from Analytics DB even without `rollup` option
+    def uses_rollup(self) -> bool:
+        return True
+
     @property
     def sql_insert(self):
         return """
@@ -38,8 +79,5 @@ class WeeklyActiveAccountsCount(PeriodicAggregations):
         """
 
     @property
-    def duration_seconds(self):
-        return WEEK_LEN_SECONDS
-
-    def start_of_range(self, timestamp: int) -> int:
-        return weekly_start_of_range(timestamp)
+    def granularity(self):
+        return WEEKLY
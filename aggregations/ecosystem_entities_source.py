@@ -0,0 +1,113 @@
+import json
+import os
+import requests
+import tempfile
+import traceback
+import typing
+
+"""
+Getting the list of NEAR ecosystem entities (`entities.json` from near/ecosystem repository).
+The file is downloaded only if it has changed: the ETag of the last download is kept next to the cached copy,
+and GitHub answers `304 Not Modified` for the same ETag.
+The cached copy is also used if GitHub is not available.
+The list could be taken from the local file instead, e.g. for the offline runs.
+"""
+
+DEFAULT_URL = "https://raw.githubusercontent.com/near/ecosystem/main/entities.json"
+REQUEST_TIMEOUT_SECONDS = 60
+
+_CACHED_FILE_NAME = "entities.json"
+_ETAG_FILE_NAME = "entities.json.etag"
+
+
+class EcosystemEntitiesSource:
+    def __init__(
+        self,
+        url: str = DEFAULT_URL,
+        cache_directory: typing.Optional[str] = None,
+        file_path: typing.Optional[str] = None,
+    ):
+        self.url = url
+        self.cache_directory = cache_directory
+        # If set, the entities are read from this file, the network is not used at all
+        self.file_path = file_path
+
+    # The source configured by the environment:
+    # `NEAR_ECOSYSTEM_ENTITIES_FILE` for the offline runs,
+    # `NEAR_ECOSYSTEM_ENTITIES_URL` and `NEAR_ECOSYSTEM_ENTITIES_CACHE_DIR` otherwise
+    @classmethod
+    def from_env(cls) -> "EcosystemEntitiesSource":
+        return cls(
+            url=os.getenv("NEAR_ECOSYSTEM_ENTITIES_URL") or DEFAULT_URL,
+            cache_directory=os.getenv("NEAR_ECOSYSTEM_ENTITIES_CACHE_DIR") or None,
+            file_path=os.getenv("NEAR_ECOSYSTEM_ENTITIES_FILE") or None,
+        )
+
+    def load(self) -> typing.List[dict]:
+        if self.file_path is not None:
+            with open(self.file_path, "rb") as f:
+                return json.loads(f.read())
+        return json.loads(self._download())
+
+    def _download(self) -> bytes:
+        headers = {}
+        etag = self._read_cached(_ETAG_FILE_NAME)
+        cached_content = self._read_cached(_CACHED_FILE_NAME)
+        if etag is not None and cached_content is not None:
+            headers["If-None-Match"] = etag.decode()
+        try:
+            response = requests.get(
+                self.url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS
+            )
+            if response.status_code == 304 and cached_content is not None:
+                print("INFO: near_ecosystem_entities are not modified, using the cache")
+                return cached_content
+            response.raise_for_status()
+        except requests.RequestException:
+            if cached_content is None:
+                raise
+            print("WARN: Could not download near_ecosystem_entities, using the cache")
+            traceback.print_exc()
+            return cached_content
+
+        content = response.content
+        # Checking the content before caching it, so the broken download never replaces the good copy
+        json.loads(content)
+        self._write_cached(_CACHED_FILE_NAME, content)
+        new_etag = response.headers.get("ETag")
+        if new_etag:
+            self._write_cached(_ETAG_FILE_NAME, new_etag.encode())
+        else:
+            self._remove_cached(_ETAG_FILE_NAME)
+        return content
+
+    def _read_cached(self, name: str) -> typing.Optional[bytes]:
+        if self.cache_directory is None:
+            return None
+        try:
+            with open(os.path.join(self.cache_directory, name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_cached(self, name: str, content: bytes):
+        if self.cache_directory is None:
+            return
+        os.makedirs(self.cache_directory, exist_ok=True)
+        # Writing to the temporary file first, so the readers never see the partial content
+        fd, temporary_path = tempfile.mkstemp(dir=self.cache_directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temporary_path, os.path.join(self.cache_directory, name))
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def _remove_cached(self, name: str):
+        if self.cache_directory is None:
+            return
+        try:
+            os.unlink(os.path.join(self.cache_directory, name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,65 @@
+import abc
+import calendar
+import typing
+
+from datetime import date, datetime
+
+from .db_tables import DAY_LEN_SECONDS, daily_start_of_range, weekly_start_of_range
+
+"""
+The periods the aggregations are computed for.
+The months have different lengths, so we never add the fixed duration
+to the start of the period, `end_of_range` should be used instead.
+"""
+
+
+class Granularity(abc.ABC):
+    # The start of the period the timestamp belongs to
+    @abc.abstractmethod
+    def start_of_range(self, timestamp: int) -> int:
+        pass
+
+    # The start of the next period (exclusive end of the given one)
+    @abc.abstractmethod
+    def end_of_range(self, start_of_range: int) -> int:
+        pass
+
+    # The data the period is computed from, [from, to)
+    def data_range(self, start_of_range: int) -> typing.Tuple[int, int]:
+        return start_of_range, self.end_of_range(start_of_range)
+
+
+class Daily(Granularity):
+    def start_of_range(self, timestamp: int) -> int:
+        return daily_start_of_range(timestamp)
+
+    def end_of_range(self, start_of_range: int) -> int:
+        return start_of_range + DAY_LEN_SECONDS
+
+
+class Weekly(Granularity):
+    def start_of_range(self, timestamp: int) -> int:
+        return weekly_start_of_range(timestamp)
+
+    def end_of_range(self, start_of_range: int) -> int:
+        return start_of_range + 7 * DAY_LEN_SECONDS
+
+
+class Monthly(Granularity):
+    def start_of_range(self, timestamp: int) -> int:
+        day = datetime.utcfromtimestamp(timestamp).date()
+        return _to_timestamp(date(day.year, day.month, 1))
+
+    def end_of_range(self, start_of_range: int) -> int:
+        day = datetime.utcfromtimestamp(start_of_range).date()
+        month_index = day.year * 12 + day.month
+        return _to_timestamp(date(month_index // 12, month_index % 12 + 1, 1))
+
+
+def _to_timestamp(day: date) -> int:
+    return calendar.timegm(day.timetuple())
+
+
+DAILY = Daily()
+WEEKLY = Weekly()
+MONTHLY = Monthly()
@@ -0,0 +1,252 @@
+import dataclasses
+import psycopg2
+import psycopg2.extras
+import typing
+
+from .periodic_aggregations import INDEXER_LAG_SECONDS, PeriodicAggregations
+from .watermark import WATERMARK
+
+"""
+"Today so far" values of `ADDITIVE` aggregations.
+The unfinished period is collected by hourly slices as Indexer DB goes on: each refresh reads from Indexer DB
+only the hours finished since the previous refresh and adds their rows to the partial aggregates.
+`intraday_watermarks` keeps the end of the last added slice, it's updated in the same transaction
+as the partial aggregates, so no slice is added twice.
+When the period is finished, its last slice is added, and the partial aggregates are stored
+to the aggregation table as the usual result of the period.
+"""
+
+# The partial aggregates are updated by whole hours
+SLICE_SECONDS = 60 * 60
+
+
+@dataclasses.dataclass
+class IntradayAggregates:
+    analytics_connection: psycopg2.extensions.connection
+
+    def create_tables(self):
+        # Timestamps are in seconds, as everywhere in Python code.
+        # The key columns of the rows are stored as text, the values are counts and sums of numeric(x, 0),
+        # see `ADDITIVE_KEY_COLUMNS`
+        sql_create_tables = """
+            CREATE TABLE IF NOT EXISTS intraday_partial_aggregates
+            (
+                statistics_type   TEXT      NOT NULL,
+                period_start      BIGINT    NOT NULL,
+                key_values        TEXT[]    NOT NULL,
+                aggregated_values NUMERIC[] NOT NULL,
+                CONSTRAINT intraday_partial_aggregates_pk PRIMARY KEY (statistics_type, period_start, key_values)
+            );
+            CREATE TABLE IF NOT EXISTS intraday_watermarks
+            (
+                statistics_type TEXT      NOT NULL,
+                period_start    BIGINT    NOT NULL,
+                folded_until    BIGINT    NOT NULL,
+                updated_at      TIMESTAMP NOT NULL DEFAULT now(),
+                CONSTRAINT intraday_watermarks_pk PRIMARY KEY (statistics_type, period_start)
+            )
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(sql_create_tables)
+                self.analytics_connection.commit()
+            except psycopg2.errors.DuplicateTable:
+                self.analytics_connection.rollback()
+
+    # The periods of the aggregation with the partial aggregates: {period_start: folded_until}
+    def watermarks(self, statistics_type: str) -> typing.Dict[int, int]:
+        sql_select = """
+            SELECT period_start, folded_until
+            FROM intraday_watermarks
+            WHERE statistics_type = %(statistics_type)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select, {"statistics_type": statistics_type})
+            return {
+                int(period_start): int(folded_until)
+                for (period_start, folded_until) in analytics_cursor.fetchall()
+            }
+
+    # Adds the rows of the slice [from_timestamp, to_timestamp) to the partial aggregates of the period.
+    # Returns False if the slice does not continue the stored ones (e.g. another process has added it already),
+    # nothing is changed then
+    def fold(
+        self,
+        statistics_type: str,
+        period_start: int,
+        from_timestamp: int,
+        to_timestamp: int,
+        rows: typing.Iterable[tuple],
+        key_columns: int,
+    ) -> bool:
+        # Moving the watermark first: the row stays locked till the commit,
+        # so the concurrent refresh of the same period waits and then sees the new watermark
+        sql_move_watermark = """
+            INSERT INTO intraday_watermarks (statistics_type, period_start, folded_until)
+            VALUES (%(statistics_type)s, %(period_start)s, %(to_timestamp)s)
+            ON CONFLICT ON CONSTRAINT intraday_watermarks_pk DO UPDATE SET
+                folded_until = EXCLUDED.folded_until,
+                updated_at = EXCLUDED.updated_at
+            WHERE intraday_watermarks.folded_until = %(from_timestamp)s
+        """
+        # The arrays are summed up element by element
+        sql_add_rows = """
+            INSERT INTO intraday_partial_aggregates VALUES %s
+            ON CONFLICT ON CONSTRAINT intraday_partial_aggregates_pk DO UPDATE SET
+                aggregated_values = ARRAY(
+                    SELECT stored_value + added_value
+                    FROM unnest(intraday_partial_aggregates.aggregated_values, EXCLUDED.aggregated_values)
+                        WITH ORDINALITY AS v(stored_value, added_value, position)
+                    ORDER BY position
+                )
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(
+                    sql_move_watermark,
+                    {
+                        "statistics_type": statistics_type,
+                        "period_start": period_start,
+                        "from_timestamp": from_timestamp,
+                        "to_timestamp": to_timestamp,
+                    },
+                )
+                if analytics_cursor.rowcount != 1:
+                    self.analytics_connection.rollback()
+                    return False
+                psycopg2.extras.execute_values(
+                    analytics_cursor,
+                    sql_add_rows,
+                    [
+                        (
+                            statistics_type,
+                            period_start,
+                            [str(value) for value in row[:key_columns]],
+                            [value or 0 for value in row[key_columns:]],
+                        )
+                        for row in rows
+                    ],
+                    template="(%s, %s, %s::TEXT[], %s::NUMERIC[])",
+                    page_size=1000,
+                )
+                self.analytics_connection.commit()
+            except Exception:
+                self.analytics_connection.rollback()
+                raise
+        return True
+
+    # The rows in the same form as `sql_select` returns them: the key columns, then the values
+    def rows(self, statistics_type: str, period_start: int) -> typing.List[tuple]:
+        sql_select = """
+            SELECT key_values, aggregated_values
+            FROM intraday_partial_aggregates
+            WHERE statistics_type = %(statistics_type)s
+                AND period_start = %(period_start)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                sql_select,
+                {"statistics_type": statistics_type, "period_start": period_start},
+            )
+            return [
+                (*key_values, *aggregated_values)
+                for (key_values, aggregated_values) in analytics_cursor.fetchall()
+            ]
+
+    def delete(self, statistics_type: str, period_start: int):
+        sql_delete = """
+            DELETE FROM intraday_partial_aggregates
+            WHERE statistics_type = %(statistics_type)s
+                AND period_start = %(period_start)s;
+            DELETE FROM intraday_watermarks
+            WHERE statistics_type = %(statistics_type)s
+                AND period_start = %(period_start)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                sql_delete,
+                {"statistics_type": statistics_type, "period_start": period_start},
+            )
+            self.analytics_connection.commit()
+
+
+# Adds the finished hours to the partial aggregates of the current period
+# and stores the periods finished since the previous refresh.
+# Returns the number of the rows stored to the aggregation table
+def refresh_intraday(statistics_type: str, statistics: PeriodicAggregations) -> int:
+    if not statistics.ADDITIVE:
+        raise ValueError(f"{statistics_type} can't be computed by slices")
+    intraday = IntradayAggregates(statistics.analytics_connection)
+    intraday.create_tables()
+    statistics.create_table()
+
+    # The data is complete till this moment, see `is_period_finished`
+    complete_until = (
+        WATERMARK.latest_timestamp(statistics.indexer_connection) - INDEXER_LAG_SECONDS
+    )
+    current_period = statistics.start_of_range(complete_until)
+    watermarks = intraday.watermarks(statistics_type)
+
+    rows_count = 0
+    for period_start, folded_until in sorted(watermarks.items()):
+        if period_start >= current_period:
+            continue
+        period_end = statistics.end_of_range(period_start)
+        if not _fold(
+            intraday,
+            statistics_type,
+            statistics,
+            period_start,
+            folded_until,
+            period_end,
+        ):
+            continue
+        rows = intraday.rows(statistics_type, period_start)
+        statistics.create_partitions(period_start, period_end)
+        rows_count += statistics.store(
+            statistics.prepare_data(rows, start_of_range=period_start)
+        )
+        intraday.delete(statistics_type, period_start)
+        print(f"Finalized intraday {statistics_type} for {period_start}")
+
+    slice_end = min(
+        complete_until - complete_until % SLICE_SECONDS,
+        statistics.end_of_range(current_period),
+    )
+    folded_until = watermarks.get(current_period, current_period)
+    if slice_end > folded_until:
+        _fold(
+            intraday,
+            statistics_type,
+            statistics,
+            current_period,
+            folded_until,
+            slice_end,
+        )
+    return rows_count
+
+
+def _fold(
+    intraday: IntradayAggregates,
+    statistics_type: str,
+    statistics: PeriodicAggregations,
+    period_start: int,
+    from_timestamp: int,
+    to_timestamp: int,
+) -> bool:
+    if from_timestamp >= to_timestamp:
+        return True
+    rows = statistics.collect_slice(from_timestamp, to_timestamp)
+    folded = intraday.fold(
+        statistics_type,
+        period_start,
+        from_timestamp,
+        to_timestamp,
+        rows,
+        statistics.ADDITIVE_KEY_COLUMNS,
+    )
+    if not folded:
+        print(
+            f"WARN: Intraday {statistics_type} for {period_start} was updated by another process, skipping"
+        )
+    return folded
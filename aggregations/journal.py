@@ -0,0 +1,107 @@
+import dataclasses
+import psycopg2
+import typing
+
+
+# Keeps the periods already stored by the backfill (`--all`) and by `--daemon` in Analytics DB,
+# so that the interrupted backfill could be resumed instead of starting from genesis
+@dataclasses.dataclass
+class BackfillJournal:
+    analytics_connection: psycopg2.extensions.connection
+
+    def create_table(self):
+        # Timestamps are in seconds, as everywhere in Python code
+        sql_create_table = """
+            CREATE TABLE IF NOT EXISTS backfill_journal
+            (
+                statistics_type  TEXT             NOT NULL,
+                from_timestamp   BIGINT           NOT NULL,
+                to_timestamp     BIGINT           NOT NULL,
+                rows_count       BIGINT           NOT NULL,
+                duration_seconds DOUBLE PRECISION NOT NULL,
+                completed_at     TIMESTAMP        NOT NULL DEFAULT now(),
+                CONSTRAINT backfill_journal_pk PRIMARY KEY (statistics_type, from_timestamp, to_timestamp)
+            )
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(sql_create_table)
+                self.analytics_connection.commit()
+            except psycopg2.errors.DuplicateTable:
+                self.analytics_connection.rollback()
+
+    # Should be called together with dropping the aggregation table
+    def clear(self, statistics_type: str):
+        sql_clear = """
+            DELETE FROM backfill_journal
+            WHERE statistics_type = %(statistics_type)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_clear, {"statistics_type": statistics_type})
+            self.analytics_connection.commit()
+
+    def completed_periods(self, statistics_type: str) -> typing.Set[typing.Tuple]:
+        sql_select = """
+            SELECT from_timestamp, to_timestamp
+            FROM backfill_journal
+            WHERE statistics_type = %(statistics_type)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select, {"statistics_type": statistics_type})
+            return {
+                (int(from_timestamp), int(to_timestamp))
+                for (from_timestamp, to_timestamp) in analytics_cursor.fetchall()
+            }
+
+    # The end of the latest stored period, None if nothing is stored.
+    # `--daemon` continues from here, see `daemon.py`
+    def computed_until(self, statistics_type: str) -> typing.Optional[int]:
+        sql_select = """
+            SELECT MAX(to_timestamp)
+            FROM backfill_journal
+            WHERE statistics_type = %(statistics_type)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select, {"statistics_type": statistics_type})
+            (to_timestamp,) = analytics_cursor.fetchone()
+            return None if to_timestamp is None else int(to_timestamp)
+
+    def record(
+        self,
+        statistics_type: str,
+        from_timestamp: int,
+        to_timestamp: int,
+        rows_count: int,
+        duration_seconds: float,
+    ):
+        sql_insert = """
+            INSERT INTO backfill_journal (
+                statistics_type,
+                from_timestamp,
+                to_timestamp,
+                rows_count,
+                duration_seconds
+            ) VALUES (
+                %(statistics_type)s,
+                %(from_timestamp)s,
+                %(to_timestamp)s,
+                %(rows_count)s,
+                %(duration_seconds)s
+            )
+            ON CONFLICT ON CONSTRAINT backfill_journal_pk DO UPDATE SET
+                rows_count = EXCLUDED.rows_count,
+                duration_seconds = EXCLUDED.duration_seconds,
+                completed_at = EXCLUDED.completed_at
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                sql_insert,
+                {
+                    "statistics_type": statistics_type,
+                    "from_timestamp": from_timestamp,
+                    "to_timestamp": to_timestamp,
+                    "rows_count": rows_count,
+                    "duration_seconds": duration_seconds,
+                },
+            )
+            self.analytics_connection.commit()
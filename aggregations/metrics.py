@@ -0,0 +1,192 @@
+import contextlib
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import typing
+
+"""
+Metrics of the aggregations: counters, gauges and timers labelled with the aggregation name.
+The totals are exported to Prometheus textfile (for node_exporter textfile collector) at the end of the run,
+each computed period is also written as one line to JSON-lines log right away.
+Each process has its own registry. The worker processes return their totals to the parent with `drain`,
+the parent adds them to its own ones with `merge`, so the textfile covers the whole run.
+"""
+
+_Key = typing.Tuple[str, typing.Tuple[typing.Tuple[str, str], ...]]
+
+# The labels added to all the metrics recorded inside `Metrics.labels` block
+_current_labels = contextvars.ContextVar("metrics_labels", default={})
+
+
+class Metrics:
+    def __init__(self):
+        self.textfile_path: typing.Optional[str] = None
+        self.jsonl_path: typing.Optional[str] = None
+        self._lock = threading.Lock()
+        self._counters: typing.Dict[_Key, float] = {}
+        self._gauges: typing.Dict[_Key, float] = {}
+        # Timers are exported as Prometheus summaries: the sum of the durations and their count
+        self._timers: typing.Dict[_Key, typing.Tuple[float, int]] = {}
+
+    @contextlib.contextmanager
+    def labels(self, **labels: str):
+        token = _current_labels.set({**_current_labels.get(), **labels})
+        try:
+            yield
+        finally:
+            _current_labels.reset(token)
+
+    # For the values not related to any aggregation, even if they are recorded while computing one
+    @contextlib.contextmanager
+    def without_labels(self):
+        token = _current_labels.set({})
+        try:
+            yield
+        finally:
+            _current_labels.reset(token)
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        key = self._key(name, labels)
+        with self._lock:
+            total, count = self._timers.get(key, (0.0, 0))
+            self._timers[key] = (total + seconds, count + 1)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: str):
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start_time, **labels)
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def gauge_value(self, name: str, **labels: str) -> typing.Optional[float]:
+        with self._lock:
+            return self._gauges.get(self._key(name, labels))
+
+    # Writes one line to JSON-lines log if it's configured. The current labels are added to the fields
+    def event(self, **fields):
+        if self.jsonl_path is None:
+            return
+        line = json.dumps(
+            {"time": time.time(), **_current_labels.get(), **fields}, default=str
+        )
+        # One `write` of the whole line in append mode, the lines from the parallel workers are not mixed
+        with open(self.jsonl_path, "a") as f:
+            f.write(line + "\n")
+
+    # Takes away the collected totals, e.g. to send them from the worker process to the parent one
+    def drain(self) -> dict:
+        with self._lock:
+            snapshot = {
+                "counters": self._counters,
+                "gauges": self._gauges,
+                "timers": self._timers,
+            }
+            self._counters, self._gauges, self._timers = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot: dict):
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            self._gauges.update(snapshot["gauges"])
+            for key, (total, count) in snapshot["timers"].items():
+                current_total, current_count = self._timers.get(key, (0.0, 0))
+                self._timers[key] = (current_total + total, current_count + count)
+
+    def write_textfile(self):
+        if self.textfile_path is None:
+            return
+        lines = []
+        with self._lock:
+            for metric_type, values in (
+                ("counter", self._counters),
+                ("gauge", self._gauges),
+            ):
+                for name in sorted({name for (name, _) in values}):
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    for (key_name, labels), value in sorted(values.items()):
+                        if key_name == name:
+                            lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for (name, _) in self._timers}):
+                lines.append(f"# TYPE {name} summary")
+                for (key_name, labels), (total, count) in sorted(self._timers.items()):
+                    if key_name == name:
+                        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        directory = os.path.dirname(os.path.abspath(self.textfile_path))
+        # node_exporter should never see the partial file
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.chmod(temporary_path, 0o644)
+            os.replace(temporary_path, self.textfile_path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> _Key:
+        return name, tuple(sorted({**_current_labels.get(), **labels}.items()))
+
+
+# Wraps the rows given lazily, counts them and the time spent on getting them.
+# Used to split the time of the streaming aggregations, where reading and storing go together
+class TimedRows:
+    def __init__(self, rows: typing.Iterable):
+        self._rows = iter(rows)
+        self.rows_count = 0
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start_time = time.monotonic()
+        try:
+            row = next(self._rows)
+        finally:
+            self.seconds += time.monotonic() - start_time
+        self.rows_count += 1
+        return row
+
+
+def _format_labels(labels: typing.Tuple[typing.Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+METRICS = Metrics()
+
+
+def configure_metrics(
+    textfile_path: typing.Optional[str], jsonl_path: typing.Optional[str]
+):
+    METRICS.textfile_path = textfile_path
+    METRICS.jsonl_path = jsonl_path
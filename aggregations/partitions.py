@@ -0,0 +1,229 @@
+import calendar
+import dataclasses
+import datetime
+import psycopg2
+import psycopg2.sql
+import typing
+
+from .db_tables import date_range_json
+from .granularity import MONTHLY
+
+"""
+Monthly range partitions of the big per-account tables, see `PARTITION_COLUMN` and `partitioned` option.
+The partition of the month is named `<table>_pYYYY_MM`, it's created before the first rows of the month are stored.
+The old partitions could be detached: they become the usual tables, which could be archived or dropped
+without touching the rest of the data.
+The month could be rebuilt aside, in the replacement table, and swapped in at once:
+the readers see either the old data or the new one, never the empty month.
+"""
+
+_PARTITION_SUFFIX_FORMAT = "_p%Y_%m"
+_REPLACEMENT_SUFFIX = "_rebuild"
+_RANGE_CHECK_NAME = "rebuild_range_check"
+
+
+@dataclasses.dataclass
+class MonthlyPartitions:
+    analytics_connection: psycopg2.extensions.connection
+    table: str
+    column: str
+
+    def is_partitioned(self) -> bool:
+        sql_select = """
+            SELECT EXISTS (
+                SELECT 1
+                FROM pg_partitioned_table
+                WHERE partrelid = to_regclass(%(table)s)
+            )
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select, {"table": self.table})
+            return analytics_cursor.fetchone()[0]
+
+    # The attached partitions: {month_start: partition name}
+    def partitions(self) -> typing.Dict[int, str]:
+        sql_select = """
+            SELECT partition.relname
+            FROM pg_inherits
+            JOIN pg_class AS partition ON partition.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%(table)s)
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select, {"table": self.table})
+            names = [name for (name,) in analytics_cursor.fetchall()]
+        result = {}
+        for name in names:
+            try:
+                month = datetime.datetime.strptime(
+                    name[len(self.table) :], _PARTITION_SUFFIX_FORMAT
+                )
+            except ValueError:
+                # Not created by us, e.g. the default partition
+                continue
+            result[_to_timestamp(month)] = name
+        return result
+
+    def partition_name(self, month_start: int) -> str:
+        return self.table + datetime.datetime.utcfromtimestamp(month_start).strftime(
+            _PARTITION_SUFFIX_FORMAT
+        )
+
+    # Creates the missing partitions for [from_timestamp, to_timestamp).
+    # Does nothing if the table is not partitioned
+    def create(self, from_timestamp: int, to_timestamp: int):
+        if not self.is_partitioned():
+            return
+        months = _months(from_timestamp, to_timestamp)
+        if not set(months) - self.partitions().keys():
+            return
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                # The parallel workers could create the same partition at the same time,
+                # so the partitions are checked again under the lock.
+                # The detached partition keeps its name, creating it again fails loudly
+                analytics_cursor.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext(%(table)s))",
+                    {"table": self.table},
+                )
+                existing = self.partitions()
+                missing = [
+                    month_start for month_start in months if month_start not in existing
+                ]
+                for month_start in missing:
+                    analytics_cursor.execute(
+                        psycopg2.sql.SQL(
+                            """
+                            CREATE TABLE {partition}
+                            PARTITION OF {table}
+                            FOR VALUES FROM (%(from_day)s) TO (%(to_day)s)
+                        """
+                        ).format(
+                            partition=psycopg2.sql.Identifier(
+                                self.partition_name(month_start)
+                            ),
+                            table=psycopg2.sql.Identifier(self.table),
+                        ),
+                        _month_range(month_start),
+                    )
+                self.analytics_connection.commit()
+            except Exception:
+                self.analytics_connection.rollback()
+                raise
+        for month_start in missing:
+            print(f"Created partition {self.partition_name(month_start)}")
+
+    # Detaches the partitions of the months finished before the given timestamp.
+    # Returns the names of the detached tables, they are not dropped
+    def detach_before(self, timestamp: int) -> typing.List[str]:
+        detached = []
+        for month_start, name in sorted(self.partitions().items()):
+            if MONTHLY.end_of_range(month_start) > timestamp:
+                continue
+            with self.analytics_connection.cursor() as analytics_cursor:
+                analytics_cursor.execute(
+                    psycopg2.sql.SQL(
+                        "ALTER TABLE {table} DETACH PARTITION {partition}"
+                    ).format(
+                        table=psycopg2.sql.Identifier(self.table),
+                        partition=psycopg2.sql.Identifier(name),
+                    )
+                )
+                self.analytics_connection.commit()
+            detached.append(name)
+        return detached
+
+    # Creates the empty table to rebuild the month in, with the same columns and indexes as the partitions.
+    # The check constraint lets `swap` attach it without scanning the rows
+    def create_replacement(self, month_start: int) -> str:
+        replacement = self.partition_name(month_start) + _REPLACEMENT_SUFFIX
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(
+                    psycopg2.sql.SQL(
+                        """
+                        DROP TABLE IF EXISTS {replacement};
+                        CREATE TABLE {replacement}
+                            (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES);
+                        ALTER TABLE {replacement} ADD CONSTRAINT {range_check}
+                            CHECK ({column} >= %(from_day)s AND {column} < %(to_day)s)
+                    """
+                    ).format(
+                        replacement=psycopg2.sql.Identifier(replacement),
+                        table=psycopg2.sql.Identifier(self.table),
+                        range_check=psycopg2.sql.Identifier(_RANGE_CHECK_NAME),
+                        column=psycopg2.sql.Identifier(self.column),
+                    ),
+                    _month_range(month_start),
+                )
+                self.analytics_connection.commit()
+            except Exception:
+                self.analytics_connection.rollback()
+                raise
+        return replacement
+
+    def drop_replacement(self, replacement: str):
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                psycopg2.sql.SQL("DROP TABLE IF EXISTS {replacement}").format(
+                    replacement=psycopg2.sql.Identifier(replacement)
+                )
+            )
+            self.analytics_connection.commit()
+
+    # Replaces the partition of the month with the replacement table in one transaction:
+    # if anything fails after DETACH, the rollback attaches the old partition back
+    def swap(self, month_start: int, replacement: str):
+        name = psycopg2.sql.Identifier(self.partition_name(month_start))
+        table = psycopg2.sql.Identifier(self.table)
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext(%(table)s))",
+                    {"table": self.table},
+                )
+                if month_start in self.partitions():
+                    analytics_cursor.execute(
+                        psycopg2.sql.SQL(
+                            """
+                            ALTER TABLE {table} DETACH PARTITION {name};
+                            DROP TABLE {name}
+                        """
+                        ).format(table=table, name=name)
+                    )
+                analytics_cursor.execute(
+                    psycopg2.sql.SQL(
+                        """
+                        ALTER TABLE {table} ATTACH PARTITION {replacement}
+                            FOR VALUES FROM (%(from_day)s) TO (%(to_day)s);
+                        ALTER TABLE {replacement} RENAME TO {name};
+                        ALTER TABLE {name} DROP CONSTRAINT {range_check}
+                    """
+                    ).format(
+                        table=table,
+                        replacement=psycopg2.sql.Identifier(replacement),
+                        name=name,
+                        range_check=psycopg2.sql.Identifier(_RANGE_CHECK_NAME),
+                    ),
+                    _month_range(month_start),
+                )
+                self.analytics_connection.commit()
+            except Exception:
+                self.analytics_connection.rollback()
+                raise
+
+
+def _months(from_timestamp: int, to_timestamp: int) -> typing.List[int]:
+    result = []
+    month_start = MONTHLY.start_of_range(from_timestamp)
+    while month_start < to_timestamp:
+        result.append(month_start)
+        month_start = MONTHLY.end_of_range(month_start)
+    return result
+
+
+def _month_range(month_start: int) -> dict:
+    return date_range_json(month_start, MONTHLY.end_of_range(month_start) - month_start)
+
+
+def _to_timestamp(day: datetime.datetime) -> int:
+    return calendar.timegm(day.timetuple())
@@ -1,56 +1,438 @@
 import abc
 import datetime
+import itertools
+import psycopg2.sql
+import typing
 
 from .sql_aggregations import SqlAggregations
-from .db_tables import time_range_json
+from .db_tables import (
+    DAY_LEN_SECONDS,
+    date_range_json,
+    day_to_timestamp,
+    time_range_json,
+)
+from .granularity import MONTHLY, Granularity
+from .partitions import MonthlyPartitions
+from .scan_groups import SCAN_GROUPS, shared_scan
+from .sketches import DistinctCountSketches
+from .watermark import WATERMARK
+
+# Adding 10 minutes to be sure that all the data is collected
+# Important for DailyIngoingTransactionsPerAccountCount
+INDEXER_LAG_SECONDS = 10 * 60
 
 
 class PeriodicAggregations(SqlAggregations):
+    # The periods the aggregation is computed for, see `granularity.py`
+    @property
     @abc.abstractmethod
-    def start_of_range(self, timestamp: int) -> int:
+    def granularity(self) -> Granularity:
         pass
 
+    # timestamp will be rounded to the start of the day, week (Monday), month, etc.
+    def start_of_range(self, timestamp: int) -> int:
+        return self.granularity.start_of_range(timestamp)
+
+    # The start of the next period, the periods could have different lengths
+    def end_of_range(self, start_of_range: int) -> int:
+        return self.granularity.end_of_range(start_of_range)
+
+    # The parameters of the queries for the period:
+    # `from_timestamp` and `to_timestamp` (nanoseconds) for Indexer DB,
+    # `from_day` and `to_day` for Analytics DB
+    def time_parameters(self, start_of_range: int) -> dict:
+        from_timestamp, to_timestamp = self.granularity.data_range(start_of_range)
+        return self._time_parameters(from_timestamp, to_timestamp)
+
+    # The parameters of `sql_select` and `sql_select_range` apart from the time ones,
+    # e.g. the data taken from Analytics DB. They are passed as the query parameters,
+    # so the query text stays the same whatever the data is
+    def query_parameters(self) -> dict:
+        return {}
+
+    # The same query as `sql_select`, but for several periods at once.
+    # The first column should be the start of the period (in seconds) the row belongs to,
+    # other columns should be the same as in `sql_select`.
+    # The rows should be sorted by the period, `collect_range` prepares the periods one by one.
+    # Leave it empty if the aggregation can't be computed this way,
+    # `collect_range` will compute the periods one by one then
     @property
-    @abc.abstractmethod
-    def duration_seconds(self) -> int:
-        pass
+    def sql_select_range(self) -> typing.Optional[str]:
+        return None
+
+    # The query to Analytics DB used instead of `sql_select` in `rollup` mode.
+    # The result should be the same as for `sql_select`.
+    # Apart from the parameters of `sql_select`, `from_day` and `to_day` are available
+    @property
+    def sql_rollup_select(self) -> typing.Optional[str]:
+        return None
+
+    # The same as `sql_select_range`, but for `sql_rollup_select`
+    @property
+    def sql_rollup_select_range(self) -> typing.Optional[str]:
+        return None
+
+    def uses_rollup(self) -> bool:
+        return self.rollup and self.sql_rollup_select is not None
+
+    # The query to Analytics DB returning the values counted by the aggregation for the period,
+    # it's used to build the sketch if the aggregation declares `SKETCH_TYPE`.
+    # `from_day` and `to_day` parameters are available
+    @property
+    def sql_select_sketch_values(self) -> typing.Optional[str]:
+        return None
+
+    # `PARTITION BY` clause for `sql_create_table` of the aggregations with `PARTITION_COLUMN`
+    @property
+    def sql_partition_by(self) -> str:
+        if not self.partitioned or self.PARTITION_COLUMN is None:
+            return ""
+        return f"PARTITION BY RANGE ({self.PARTITION_COLUMN})"
+
+    # None if the aggregation can't be partitioned. The table could be partitioned by the previous runs
+    # even if `partitioned` option is not given now, the partitions are maintained anyway
+    @property
+    def partitions(self) -> typing.Optional[MonthlyPartitions]:
+        if self.PARTITION_COLUMN is None:
+            return None
+        return MonthlyPartitions(
+            self.analytics_connection, self.COPY_TABLE, self.PARTITION_COLUMN
+        )
+
+    def create_table(self):
+        super().create_table()
+        if self.sql_partition_by and not self.partitions.is_partitioned():
+            # `CREATE TABLE IF NOT EXISTS` has kept the existing table as is
+            raise ValueError(
+                f"{self.COPY_TABLE} is not partitioned, recompute it from scratch to partition it"
+            )
+        if self.SKETCH_TYPE is not None:
+            DistinctCountSketches(self.analytics_connection).create_table()
+
+    def drop_table(self):
+        super().drop_table()
+        if self.SKETCH_TYPE is not None:
+            DistinctCountSketches(self.analytics_connection).delete(self.SKETCH_TYPE)
+
+    def store(self, parameters: typing.Iterable[tuple]) -> int:
+        if self.SKETCH_TYPE is None:
+            return super().store(parameters)
+        # The days are noted while the rows go by, the `STREAMING` rows are never kept all together
+        days = set()
+        rows_count = super().store(_noting_days(parameters, days))
+        self.build_sketches(days)
+        return rows_count
+
+    def build_sketches(self, days: typing.Iterable[str]):
+        sketches = DistinctCountSketches(self.analytics_connection)
+        for day in sorted(days):
+            sketches.build(
+                self.SKETCH_TYPE,
+                day,
+                self.sql_select_sketch_values,
+                self.time_parameters(day_to_timestamp(day)),
+            )
+
+    # Builds the missing sketches of the days already stored in the table, e.g. the days stored
+    # before the sketches were kept. The sketches are built from the stored rows, Indexer DB is not used.
+    # Returns the days the sketches are built for
+    def build_missing_sketches(self) -> typing.List[str]:
+        if self.SKETCH_TYPE is None or self.PARTITION_COLUMN is None:
+            raise ValueError(
+                f"{self.COPY_TABLE} does not keep the daily sketches of its rows"
+            )
+        sql_select_stored_range = psycopg2.sql.SQL(
+            "SELECT MIN({column}), MAX({column}) FROM {table}"
+        ).format(
+            column=psycopg2.sql.Identifier(self.PARTITION_COLUMN),
+            table=psycopg2.sql.Identifier(self.COPY_TABLE),
+        )
+        # Only the days with the rows are built, the empty sketch of a day
+        # that was never collected would hide it from `MissingSketchesError`
+        sql_select_stored_days = psycopg2.sql.SQL(
+            """
+            SELECT day
+            FROM UNNEST(%(days)s::DATE[]) AS day
+            WHERE EXISTS (SELECT 1 FROM {table} WHERE {column} = day)
+            """
+        ).format(
+            column=psycopg2.sql.Identifier(self.PARTITION_COLUMN),
+            table=psycopg2.sql.Identifier(self.COPY_TABLE),
+        )
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select_stored_range)
+            first_day, last_day = analytics_cursor.fetchone()
+        if first_day is None:
+            return []
+        missing_days = DistinctCountSketches(self.analytics_connection).missing_days(
+            self.SKETCH_TYPE,
+            day_to_timestamp(str(first_day)),
+            day_to_timestamp(str(last_day)) + DAY_LEN_SECONDS,
+        )
+        if not missing_days:
+            return []
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select_stored_days, {"days": missing_days})
+            days = [str(day) for (day,) in analytics_cursor.fetchall()]
+        self.build_sketches(days)
+        return days
+
+    # Overload this method if the aggregation declares `SCAN_GROUP`.
+    # It gets the result of the group query and should return the same rows as `sql_select` does
+    @staticmethod
+    def rows_from_scan(rows: list) -> list:
+        raise NotImplementedError("The aggregation does not belong to any scan group")
 
     # requested_timestamp will be rounded to the start of the day, week (Monday), month, etc.
     def collect(self, requested_timestamp: int) -> list:
+        return list(self.iter_collect(requested_timestamp))
+
+    # The same as `collect`, but the rows are read and prepared lazily.
+    # For `STREAMING` aggregations Indexer DB is read by batches with the server-side cursor
+    def iter_collect(self, requested_timestamp: int) -> typing.Iterator[tuple]:
         from_timestamp = self.start_of_range(requested_timestamp)
-        if not self.is_indexer_ready(from_timestamp + self.duration_seconds):
-            return []
-        with self.indexer_connection.cursor() as indexer_cursor:
-            indexer_cursor.execute(
-                self.sql_select, time_range_json(from_timestamp, self.duration_seconds)
+        if not self.is_indexer_ready(self.end_of_range(from_timestamp)):
+            return
+        self.create_partitions(from_timestamp, self.end_of_range(from_timestamp))
+        parameters = self.time_parameters(from_timestamp)
+        if self.uses_rollup():
+            rows = self._query(
+                self.analytics_connection, self.sql_rollup_select, parameters
+            )
+        else:
+            rows = self._select_from_indexer(parameters)
+        yield from self.prepare_data(rows, start_of_range=from_timestamp)
+
+    # The rows of `sql_select` (before `prepare_data`) for any time range inside one period.
+    # Used by `ADDITIVE` aggregations to collect the unfinished period by slices, see `intraday.py`
+    def collect_slice(self, from_timestamp: int, to_timestamp: int) -> list:
+        return list(
+            self._select_from_indexer(
+                self._time_parameters(from_timestamp, to_timestamp)
+            )
+        )
+
+    # Collects the aggregations for all the periods starting from the period with from_timestamp
+    # and till to_timestamp (exclusive).
+    # The periods not finished in Indexer DB are skipped, see `is_indexer_ready`.
+    # The result is the same as the concatenation of `collect` results for all these periods,
+    # but it's computed by one request to Indexer DB if `sql_select_range` is provided
+    def collect_range(self, from_timestamp: int, to_timestamp: int) -> list:
+        return list(self.iter_collect_range(from_timestamp, to_timestamp))
+
+    # The same as `collect_range`, but the rows are read and prepared lazily, see `iter_collect`
+    def iter_collect_range(
+        self, from_timestamp: int, to_timestamp: int
+    ) -> typing.Iterator[tuple]:
+        all_periods = self.periods(from_timestamp, to_timestamp)
+        if not all_periods:
+            return
+        latest_timestamp = WATERMARK.latest_timestamp(
+            self.indexer_connection,
+            self.end_of_range(all_periods[-1]) + INDEXER_LAG_SECONDS,
+        )
+        periods = [
+            period_start
+            for period_start in all_periods
+            if self.is_period_finished(
+                self.end_of_range(period_start), latest_timestamp
+            )
+        ]
+        if not periods:
+            return
+        self.create_partitions(periods[0], self.end_of_range(periods[-1]))
+
+        if self.uses_rollup():
+            connection = self.analytics_connection
+            sql_select_range = self.sql_rollup_select_range
+        else:
+            connection = self.indexer_connection
+            sql_select_range = self.sql_select_range
+        if sql_select_range is None:
+            for period_start in periods:
+                yield from self.collect(period_start)
+            return
+
+        # The rows are sorted by the period, so we could prepare the periods one by one
+        # without keeping all the rows in memory
+        rows = self._query(
+            connection,
+            sql_select_range,
+            {
+                **self._time_parameters(
+                    self.granularity.data_range(periods[0])[0],
+                    self.granularity.data_range(periods[-1])[1],
+                ),
+                **({} if self.uses_rollup() else self.query_parameters()),
+            },
+        )
+        rows_by_period = itertools.groupby(rows, key=lambda row: int(row[0]))
+        current_period, current_rows = next(rows_by_period, (None, None))
+        for period_start in periods:
+            period_rows = []
+            if current_period == period_start:
+                period_rows = (tuple(row) for (_, *row) in current_rows)
+                if not self.STREAMING:
+                    period_rows = list(period_rows)
+            yield from self.prepare_data(period_rows, start_of_range=period_start)
+            if current_period == period_start:
+                # The group is consumed by `prepare_data`, it's safe to move to the next one
+                current_period, current_rows = next(rows_by_period, (None, None))
+
+    # Creates the partitions for the rows of [from_timestamp, to_timestamp) if the table is partitioned.
+    # It's called before the rows are stored, in its own transaction: the store transaction
+    # would keep the lock of the new partition till the end of the store
+    def create_partitions(self, from_timestamp: int, to_timestamp: int):
+        if self.partitions is not None:
+            self.partitions.create(from_timestamp, to_timestamp)
+
+    # Recomputes the month with the given timestamp in the separate table and swaps it with the month partition.
+    # The unfinished periods of the month are not stored, as usual.
+    # Returns the number of the stored rows
+    def rebuild_partition(self, timestamp: int) -> int:
+        if self.partitions is None or not self.partitions.is_partitioned():
+            raise ValueError(f"{self.COPY_TABLE} is not partitioned")
+        month_start = MONTHLY.start_of_range(timestamp)
+        replacement = self.partitions.create_replacement(month_start)
+        days = set()
+        try:
+            rows_count = self.copy_store(
+                _noting_days(
+                    self.iter_collect_range(
+                        month_start, MONTHLY.end_of_range(month_start)
+                    ),
+                    days,
+                ),
+                table=replacement,
+            )
+            if rows_count == 0:
+                # Indexer DB has nothing for the month yet, swapping would lose the stored rows
+                raise ValueError(
+                    f"Nothing is collected for {self.COPY_TABLE} at {timestamp}, the partition is kept"
+                )
+            self.partitions.swap(month_start, replacement)
+        except Exception:
+            # The old partition is still attached, only the replacement is left to clean up
+            self.partitions.drop_replacement(replacement)
+            raise
+        if self.SKETCH_TYPE is not None:
+            self.build_sketches(days)
+        return rows_count
+
+    # Starts of all the periods from the period with from_timestamp till to_timestamp (exclusive)
+    def periods(self, from_timestamp: int, to_timestamp: int) -> typing.List[int]:
+        result = []
+        period_start = self.start_of_range(from_timestamp)
+        while period_start < to_timestamp:
+            result.append(period_start)
+            period_start = self.end_of_range(period_start)
+        return result
+
+    # The query to Indexer DB `collect` runs for the period (the group query for `SCAN_GROUP` members)
+    # and its parameters, e.g. to check the query plan, see `query_plans.py`
+    def indexer_query(self, start_of_range: int) -> typing.Tuple[str, dict]:
+        parameters = self.time_parameters(start_of_range)
+        if self.SCAN_GROUP is not None:
+            return SCAN_GROUPS[self.SCAN_GROUP], parameters
+        return self.sql_select, {**parameters, **self.query_parameters()}
+
+    def _select_from_indexer(self, parameters: dict) -> typing.Iterable[tuple]:
+        if self.SCAN_GROUP is not None:
+            return self.rows_from_scan(
+                shared_scan(self.indexer_connection, self.SCAN_GROUP, parameters)
             )
-            result = indexer_cursor.fetchall()
-            return self.prepare_data(result, start_of_range=from_timestamp)
+        return self._query(
+            self.indexer_connection,
+            self.sql_select,
+            {**parameters, **self.query_parameters()},
+        )
+
+    # Reads the query result by batches for `STREAMING` aggregations.
+    # Analytics DB is always read at once: `copy_store` writes there at the same time
+    def _query(self, connection, sql: str, parameters: dict) -> typing.Iterable[tuple]:
+        if not self.STREAMING or connection is self.analytics_connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, parameters)
+                return cursor.fetchall()
+        return _stream_query(connection, sql, parameters)
+
+    @staticmethod
+    def _time_parameters(from_timestamp: int, to_timestamp: int) -> dict:
+        duration = to_timestamp - from_timestamp
+        return {
+            **time_range_json(from_timestamp, duration),
+            **date_range_json(from_timestamp, duration),
+        }
 
     @staticmethod
     def prepare_data(parameters: list, *, start_of_range=None, **kwargs) -> list:
-        # We usually have one-value returns, we need to merge it with corresponding date
-        if len(parameters[0]) == 1:
+        # We usually have one-value returns, we need to merge it with corresponding date.
+        # Range queries give no rows at all for the periods without any data
+        if not parameters or len(parameters[0]) == 1:
             assert (
-                len(parameters) == 1
+                len(parameters) <= 1
             ), "Only one value expected. Can't be sure that we need to add timestamp"
             computed_for = datetime.datetime.utcfromtimestamp(start_of_range)
-            parameters = [(computed_for, parameters[0][0] or 0)]
+            value = parameters[0][0] if parameters else None
+            parameters = [(computed_for, value or 0)]
         return [
             (computed_for.strftime("%Y-%m-%d"), data)
             for (computed_for, data) in parameters
         ]
 
+    # The latest timestamp of Indexer DB is cached, see `watermark.py`
     def is_indexer_ready(self, needed_timestamp):
-        select_latest_timestamp = """
-            SELECT DIV(block_timestamp, 1000 * 1000 * 1000)
-            FROM blocks
-            ORDER BY block_timestamp DESC
-            LIMIT 1
-        """
-        with self.indexer_connection.cursor() as indexer_cursor:
-            indexer_cursor.execute(select_latest_timestamp)
-            latest_timestamp = indexer_cursor.fetchone()[0]
-            # Adding 10 minutes to be sure that all the data is collected
-            # Important for DailyIngoingTransactionsPerAccountCount
-            return latest_timestamp >= needed_timestamp + 10 * 60
+        return self.is_period_finished(
+            needed_timestamp,
+            WATERMARK.latest_timestamp(
+                self.indexer_connection, needed_timestamp + INDEXER_LAG_SECONDS
+            ),
+        )
+
+    @staticmethod
+    def is_period_finished(needed_timestamp, latest_timestamp) -> bool:
+        return latest_timestamp >= needed_timestamp + INDEXER_LAG_SECONDS
+
+
+# The aggregations could also keep HyperLogLog sketch of the distinct values (e.g. accounts) for each period,
+# so the distinct count for any window could be estimated later, see `sketches.py`.
+# The sketch is built from `sql_select_sketch_values` after the period is stored,
+# so the query should read the table of the aggregation itself or its `DEPENDENCIES`
+PeriodicAggregations.SKETCH_TYPE = None
+
+# Set to True if the rows of `sql_select` for the adjacent time ranges could be combined into the rows
+# for the whole range by summing up the values of the rows with the same key.
+# The first `ADDITIVE_KEY_COLUMNS` columns of `sql_select` are the key, the rest are the summed values.
+# Such aggregations could be computed for the unfinished period by hourly slices, see `intraday.py`
+PeriodicAggregations.ADDITIVE = False
+PeriodicAggregations.ADDITIVE_KEY_COLUMNS = 0
+
+# Set to True if `prepare_data` accepts any iterable of rows, not only the list, and does not build the list itself.
+# Such aggregations are read from Indexer DB and written to Analytics DB by batches,
+# so the memory does not depend on the number of rows in the period
+PeriodicAggregations.STREAMING = False
+
+# The DATE column of `COPY_TABLE` to partition the table by months with `partitioned` option, see `partitions.py`.
+# `sql_create_table` should end the table definition with `sql_partition_by`,
+# and the primary key should include the column
+PeriodicAggregations.PARTITION_COLUMN = None
+
+# The number of rows fetched from the server-side cursor at once
+STREAM_BATCH_SIZE = 10000
+
+
+# Passes the rows through and adds the first column of each row (the day) to `days`
+def _noting_days(
+    rows: typing.Iterable[tuple], days: typing.Set[str]
+) -> typing.Iterator[tuple]:
+    for row in rows:
+        days.add(row[0])
+        yield row
+
+
+def _stream_query(connection, sql: str, parameters: dict) -> typing.Iterator[tuple]:
+    # The named cursor is the server-side one, the rows are fetched by `itersize` batches
+    with connection.cursor(name="periodic_aggregations_stream") as cursor:
+        cursor.itersize = STREAM_BATCH_SIZE
+        cursor.execute(sql, parameters)
+        yield from cursor
@@ -0,0 +1,219 @@
+import concurrent.futures
+import multiprocessing
+import traceback
+import typing
+
+from .metrics import METRICS
+from .scan_groups import clear_shared_scans
+
+
+class CircularDependencyError(ValueError):
+    pass
+
+
+# The aggregations computed one after another by the same worker,
+# each of them goes with its dependencies from the same batch
+_Batch = typing.List[typing.Tuple[str, typing.List[str]]]
+
+
+def dependencies_of(
+    stats: dict, statistics_type: str, rollup: bool = False
+) -> typing.List[str]:
+    try:
+        statistics_cls = stats[statistics_type]
+    except KeyError:
+        raise ValueError(f"Unknown aggregation {statistics_type}") from None
+    dependencies = list(statistics_cls.DEPENDENCIES)
+    if rollup:
+        dependencies += statistics_cls.ROLLUP_DEPENDENCIES
+    return dependencies
+
+
+# Builds the dependency graph for the requested aggregations and returns
+# all the aggregations that have to be computed, including the dependencies.
+# Each aggregation appears exactly once, and all its dependencies go before it.
+# The cycles are detected here, before we start any computation.
+def plan_statistics(
+    stats: dict,
+    requested_types: typing.Iterable[str],
+    skip_types: typing.Iterable[str] = (),
+    rollup: bool = False,
+) -> typing.List[str]:
+    skip_types = set(skip_types)
+    plan = []
+    visited = set()
+    # The path of the depth-first search, used to show the cycle if we find it
+    in_progress = []
+
+    def visit(statistics_type: str):
+        if statistics_type in in_progress:
+            cycle = in_progress[in_progress.index(statistics_type) :]
+            raise CircularDependencyError(
+                f"Circular dependency found: {' -> '.join(cycle + [statistics_type])}"
+            )
+        if statistics_type in visited:
+            return
+        in_progress.append(statistics_type)
+        for dependency in dependencies_of(stats, statistics_type, rollup):
+            visit(dependency)
+        in_progress.pop()
+        visited.add(statistics_type)
+        if statistics_type not in skip_types:
+            plan.append(statistics_type)
+
+    # Sorting gives us the same order from run to run
+    for statistics_type in sorted(requested_types):
+        visit(statistics_type)
+    return plan
+
+
+# Computes the plan, running up to `jobs` aggregations at the same time.
+# Each aggregation starts only after all its dependencies are stored.
+# If the aggregation fails, everything depending on it is skipped.
+# `compute_function` takes the aggregation name; with `jobs` > 1 it is called in
+# a separate process, so it should be picklable.
+# The worker processes are started from scratch and do not inherit the parent connections,
+# use `initializer` to open the connections in each of them.
+# The aggregations with the same `batch_key` (e.g. the same scan group) that are ready
+# at the same time are computed one after another by the same worker.
+# Returns the sets of computed and failed aggregations.
+def execute_plan(
+    stats: dict,
+    plan: typing.List[str],
+    compute_function: typing.Callable[[str], None],
+    jobs: int = 1,
+    initializer: typing.Optional[typing.Callable] = None,
+    initargs: tuple = (),
+    batch_key: typing.Callable[[str], typing.Optional[str]] = lambda _: None,
+    rollup: bool = False,
+) -> typing.Tuple[typing.Set[str], typing.Set[str]]:
+    if jobs < 1:
+        raise ValueError(f"jobs should be positive, got {jobs}")
+
+    computed = set()
+    failed = set()
+    pending = list(plan)
+    running = {}
+
+    def on_done(statistics_type: str, error: typing.Optional[str]):
+        if error is None:
+            computed.add(statistics_type)
+            return
+        print(f"Failed to compute the value for {statistics_type}")
+        print(error)
+        failed.add(statistics_type)
+
+    # Takes the aggregations which could be started right now from `pending`.
+    # Dependencies missing in the plan are considered to be computed already
+    def take_ready_batches() -> typing.List[_Batch]:
+        batches = {}
+        for statistics_type in list(pending):
+            dependencies = [
+                dependency
+                for dependency in dependencies_of(stats, statistics_type, rollup)
+                if dependency in plan
+            ]
+            failed_dependencies = failed.intersection(dependencies)
+            if failed_dependencies:
+                print(
+                    f"Skipping {statistics_type} because of failed dependencies: [{' '.join(failed_dependencies)}]"
+                )
+                failed.add(statistics_type)
+                pending.remove(statistics_type)
+                continue
+            key = batch_key(statistics_type)
+            if key is None:
+                # Each aggregation without the key goes into its own batch
+                key = ("aggregation", statistics_type)
+            batch = batches.get(key, [])
+            # The batch is computed in order, so the aggregation could go after its dependencies
+            # from the same batch (e.g. the same scan group) instead of waiting for them
+            batch_dependencies = [
+                dependency for dependency in dependencies if dependency not in computed
+            ]
+            batch_types = {batch_statistics_type for batch_statistics_type, _ in batch}
+            if batch_types.issuperset(batch_dependencies):
+                batches[key] = batch + [(statistics_type, batch_dependencies)]
+                pending.remove(statistics_type)
+        return list(batches.values())
+
+    if jobs == 1:
+        while pending:
+            batches = take_ready_batches()
+            if not batches and pending:
+                # The plan is sorted, so it should never happen
+                raise RuntimeError(f"Could not schedule [{' '.join(pending)}]")
+            for batch in batches:
+                for statistics_type, error in _compute_batch(compute_function, batch):
+                    on_done(statistics_type, error)
+        return computed, failed
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=initializer,
+        initargs=initargs,
+    ) as executor:
+        while pending or running:
+            for batch in take_ready_batches():
+                running[
+                    executor.submit(_compute_batch_in_worker, compute_function, batch)
+                ] = batch
+            if not running:
+                if pending:
+                    # The plan is sorted, so it should never happen
+                    raise RuntimeError(f"Could not schedule [{' '.join(pending)}]")
+                break
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                batch = running.pop(future)
+                try:
+                    results, metrics = future.result()
+                    METRICS.merge(metrics)
+                except Exception:
+                    # The worker itself is broken, e.g. it was killed
+                    results = [
+                        (statistics_type, traceback.format_exc())
+                        for statistics_type, _ in batch
+                    ]
+                for statistics_type, error in results:
+                    on_done(statistics_type, error)
+    return computed, failed
+
+
+# Returns the error (with traceback) for each of the given aggregations, None if it's computed.
+# The aggregation is skipped if its dependency from the same batch has failed
+def _compute_batch(
+    compute_function: typing.Callable[[str], None], batch: _Batch
+) -> typing.List[typing.Tuple[str, typing.Optional[str]]]:
+    results = []
+    failed = set()
+    for statistics_type, batch_dependencies in batch:
+        failed_dependencies = failed.intersection(batch_dependencies)
+        if failed_dependencies:
+            results.append(
+                (
+                    statistics_type,
+                    f"Skipped because of failed dependencies: [{' '.join(failed_dependencies)}]",
+                )
+            )
+            failed.add(statistics_type)
+            continue
+        try:
+            compute_function(statistics_type)
+            results.append((statistics_type, None))
+        except Exception:
+            results.append((statistics_type, traceback.format_exc()))
+            failed.add(statistics_type)
+    # The scan group of the batch is done, its shared result is not needed anymore
+    clear_shared_scans()
+    return results
+
+
+# `_compute_batch` for the worker process, the metrics of the worker go to the parent, see `metrics.py`
+def _compute_batch_in_worker(
+    compute_function: typing.Callable[[str], None], batch: _Batch
+) -> typing.Tuple[typing.List[typing.Tuple[str, typing.Optional[str]]], dict]:
+    return _compute_batch(compute_function, batch), METRICS.drain()
@@ -0,0 +1,233 @@
+import dataclasses
+import hashlib
+import json
+import psycopg2
+import psycopg2.sql
+import typing
+
+from .periodic_aggregations import PeriodicAggregations
+
+"""
+The plans of Indexer DB queries, captured with `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`.
+The plan is compared with the last good plan of the same aggregation,
+the capture is flagged as the regression if the plan shape has changed
+(the node types, the relations and the indexes, without costs and row counts)
+or the query has touched much more buffers.
+The number of the touched buffers (shared hit + shared read) is used instead of the disk reads alone:
+the disk reads depend on what is in the cache at the moment, the touched buffers depend only on the plan and the data.
+If the new plan is expected (e.g. a new index), clear `regression` of its capture, it becomes the last good one.
+"""
+
+# The capture is flagged if the query touches this times more buffers than the last good capture
+BUFFERS_GROWTH_THRESHOLD = 2.0
+# The queries touching fewer buffers are never flagged, their variance is high and they are fast anyway
+MIN_FLAGGED_BUFFERS = 10000
+
+
+class QueryPlan(typing.NamedTuple):
+    plan_shape: str
+    plan_hash: str
+    planning_time_ms: float
+    execution_time_ms: float
+    shared_hit_blocks: int
+    shared_read_blocks: int
+    plan: list
+
+    @property
+    def touched_blocks(self) -> int:
+        return self.shared_hit_blocks + self.shared_read_blocks
+
+
+@dataclasses.dataclass
+class QueryPlans:
+    analytics_connection: psycopg2.extensions.connection
+
+    def create_table(self):
+        # `period_start` is in seconds, as everywhere in Python code.
+        # `regression` is empty for the good captures, otherwise it explains what has changed
+        sql_create_table = """
+            CREATE TABLE IF NOT EXISTS query_plans
+            (
+                statistics_type    TEXT             NOT NULL,
+                period_start       BIGINT           NOT NULL,
+                captured_at        TIMESTAMP        NOT NULL DEFAULT now(),
+                plan_hash          TEXT             NOT NULL,
+                plan_shape         TEXT             NOT NULL,
+                planning_time_ms   DOUBLE PRECISION NOT NULL,
+                execution_time_ms  DOUBLE PRECISION NOT NULL,
+                shared_hit_blocks  BIGINT           NOT NULL,
+                shared_read_blocks BIGINT           NOT NULL,
+                regression         TEXT             NOT NULL,
+                plan               JSONB            NOT NULL,
+                CONSTRAINT query_plans_pk PRIMARY KEY (statistics_type, captured_at)
+            )
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(sql_create_table)
+                self.analytics_connection.commit()
+            except psycopg2.errors.DuplicateTable:
+                self.analytics_connection.rollback()
+
+    def last_good(self, statistics_type: str) -> typing.Optional[QueryPlan]:
+        sql_select = """
+            SELECT
+                plan_shape,
+                plan_hash,
+                planning_time_ms,
+                execution_time_ms,
+                shared_hit_blocks,
+                shared_read_blocks,
+                plan
+            FROM query_plans
+            WHERE statistics_type = %(statistics_type)s
+                AND regression = ''
+            ORDER BY captured_at DESC
+            LIMIT 1
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(sql_select, {"statistics_type": statistics_type})
+            row = analytics_cursor.fetchone()
+        return None if row is None else QueryPlan(*row)
+
+    def record(
+        self,
+        statistics_type: str,
+        period_start: int,
+        query_plan: QueryPlan,
+        regression: str,
+    ):
+        sql_insert = """
+            INSERT INTO query_plans (
+                statistics_type,
+                period_start,
+                plan_hash,
+                plan_shape,
+                planning_time_ms,
+                execution_time_ms,
+                shared_hit_blocks,
+                shared_read_blocks,
+                regression,
+                plan
+            ) VALUES (
+                %(statistics_type)s,
+                %(period_start)s,
+                %(plan_hash)s,
+                %(plan_shape)s,
+                %(planning_time_ms)s,
+                %(execution_time_ms)s,
+                %(shared_hit_blocks)s,
+                %(shared_read_blocks)s,
+                %(regression)s,
+                %(plan)s
+            )
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                sql_insert,
+                {
+                    "statistics_type": statistics_type,
+                    "period_start": period_start,
+                    "plan_hash": query_plan.plan_hash,
+                    "plan_shape": query_plan.plan_shape,
+                    "planning_time_ms": query_plan.planning_time_ms,
+                    "execution_time_ms": query_plan.execution_time_ms,
+                    "shared_hit_blocks": query_plan.shared_hit_blocks,
+                    "shared_read_blocks": query_plan.shared_read_blocks,
+                    "regression": regression,
+                    "plan": json.dumps(query_plan.plan),
+                },
+            )
+            self.analytics_connection.commit()
+
+
+# Runs the Indexer DB query of the aggregation for the period with `EXPLAIN ANALYZE`,
+# stores the plan and compares it with the last good one.
+# The members of the same scan group run the same query: pass the same `captured_plans` dict
+# for all the aggregations, and the query is run once, its plan is recorded for each member.
+# Returns the description of the regression, empty string if the plan is fine
+def capture_query_plan(
+    statistics_type: str,
+    statistics: PeriodicAggregations,
+    timestamp: int,
+    captured_plans: typing.Optional[dict] = None,
+) -> str:
+    period_start = statistics.start_of_range(timestamp)
+    sql, parameters = statistics.indexer_query(period_start)
+    key = (sql, json.dumps(parameters, sort_keys=True, default=str))
+    query_plan = None if captured_plans is None else captured_plans.get(key)
+    if query_plan is None:
+        query_plan = explain_query(statistics.indexer_connection, sql, parameters)
+        if captured_plans is not None:
+            captured_plans[key] = query_plan
+
+    query_plans = QueryPlans(statistics.analytics_connection)
+    query_plans.create_table()
+    regression = compare_query_plans(query_plans.last_good(statistics_type), query_plan)
+    query_plans.record(statistics_type, period_start, query_plan, regression)
+    return regression
+
+
+def explain_query(indexer_connection, sql: str, parameters: dict) -> QueryPlan:
+    # ANALYZE runs the query, the transaction is rolled back anyway
+    with indexer_connection.cursor() as indexer_cursor:
+        try:
+            indexer_cursor.execute(
+                psycopg2.sql.SQL("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {}").format(
+                    psycopg2.sql.SQL(sql)
+                ),
+                parameters,
+            )
+            (plan,) = indexer_cursor.fetchone()
+        finally:
+            indexer_connection.rollback()
+    return parse_query_plan(json.loads(plan) if isinstance(plan, str) else plan)
+
+
+def parse_query_plan(plan: list) -> QueryPlan:
+    (root,) = plan
+    plan_shape = _plan_shape(root["Plan"])
+    return QueryPlan(
+        plan_shape=plan_shape,
+        plan_hash=hashlib.sha256(plan_shape.encode()).hexdigest(),
+        planning_time_ms=float(root.get("Planning Time", 0)),
+        execution_time_ms=float(root.get("Execution Time", 0)),
+        shared_hit_blocks=int(root["Plan"].get("Shared Hit Blocks", 0)),
+        shared_read_blocks=int(root["Plan"].get("Shared Read Blocks", 0)),
+        plan=plan,
+    )
+
+
+def compare_query_plans(
+    last_good: typing.Optional[QueryPlan], query_plan: QueryPlan
+) -> str:
+    if last_good is None:
+        return ""
+    reasons = []
+    if last_good.plan_hash != query_plan.plan_hash:
+        reasons.append(
+            f"The plan shape has changed from {last_good.plan_shape} to {query_plan.plan_shape}"
+        )
+    if (
+        query_plan.touched_blocks >= MIN_FLAGGED_BUFFERS
+        and query_plan.touched_blocks
+        > last_good.touched_blocks * BUFFERS_GROWTH_THRESHOLD
+    ):
+        reasons.append(
+            f"The query has touched {query_plan.touched_blocks} buffers instead of {last_good.touched_blocks}"
+        )
+    return "; ".join(reasons)
+
+
+# Compact text form of the plan tree, e.g. `Aggregate(Hash Join(Seq Scan[transactions], ...))`
+def _plan_shape(node: dict) -> str:
+    details = [
+        node[key] for key in ("Join Type", "Relation Name", "Index Name") if key in node
+    ]
+    shape = node["Node Type"]
+    if details:
+        shape += f"[{' '.join(details)}]"
+    children = node.get("Plans", [])
+    if children:
+        shape += f"({', '.join(_plan_shape(child) for child in children)})"
+    return shape
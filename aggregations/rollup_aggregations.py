@@ -0,0 +1,28 @@
+import abc
+
+from .periodic_aggregations import PeriodicAggregations
+
+
+# The coarser aggregation (e.g. monthly) computed from the stored results of the daily one.
+# It never reads Indexer DB, so it's cheap even for the long periods.
+# Only the additive values could be rolled up this way,
+# the distinct counts (e.g. active accounts) should use the sketches, see `sketches.py`
+class RollupAggregations(PeriodicAggregations):
+    # The daily aggregation we roll up, it should also be in `DEPENDENCIES`
+    SOURCE: str
+
+    @property
+    def sql_select(self):
+        raise NotImplementedError(
+            f"No requests to Indexer DB needed, the values are taken from {self.SOURCE}"
+        )
+
+    # The query combining the daily values of `SOURCE` for the period
+    @property
+    @abc.abstractmethod
+    def sql_rollup_select(self):
+        pass
+
+    # Computed from Analytics DB even without `rollup` option
+    def uses_rollup(self) -> bool:
+        return True
@@ -0,0 +1,77 @@
+import typing
+
+"""
+Several aggregations read the same Indexer DB table for the same period.
+Such aggregations declare the same `SCAN_GROUP`, and the group query below is run once per period
+for all of them. Each member builds its own result from the group result, see `rows_from_scan`.
+The group queries have the same parameters as `sql_select` of the members.
+The group result is kept in memory till all the members are computed, so the group query should aggregate
+on the server and return a few rows, as `sql_select` of the members does.
+The per-account tables are never the members: they would bring all their rows to every member.
+"""
+
+SCAN_GROUPS = {
+    # DailyTransactionsCount, DailyActiveAccountsCount
+    "transactions": """
+        SELECT
+            COUNT(*),
+            COUNT(DISTINCT transactions.signer_account_id)
+        FROM transactions
+        WHERE transactions.block_timestamp >= %(from_timestamp)s
+            AND transactions.block_timestamp < %(to_timestamp)s
+    """,
+    # DailyGasUsed, DailyTokensSpentOnFees
+    "blocks_chunks": """
+        SELECT
+            SUM(chunks.gas_used),
+            SUM(chunks.gas_used * blocks.gas_price)
+        FROM blocks
+        JOIN chunks ON chunks.included_in_block_hash = blocks.block_hash
+        WHERE blocks.block_timestamp >= %(from_timestamp)s
+            AND blocks.block_timestamp < %(to_timestamp)s
+    """,
+    # DailyNewAccountsCount, DailyDeletedAccountsCount
+    # The CTE is used twice, so Postgres materializes it and reads `receipts` only once
+    "accounts_receipts": """
+        WITH period_receipts AS (
+            SELECT receipts.receipt_id
+            FROM receipts
+            WHERE receipts.included_in_block_timestamp >= %(from_timestamp)s
+                AND receipts.included_in_block_timestamp < %(to_timestamp)s
+        )
+        SELECT
+            (
+                SELECT COUNT(accounts.created_by_receipt_id)
+                FROM accounts
+                JOIN period_receipts ON period_receipts.receipt_id = accounts.created_by_receipt_id
+            ),
+            (
+                SELECT COUNT(accounts.deleted_by_receipt_id)
+                FROM accounts
+                JOIN period_receipts ON period_receipts.receipt_id = accounts.deleted_by_receipt_id
+            )
+    """,
+}
+
+# The result of the latest query for each group.
+# The members of the group usually go one after another, so one entry per group is enough
+_latest_scans: typing.Dict[str, typing.Tuple[tuple, list]] = {}
+
+
+def shared_scan(indexer_connection, scan_group: str, parameters: dict) -> list:
+    key = tuple(sorted(parameters.items()))
+    cached = _latest_scans.get(scan_group)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with indexer_connection.cursor() as indexer_cursor:
+        indexer_cursor.execute(SCAN_GROUPS[scan_group], parameters)
+        result = indexer_cursor.fetchall()
+    _latest_scans[scan_group] = (key, result)
+    return result
+
+
+# Should be called when the members of the group are computed, e.g. at the end of the planner batch,
+# so the results do not stay in memory of the long-living process
+def clear_shared_scans():
+    _latest_scans.clear()
@@ -0,0 +1,178 @@
+import typing
+
+"""
+Detecting the SDK the contract is built with.
+Each byte marker is looked up with the substring search of CPython: it's much faster
+than one pass of the regex with all the markers, see `benchmarks/classify_contracts.py`.
+The markers of a group are searched till the first missing one.
+The WASM sections, imports and exports are read without going through the section contents,
+only if some rule needs them.
+"""
+
+
+class WasmModule(typing.NamedTuple):
+    custom_section_names: typing.FrozenSet[str]
+    imports: typing.FrozenSet[typing.Tuple[str, str]]
+    exports: typing.FrozenSet[str]
+
+
+class SdkRule(typing.NamedTuple):
+    sdk_type: str
+    # The rule matches if all the markers of any group are found in the code
+    marker_groups: typing.Tuple[typing.Tuple[bytes, ...], ...] = ()
+    # The rule also matches if this function returns True for the parsed module
+    wasm_predicate: typing.Optional[typing.Callable[[WasmModule], bool]] = None
+
+
+DEFAULT_RULES = (
+    SdkRule("RS", marker_groups=((b"__data_end", b"__heap_base"),)),
+    SdkRule("JS", marker_groups=((b"JS_TAG_MODULE", b"quickjs-libc-min."),)),
+    SdkRule(
+        "AS",
+        marker_groups=(
+            (
+                b"l\x00i\x00b\x00/\x00a\x00s\x00s\x00e\x00m\x00b\x00l\x00y\x00s\x00c\x00r\x00i\x00p\x00t",
+            ),
+            (b"~lib/near-sdk-core/collections/persistentMap/PersistentMap",),
+        ),
+    ),
+)
+
+
+class SdkClassifier:
+    def __init__(self, rules: typing.Sequence[SdkRule] = DEFAULT_RULES):
+        self.rules = tuple(rules)
+        self._needs_wasm_module = any(
+            rule.wasm_predicate is not None for rule in self.rules
+        )
+
+    def classify(self, contract_code: bytes, contract_code_sha256: str = "") -> str:
+        # Since there is no way to remove a contract once deployed, users can only deploy an empty file to reduce the storage usage.
+        if contract_code == b"":
+            return "EMPTY"
+
+        # Sometimes people deploy some garbage (images, text files, etc).
+        if not contract_code.startswith(b"\0asm"):
+            return "NOT_WASM"
+
+        wasm_module = (
+            parse_wasm_module(contract_code) if self._needs_wasm_module else None
+        )
+        likely_sdk_types = {
+            rule.sdk_type
+            for rule in self.rules
+            if any(
+                all(marker in contract_code for marker in group)
+                for group in rule.marker_groups
+            )
+            or (
+                rule.wasm_predicate is not None
+                and wasm_module is not None
+                and rule.wasm_predicate(wasm_module)
+            )
+        }
+
+        # Only set the sdk type if exactly one match is received since if we matched multiple, it is impossible to make a call.
+        if len(likely_sdk_types) == 1:
+            return likely_sdk_types.pop()
+
+        if len(likely_sdk_types) > 1:
+            print(
+                f"WARN: We detected markers of several programming languages ({likely_sdk_types}) at once for contract with hash {contract_code_sha256}, falling back to UNKNOWN type..."
+            )
+        return "UNKNOWN"
+
+
+def parse_wasm_module(contract_code: bytes) -> typing.Optional[WasmModule]:
+    try:
+        return _parse_wasm_module(contract_code)
+    except (IndexError, UnicodeDecodeError, ValueError):
+        # The module is broken, the markers are still checked
+        return None
+
+
+def _parse_wasm_module(code: bytes) -> WasmModule:
+    custom_section_names = set()
+    imports = set()
+    exports = set()
+    # Magic and version
+    position = 8
+    while position < len(code):
+        section_id = code[position]
+        section_size, position = _read_leb128(code, position + 1)
+        section_end = position + section_size
+        if section_end > len(code):
+            raise ValueError("The section is out of the module")
+        if section_id == 0:
+            name, _ = _read_name(code, position)
+            custom_section_names.add(name)
+        elif section_id == 2:
+            count, item_position = _read_leb128(code, position)
+            for _ in range(count):
+                module, item_position = _read_name(code, item_position)
+                name, item_position = _read_name(code, item_position)
+                imports.add((module, name))
+                item_position = _skip_import_description(code, item_position)
+        elif section_id == 7:
+            count, item_position = _read_leb128(code, position)
+            for _ in range(count):
+                name, item_position = _read_name(code, item_position)
+                exports.add(name)
+                # Export kind and index
+                _, item_position = _read_leb128(code, item_position + 1)
+        position = section_end
+    return WasmModule(
+        frozenset(custom_section_names), frozenset(imports), frozenset(exports)
+    )
+
+
+def _read_leb128(code: bytes, position: int) -> typing.Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = code[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte & 0x80 == 0:
+            return result, position
+        shift += 7
+        if shift > 35:
+            raise ValueError("LEB128 value is too long")
+
+
+def _read_name(code: bytes, position: int) -> typing.Tuple[str, int]:
+    length, position = _read_leb128(code, position)
+    if position + length > len(code):
+        raise ValueError("The name is out of the module")
+    return code[position : position + length].decode(), position + length
+
+
+def _skip_import_description(code: bytes, position: int) -> int:
+    kind = code[position]
+    position += 1
+    if kind == 0:
+        # Function: type index
+        _, position = _read_leb128(code, position)
+    elif kind == 1:
+        # Table: reference type and limits
+        position = _skip_limits(code, position + 1)
+    elif kind == 2:
+        # Memory: limits
+        position = _skip_limits(code, position)
+    elif kind == 3:
+        # Global: value type and mutability
+        position += 2
+    else:
+        raise ValueError(f"Unknown import kind {kind}")
+    return position
+
+
+def _skip_limits(code: bytes, position: int) -> int:
+    has_maximum = code[position] & 1
+    _, position = _read_leb128(code, position + 1)
+    if has_maximum:
+        _, position = _read_leb128(code, position)
+    return position
+
+
+DEFAULT_CLASSIFIER = SdkClassifier()
@@ -0,0 +1,254 @@
+import dataclasses
+import hashlib
+import math
+import psycopg2
+import typing
+import zlib
+
+from .db_tables import DAY_LEN_SECONDS, date_range_json, daily_start_of_range
+
+"""
+HyperLogLog sketches of the distinct values (e.g. active accounts) for each day.
+The sketch takes 16KB at most, and any window (month, quarter, rolling 30 days)
+could be estimated by merging the daily sketches, without reading Indexer DB again.
+The standard error of the estimation is 1.04 / sqrt(2 ^ precision), ~0.8% by default.
+"""
+
+DEFAULT_PRECISION = 14
+_HASH_BITS = 64
+# Increase it if the binary format of the sketch is changed
+_FORMAT_VERSION = 1
+
+
+class HyperLogLog:
+    def __init__(
+        self,
+        precision: int = DEFAULT_PRECISION,
+        registers: typing.Optional[bytearray] = None,
+    ):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"Precision should be in range [4, 18], got {precision}")
+        self.precision = precision
+        self.registers = (
+            registers if registers is not None else bytearray(1 << precision)
+        )
+
+    def add(self, value: str):
+        hashed = int.from_bytes(
+            hashlib.blake2b(value.encode(), digest_size=_HASH_BITS // 8).digest(),
+            "big",
+        )
+        index = hashed >> (_HASH_BITS - self.precision)
+        rest_bits = _HASH_BITS - self.precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        # The position of the leftmost 1-bit in the rest of the hash
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: typing.Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog"):
+        if self.precision != other.precision:
+            raise ValueError(
+                f"Can't merge the sketches with precisions {self.precision} and {other.precision}"
+            )
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        registers_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers_count)
+        raw_estimate = (
+            alpha
+            * registers_count**2
+            / sum(2.0**-register for register in self.registers)
+        )
+        zero_registers = self.registers.count(0)
+        # Small range correction, the hash is 64-bit so we don't need the large range one
+        if raw_estimate <= 2.5 * registers_count and zero_registers:
+            return round(registers_count * math.log(registers_count / zero_registers))
+        return round(raw_estimate)
+
+    def to_bytes(self) -> bytes:
+        # Most of the registers are zeros for the small sets, compression helps a lot there
+        return bytes([_FORMAT_VERSION, self.precision]) + zlib.compress(
+            bytes(self.registers)
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        version, precision = data[0], data[1]
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unknown sketch format version {version}")
+        return cls(precision, bytearray(zlib.decompress(data[2:])))
+
+    @classmethod
+    def union(cls, sketches: typing.Iterable["HyperLogLog"]) -> "HyperLogLog":
+        result = None
+        for sketch in sketches:
+            if result is None:
+                result = cls(sketch.precision, bytearray(sketch.registers))
+            else:
+                result.merge(sketch)
+        return result if result is not None else cls()
+
+
+# The window can't be estimated: some of its days have no sketch (e.g. they were stored
+# before the sketches were kept), the estimation would be silently too low
+class MissingSketchesError(ValueError):
+    pass
+
+
+# The days of the window, "YYYY-MM-DD"
+def window_days(from_timestamp: int, to_timestamp: int) -> typing.List[str]:
+    return [
+        date_range_json(day_start, DAY_LEN_SECONDS)["from_day"]
+        for day_start in range(
+            daily_start_of_range(from_timestamp), to_timestamp, DAY_LEN_SECONDS
+        )
+    ]
+
+
+# Keeps the sketches in Analytics DB, one per sketch type and period
+@dataclasses.dataclass
+class DistinctCountSketches:
+    analytics_connection: psycopg2.extensions.connection
+
+    def create_table(self):
+        sql_create_table = """
+            CREATE TABLE IF NOT EXISTS distinct_count_sketches
+            (
+                sketch_type       TEXT  NOT NULL,
+                -- The start of the period the sketch is built for
+                collected_for_day DATE  NOT NULL,
+                sketch            BYTEA NOT NULL,
+                CONSTRAINT distinct_count_sketches_pk PRIMARY KEY (sketch_type, collected_for_day)
+            )
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(sql_create_table)
+                self.analytics_connection.commit()
+            except psycopg2.errors.DuplicateTable:
+                self.analytics_connection.rollback()
+
+    def delete(self, sketch_type: str):
+        sql_delete = """
+            DELETE FROM distinct_count_sketches
+            WHERE sketch_type = %(sketch_type)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(sql_delete, {"sketch_type": sketch_type})
+                self.analytics_connection.commit()
+            except psycopg2.errors.UndefinedTable:
+                self.analytics_connection.rollback()
+
+    # Builds the sketch from the values returned by `sql_select_values` and stores it
+    def build(
+        self,
+        sketch_type: str,
+        collected_for_day: str,
+        sql_select_values: str,
+        parameters: dict,
+    ):
+        sketch = HyperLogLog()
+        # Server-side cursor, there could be millions of values
+        with self.analytics_connection.cursor(
+            name=f"{sketch_type}_sketch_values"
+        ) as analytics_cursor:
+            analytics_cursor.itersize = 10000
+            analytics_cursor.execute(sql_select_values, parameters)
+            sketch.update(value for (value,) in analytics_cursor)
+        self.store(sketch_type, collected_for_day, sketch)
+
+    def store(self, sketch_type: str, collected_for_day: str, sketch: HyperLogLog):
+        # The sketch is rebuilt from scratch each time, so it's safe to replace the old one
+        sql_upsert = """
+            INSERT INTO distinct_count_sketches VALUES (%(sketch_type)s, %(collected_for_day)s, %(sketch)s)
+            ON CONFLICT ON CONSTRAINT distinct_count_sketches_pk DO UPDATE SET sketch = EXCLUDED.sketch
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                sql_upsert,
+                {
+                    "sketch_type": sketch_type,
+                    "collected_for_day": collected_for_day,
+                    "sketch": psycopg2.Binary(sketch.to_bytes()),
+                },
+            )
+            self.analytics_connection.commit()
+
+    # The days of the window without the sketch of the given type
+    def missing_days(
+        self, sketch_type: str, from_timestamp: int, to_timestamp: int
+    ) -> typing.List[str]:
+        sql_select = """
+            SELECT collected_for_day
+            FROM distinct_count_sketches
+            WHERE sketch_type = %(sketch_type)s
+                AND collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                sql_select,
+                {
+                    "sketch_type": sketch_type,
+                    **date_range_json(from_timestamp, to_timestamp - from_timestamp),
+                },
+            )
+            sketch_days = {str(day) for (day,) in analytics_cursor.fetchall()}
+        return [
+            day
+            for day in window_days(from_timestamp, to_timestamp)
+            if day not in sketch_days
+        ]
+
+    # Raises `MissingSketchesError` if any day of the window has no sketch
+    def load_union(
+        self, sketch_type: str, from_timestamp: int, to_timestamp: int
+    ) -> HyperLogLog:
+        missing_days = self.missing_days(sketch_type, from_timestamp, to_timestamp)
+        if missing_days:
+            raise MissingSketchesError(
+                f"No {sketch_type} sketches for {len(missing_days)} days of the window: "
+                f"[{' '.join(missing_days)}], build them with `--build-sketches`"
+            )
+        sql_select = """
+            SELECT sketch
+            FROM distinct_count_sketches
+            WHERE sketch_type = %(sketch_type)s
+                AND collected_for_day >= %(from_day)s
+                AND collected_for_day < %(to_day)s
+        """
+        with self.analytics_connection.cursor() as analytics_cursor:
+            analytics_cursor.execute(
+                sql_select,
+                {
+                    "sketch_type": sketch_type,
+                    **date_range_json(from_timestamp, to_timestamp - from_timestamp),
+                },
+            )
+            return HyperLogLog.union(
+                HyperLogLog.from_bytes(bytes(sketch))
+                for (sketch,) in analytics_cursor.fetchall()
+            )
+
+    # The fast path for any window of days, e.g. monthly active accounts:
+    # estimate_window("daily_active_accounts", from_timestamp, from_timestamp + 30 * DAY_LEN_SECONDS)
+    def estimate_window(
+        self, sketch_type: str, from_timestamp: int, to_timestamp: int
+    ) -> int:
+        return self.load_union(sketch_type, from_timestamp, to_timestamp).estimate()
+
+    # Rolling window ending with the given day (inclusive)
+    def estimate_rolling_window(
+        self, sketch_type: str, last_day_timestamp: int, days: int
+    ) -> int:
+        to_timestamp = last_day_timestamp + DAY_LEN_SECONDS
+        return self.estimate_window(
+            sketch_type, to_timestamp - days * DAY_LEN_SECONDS, to_timestamp
+        )
@@ -1,9 +1,14 @@
 import abc
+import io
+import itertools
 import psycopg2
 import psycopg2.extras
+import psycopg2.sql
+import typing
 
 from .base_aggregations import BaseAggregations
 from .db_tables import time_json, daily_start_of_range
+from .metrics import METRICS
 
 
 class SqlAggregations(BaseAggregations):
@@ -51,21 +56,149 @@ class SqlAggregations(BaseAggregations):
             result = indexer_cursor.fetchall()
             return self.prepare_data(result)
 
-    def store(self, parameters: list):
+    # The rows could be given by any iterable, they are read only once.
+    # Returns the number of the given rows, the number of the really inserted ones
+    # (without the conflicting rows) goes to `aggregation_rows_inserted_total` metric
+    def store(self, parameters: typing.Iterable[tuple]) -> int:
+        if self.COPY_TABLE is not None:
+            return self.copy_store(parameters)
         chunk_size = 100
+        rows_count = 0
+        rows = iter(parameters)
         with self.analytics_connection.cursor() as analytics_cursor:
-            for i in range(0, len(parameters), chunk_size):
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                rows_count += len(chunk)
                 try:
                     psycopg2.extras.execute_values(
                         analytics_cursor,
                         self.sql_insert,
-                        parameters[i : i + chunk_size],
+                        chunk,
+                        page_size=chunk_size,
                     )
+                    # The chunk is sent as one page, so `rowcount` covers the whole chunk
+                    inserted_count = analytics_cursor.rowcount
                     self.analytics_connection.commit()
+                    METRICS.increment("aggregation_rows_inserted_total", inserted_count)
                 except psycopg2.errors.UniqueViolation:
                     self.analytics_connection.rollback()
+        return rows_count
+
+    # The conflict clause of the `INSERT` in `copy_store`.
+    # Overload it if `sql_insert` resolves the conflicts in another way, e.g. with `DO UPDATE`
+    @property
+    def sql_copy_on_conflict(self):
+        return """
+            ON CONFLICT DO NOTHING
+        """
+
+    # Streams the rows with `COPY` into the temporary staging table and moves them to `COPY_TABLE`
+    # with one `INSERT`. Everything is done in one transaction: the rows are stored all together or not at all.
+    # The conflicting rows are resolved by `sql_copy_on_conflict`, the same way as `sql_insert` does.
+    # The rows are taken from the iterable while COPY is running, so they are never kept in memory all together.
+    # `table` is the table with the same columns to store the rows to instead of `COPY_TABLE`
+    def copy_store(
+        self, parameters: typing.Iterable[tuple], table: typing.Optional[str] = None
+    ) -> int:
+        rows = iter(parameters)
+        first_row = next(rows, None)
+        if first_row is None:
+            return 0
+        rows_reader = _CopyRowsReader(itertools.chain([first_row], rows))
+        if self.COPY_COLUMNS:
+            columns = psycopg2.sql.SQL(", ").join(
+                psycopg2.sql.Identifier(column) for column in self.COPY_COLUMNS
+            )
+            columns_list = psycopg2.sql.SQL("({})").format(columns)
+        else:
+            columns = psycopg2.sql.SQL("*")
+            columns_list = psycopg2.sql.SQL("")
+        staging_table = psycopg2.sql.Identifier(f"{self.COPY_TABLE}_staging")
+        sql_create_staging_table = psycopg2.sql.SQL(
+            """
+            CREATE TEMPORARY TABLE {staging_table}
+            (LIKE {copy_table} INCLUDING DEFAULTS)
+            ON COMMIT DROP
+        """
+        ).format(
+            staging_table=staging_table,
+            copy_table=psycopg2.sql.Identifier(self.COPY_TABLE),
+        )
+        sql_copy = psycopg2.sql.SQL(
+            "COPY {staging_table} {columns_list} FROM STDIN"
+        ).format(staging_table=staging_table, columns_list=columns_list)
+        sql_insert_from_staging = psycopg2.sql.SQL(
+            """
+            INSERT INTO {table} {columns_list}
+            SELECT {columns} FROM {staging_table}
+            {on_conflict}
+        """
+        ).format(
+            table=psycopg2.sql.Identifier(table or self.COPY_TABLE),
+            columns_list=columns_list,
+            columns=columns,
+            staging_table=staging_table,
+            on_conflict=psycopg2.sql.SQL(self.sql_copy_on_conflict),
+        )
+        with self.analytics_connection.cursor() as analytics_cursor:
+            try:
+                analytics_cursor.execute(sql_create_staging_table)
+                analytics_cursor.copy_expert(sql_copy, rows_reader)
+                analytics_cursor.execute(sql_insert_from_staging)
+                inserted_count = analytics_cursor.rowcount
+                self.analytics_connection.commit()
+                METRICS.increment("aggregation_rows_inserted_total", inserted_count)
+            except Exception:
+                self.analytics_connection.rollback()
+                raise
+        return rows_reader.rows_count
 
     # Overload this method if you need to prepare data before insert
     @staticmethod
     def prepare_data(parameters, **kwargs) -> list:
         return parameters
+
+
+# The table to store the rows with `COPY`, see `copy_store`.
+# It's much faster than `sql_insert` for the tables with thousands of rows per period
+SqlAggregations.COPY_TABLE = None
+# The columns of `COPY_TABLE` in the order of the values in the rows, all the columns by default
+SqlAggregations.COPY_COLUMNS = None
+
+
+# File-like object giving the rows in `COPY` text format, so we don't build the whole input in memory
+class _CopyRowsReader(io.RawIOBase):
+    def __init__(self, rows: typing.Iterable[tuple]):
+        self._lines = (_copy_line(row) for row in rows)
+        self._buffer = b""
+        self.rows_count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+            self.rows_count += 1
+        if size < 0:
+            size = len(self._buffer)
+        result, self._buffer = self._buffer[:size], self._buffer[size:]
+        return result
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_line(row: tuple) -> bytes:
+    return (
+        "\t".join(
+            "\\N" if value is None else str(value).translate(_COPY_ESCAPES)
+            for value in row
+        )
+        + "\n"
+    ).encode()
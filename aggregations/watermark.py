@@ -0,0 +1,73 @@
+import time
+import typing
+
+from .db_tables import query_genesis_timestamp, query_latest_timestamp
+from .metrics import METRICS
+
+"""
+The latest and the genesis block timestamps of Indexer DB, shared by all the aggregations in the process.
+Without the cache, each aggregation asks Indexer DB for the latest block before each period,
+and backfill makes tens of thousands of such requests.
+Each process talks to one Indexer DB, so one watermark per process is enough.
+"""
+
+# How long (in seconds) the latest timestamp is used without asking Indexer DB again
+DEFAULT_TTL_SECONDS = 60
+
+
+class Watermark:
+    # `ttl_seconds` None means the latest timestamp is refreshed only when it's not enough
+    # for the requested period
+    def __init__(
+        self,
+        ttl_seconds: typing.Optional[float] = DEFAULT_TTL_SECONDS,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._genesis_timestamp = None
+        self._latest_timestamp = None
+        self._latest_timestamp_queried_at = None
+
+    # The latest block timestamp (in seconds).
+    # If `required_timestamp` is given and the cached value already reaches it, Indexer DB is not asked:
+    # the latest timestamp only grows, so the answer for the caller can't change
+    def latest_timestamp(
+        self, indexer_connection, required_timestamp: typing.Optional[int] = None
+    ) -> int:
+        if self._latest_timestamp is not None:
+            if (
+                required_timestamp is not None
+                and self._latest_timestamp >= required_timestamp
+            ):
+                return self._latest_timestamp
+            if self.ttl_seconds is None:
+                if required_timestamp is None:
+                    return self._latest_timestamp
+            elif self._clock() - self._latest_timestamp_queried_at < self.ttl_seconds:
+                return self._latest_timestamp
+        self._latest_timestamp = query_latest_timestamp(indexer_connection)
+        self._latest_timestamp_queried_at = self._clock()
+        with METRICS.without_labels():
+            METRICS.set_gauge(
+                "indexer_watermark_lag_seconds", time.time() - self._latest_timestamp
+            )
+        return self._latest_timestamp
+
+    # Genesis never changes, it's asked only once
+    def genesis_timestamp(self, indexer_connection) -> int:
+        if self._genesis_timestamp is None:
+            self._genesis_timestamp = query_genesis_timestamp(indexer_connection)
+        return self._genesis_timestamp
+
+    def reset(self):
+        self._genesis_timestamp = None
+        self._latest_timestamp = None
+        self._latest_timestamp_queried_at = None
+
+
+WATERMARK = Watermark()
+
+
+def configure_watermark(ttl_seconds: typing.Optional[float]):
+    WATERMARK.ttl_seconds = ttl_seconds
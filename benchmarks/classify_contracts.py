@@ -0,0 +1,130 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aggregations.sdk_type import SdkClassifier, parse_wasm_module
+
+"""
+Measures the throughput of the SDK type detection over the local corpus of contract codes.
+The corpus is the directory with the files (e.g. `CONTRACT_CODE_CACHE_DIR`),
+the synthetic one is generated if the directory is not given.
+The results are compared with the previous implementation (the hardcoded substring searches).
+"""
+
+
+def legacy_sdk_type(contract_code: bytes) -> str:
+    if contract_code == b"":
+        return "EMPTY"
+    if not contract_code.startswith(b"\0asm"):
+        return "NOT_WASM"
+    likely_sdk_types = set()
+    if b"__data_end" in contract_code and b"__heap_base" in contract_code:
+        likely_sdk_types.add("RS")
+    if b"JS_TAG_MODULE" in contract_code and b"quickjs-libc-min." in contract_code:
+        likely_sdk_types.add("JS")
+    if (
+        b"l\x00i\x00b\x00/\x00a\x00s\x00s\x00e\x00m\x00b\x00l\x00y\x00s\x00c\x00r\x00i\x00p\x00t"
+        in contract_code
+        or b"~lib/near-sdk-core/collections/persistentMap/PersistentMap"
+        in contract_code
+    ):
+        likely_sdk_types.add("AS")
+    if len(likely_sdk_types) == 1:
+        return likely_sdk_types.pop()
+    return "UNKNOWN"
+
+
+MARKERS = [
+    b"__data_end",
+    b"__heap_base",
+    b"JS_TAG_MODULE",
+    b"quickjs-libc-min.",
+    b"l\x00i\x00b\x00/\x00a\x00s\x00s\x00e\x00m\x00b\x00l\x00y\x00s\x00c\x00r\x00i\x00p\x00t",
+    b"~lib/near-sdk-core/collections/persistentMap/PersistentMap",
+]
+MARKERS_PATTERN = re.compile(b"|".join(re.escape(marker) for marker in MARKERS))
+
+
+# One pass over the code with all the markers at once, kept to compare the approaches
+def regex_markers(contract_code: bytes) -> set:
+    return {match.group() for match in MARKERS_PATTERN.finditer(contract_code)}
+
+
+def load_corpus(directory: str) -> list:
+    corpus = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as f:
+                data = f.read()
+            if name.endswith(".z"):
+                data = zlib.decompress(data)
+            corpus.append(data)
+    return corpus
+
+
+def synthetic_corpus(count: int, size: int, seed: int = 42) -> list:
+    generator = random.Random(seed)
+    markers = MARKERS
+    corpus = [b"", b"not a contract"]
+    for _ in range(count):
+        body = bytearray(generator.getrandbits(8) for _ in range(size))
+        for marker in generator.sample(markers, generator.randint(0, 3)):
+            position = generator.randrange(len(body))
+            body[position:position] = marker
+        corpus.append(b"\0asm\x01\0\0\0" + bytes(body))
+    return corpus
+
+
+def measure(name: str, function, corpus: list, repeat: int) -> list:
+    total_bytes = sum(len(contract_code) for contract_code in corpus) * repeat
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        results = [function(contract_code) for contract_code in corpus]
+    duration = time.perf_counter() - start_time
+    print(
+        f"{name:>10}: {total_bytes / duration / 1024 / 1024:8.1f} MB/s "
+        f"({len(corpus) * repeat / duration:8.1f} contracts/s)"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the contract SDK type detection"
+    )
+    parser.add_argument(
+        "corpus", nargs="?", help="The directory with the contract codes"
+    )
+    parser.add_argument("--synthetic-count", type=int, default=200)
+    parser.add_argument("--synthetic-size", type=int, default=256 * 1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = (
+        load_corpus(args.corpus)
+        if args.corpus
+        else synthetic_corpus(args.synthetic_count, args.synthetic_size)
+    )
+    print(
+        f"Corpus: {len(corpus)} contracts, {sum(map(len, corpus)) / 1024 / 1024:.1f} MB"
+    )
+
+    classifier = SdkClassifier()
+    legacy_results = measure("legacy", legacy_sdk_type, corpus, args.repeat)
+    results = measure("rules", classifier.classify, corpus, args.repeat)
+    measure("regex", regex_markers, corpus, args.repeat)
+    measure("wasm-parse", parse_wasm_module, corpus, args.repeat)
+
+    mismatches = sum(
+        legacy_result != result
+        for legacy_result, result in zip(legacy_results, results)
+    )
+    print(f"Mismatches with the legacy implementation: {mismatches}")
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import psycopg2
+import statistics as stats_math
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aggregations.db_tables import DAY_LEN_SECONDS
+from aggregations.periodic_aggregations import INDEXER_LAG_SECONDS
+from aggregations.planner import plan_statistics
+from aggregations.scan_groups import clear_shared_scans
+from aggregations.watermark import WATERMARK
+from main import STATS
+
+"""
+Measures `collect` and `store` of the aggregations over Indexer DB (e.g. the synthetic one, see `synthetic_indexer.py`)
+and compares the results with the saved baseline.
+Each aggregation is computed for one period, its dependencies go first, as in `main.py`.
+The table of the aggregation is dropped before each repeat, so `store` always writes to the empty table.
+Use the scratch Analytics DB only: the aggregation tables are dropped there.
+The aggregations which could not be computed (e.g. `unique_contracts` without NEAR RPC) are reported and skipped,
+the aggregations depending on them as well.
+"""
+
+# The measurement is flagged if it's this times slower than the baseline
+DEFAULT_THRESHOLD = 1.3
+# The shorter steps are never flagged, their variance is too high
+MIN_FLAGGED_SECONDS = 0.05
+
+
+def measure(statistics, timestamp: int, repeat: int) -> dict:
+    collect_durations, store_durations = [], []
+    rows_count = 0
+    for _ in range(repeat):
+        # Otherwise the scan group members get the cached result of the previous repeat
+        clear_shared_scans()
+        statistics.drop_table()
+        statistics.create_table()
+        start_time = time.perf_counter()
+        result = statistics.collect(timestamp)
+        collect_durations.append(time.perf_counter() - start_time)
+        start_time = time.perf_counter()
+        rows_count = statistics.store(result)
+        store_durations.append(time.perf_counter() - start_time)
+    # The median is not affected by the single slow run (e.g. the cold cache on the first one)
+    return {
+        "collect_seconds": stats_math.median(collect_durations),
+        "store_seconds": stats_math.median(store_durations),
+        "rows": rows_count,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for statistics_type, result in sorted(results.items()):
+        baseline_result = baseline.get(statistics_type)
+        if baseline_result is None:
+            continue
+        if result["rows"] != baseline_result["rows"]:
+            print(
+                f"WARN: {statistics_type} has stored {result['rows']} rows, "
+                f"{baseline_result['rows']} in the baseline: the data is probably different"
+            )
+        for step in ("collect_seconds", "store_seconds"):
+            if (
+                result[step] >= MIN_FLAGGED_SECONDS
+                and result[step] > baseline_result[step] * threshold
+            ):
+                regressions.append(
+                    f"{statistics_type} {step}: {result[step]:.3f} instead of {baseline_result[step]:.3f}"
+                )
+    return regressions
+
+
+def print_results(results: dict, baseline: dict):
+    print(
+        f"{'aggregation':<48} {'collect, s':>10} {'store, s':>10} {'rows':>10} {'baseline, s':>12}"
+    )
+    for statistics_type, result in sorted(results.items()):
+        baseline_result = baseline.get(statistics_type)
+        baseline_total = (
+            f"{baseline_result['collect_seconds'] + baseline_result['store_seconds']:12.3f}"
+            if baseline_result
+            else f"{'-':>12}"
+        )
+        print(
+            f"{statistics_type:<48} {result['collect_seconds']:10.3f} {result['store_seconds']:10.3f} "
+            f"{result['rows']:10} {baseline_total}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark of collect/store of the aggregations"
+    )
+    parser.add_argument(
+        "--indexer-database-url",
+        required=True,
+        help="Indexer DB to read from, e.g. the synthetic one",
+    )
+    parser.add_argument(
+        "--analytics-database-url",
+        required=True,
+        help="The scratch Analytics DB, the aggregation tables are dropped there",
+    )
+    parser.add_argument(
+        "-s",
+        "--stats-types",
+        nargs="+",
+        choices=STATS,
+        default=[],
+        help="The aggregations to measure, all by default",
+    )
+    parser.add_argument(
+        "-t",
+        "--timestamp",
+        type=int,
+        help="The period to compute. By default, the last day finished in Indexer DB. "
+        "The weekly and monthly aggregations collect nothing if their period is not finished at that day",
+    )
+    parser.add_argument("--rollup", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--baseline", help="JSON file with the results of the previous run"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write the results to `--baseline` file instead of comparing with it",
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+    if args.save_baseline and not args.baseline:
+        raise ValueError("`save-baseline` option requires `baseline` parameter")
+    if args.repeat < 1:
+        raise ValueError("`repeat` parameter should be positive")
+
+    analytics_connection = psycopg2.connect(args.analytics_database_url)
+    indexer_connection = psycopg2.connect(args.indexer_database_url)
+    timestamp = args.timestamp
+    if timestamp is None:
+        latest_timestamp = WATERMARK.latest_timestamp(indexer_connection)
+        timestamp = latest_timestamp - INDEXER_LAG_SECONDS - DAY_LEN_SECONDS
+
+    results = {}
+    failed = set()
+    for statistics_type in plan_statistics(
+        STATS, args.stats_types or STATS.keys(), rollup=args.rollup
+    ):
+        statistics_class = STATS[statistics_type]
+        failed_dependencies = failed.intersection(
+            statistics_class.DEPENDENCIES
+            + (statistics_class.ROLLUP_DEPENDENCIES if args.rollup else [])
+        )
+        if failed_dependencies:
+            print(
+                f"Skipping {statistics_type}, its dependencies have failed: {sorted(failed_dependencies)}"
+            )
+            failed.add(statistics_type)
+            continue
+        statistics = statistics_class(
+            analytics_connection, indexer_connection, rollup=args.rollup
+        )
+        try:
+            results[statistics_type] = measure(statistics, timestamp, args.repeat)
+        except Exception as e:
+            print(f"Failed to measure {statistics_type}: {e!r}")
+            analytics_connection.rollback()
+            indexer_connection.rollback()
+            failed.add(statistics_type)
+    analytics_connection.close()
+    indexer_connection.close()
+
+    baseline = {}
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved the baseline to {args.baseline}")
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"Slower than the baseline: {regression}")
+    if regressions or failed:
+        sys.exit(1)
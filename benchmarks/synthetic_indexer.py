@@ -0,0 +1,461 @@
+import argparse
+import datetime
+import psycopg2
+import time
+
+"""
+Fills the local Postgres with the synthetic data in the Indexer DB schema, for the benchmarks of the aggregations.
+Only the tables and the columns read by `aggregations/db_tables` are created, with the same types and indexes
+as in the indexer for explorer, so the query plans are close to the real ones.
+The data is generated by Postgres itself (`generate_series`), day by day:
+each transaction has one action receipt with one action, its execution outcome is in the next block.
+The signers and the called contracts are skewed, a few accounts make most of the transactions, as on mainnet.
+Never point it to the real Indexer DB: the tables are dropped with `--drop`.
+"""
+
+NANOSECONDS = 1000 * 1000 * 1000
+
+SQL_CREATE_TABLES = """
+    CREATE TYPE action_kind AS ENUM (
+        'CREATE_ACCOUNT', 'DEPLOY_CONTRACT', 'FUNCTION_CALL', 'TRANSFER',
+        'STAKE', 'ADD_KEY', 'DELETE_KEY', 'DELETE_ACCOUNT'
+    );
+    CREATE TYPE execution_outcome_status AS ENUM (
+        'UNKNOWN', 'FAILURE', 'SUCCESS_VALUE', 'SUCCESS_RECEIPT_ID'
+    );
+    CREATE TABLE blocks
+    (
+        block_height      NUMERIC(20, 0) NOT NULL,
+        block_hash        TEXT           NOT NULL PRIMARY KEY,
+        prev_block_hash   TEXT           NOT NULL,
+        block_timestamp   NUMERIC(20, 0) NOT NULL,
+        total_supply      NUMERIC(45, 0) NOT NULL,
+        gas_price         NUMERIC(45, 0) NOT NULL,
+        author_account_id TEXT           NOT NULL
+    );
+    CREATE TABLE chunks
+    (
+        included_in_block_hash TEXT           NOT NULL,
+        chunk_hash             TEXT           NOT NULL PRIMARY KEY,
+        shard_id               NUMERIC(20, 0) NOT NULL,
+        gas_limit              NUMERIC(20, 0) NOT NULL,
+        gas_used               NUMERIC(20, 0) NOT NULL,
+        author_account_id      TEXT           NOT NULL
+    );
+    CREATE TABLE transactions
+    (
+        transaction_hash          TEXT           NOT NULL PRIMARY KEY,
+        included_in_block_hash    TEXT           NOT NULL,
+        included_in_chunk_hash    TEXT           NOT NULL,
+        index_in_chunk            INTEGER        NOT NULL,
+        block_timestamp           NUMERIC(20, 0) NOT NULL,
+        signer_account_id         TEXT           NOT NULL,
+        receiver_account_id       TEXT           NOT NULL,
+        converted_into_receipt_id TEXT           NOT NULL
+    );
+    CREATE TABLE receipts
+    (
+        receipt_id                       TEXT           NOT NULL PRIMARY KEY,
+        included_in_block_hash           TEXT           NOT NULL,
+        included_in_block_timestamp      NUMERIC(20, 0) NOT NULL,
+        predecessor_account_id           TEXT           NOT NULL,
+        receiver_account_id              TEXT           NOT NULL,
+        originated_from_transaction_hash TEXT           NOT NULL
+    );
+    CREATE TABLE execution_outcomes
+    (
+        receipt_id                  TEXT                     NOT NULL PRIMARY KEY,
+        executed_in_block_hash      TEXT                     NOT NULL,
+        executed_in_block_timestamp NUMERIC(20, 0)           NOT NULL,
+        gas_burnt                   NUMERIC(20, 0)           NOT NULL,
+        tokens_burnt                NUMERIC(45, 0)           NOT NULL,
+        executor_account_id         TEXT                     NOT NULL,
+        status                      execution_outcome_status NOT NULL
+    );
+    CREATE TABLE action_receipt_actions
+    (
+        receipt_id                          TEXT           NOT NULL,
+        index_in_action_receipt             INTEGER        NOT NULL,
+        action_kind                         action_kind    NOT NULL,
+        args                                JSONB          NOT NULL,
+        receipt_predecessor_account_id      TEXT           NOT NULL,
+        receipt_receiver_account_id         TEXT           NOT NULL,
+        receipt_included_in_block_timestamp NUMERIC(20, 0) NOT NULL,
+        CONSTRAINT action_receipt_actions_pk PRIMARY KEY (receipt_id, index_in_action_receipt)
+    );
+    CREATE TABLE accounts
+    (
+        id                       BIGSERIAL      NOT NULL PRIMARY KEY,
+        account_id               TEXT           NOT NULL,
+        created_by_receipt_id    TEXT,
+        deleted_by_receipt_id    TEXT,
+        last_update_block_height NUMERIC(20, 0) NOT NULL
+    )
+"""
+
+# Created after the data is loaded, it's much faster than updating them row by row
+SQL_CREATE_INDEXES = """
+    CREATE INDEX blocks_height_idx ON blocks (block_height);
+    CREATE INDEX blocks_timestamp_idx ON blocks (block_timestamp);
+    CREATE INDEX chunks_included_in_block_hash_idx ON chunks (included_in_block_hash);
+    CREATE INDEX transactions_included_in_block_timestamp_idx ON transactions (block_timestamp);
+    CREATE INDEX transactions_signer_account_id_idx ON transactions (signer_account_id);
+    CREATE INDEX transactions_receiver_account_id_idx ON transactions (receiver_account_id);
+    CREATE INDEX receipts_included_in_block_timestamp_idx ON receipts (included_in_block_timestamp);
+    CREATE INDEX receipts_originated_from_transaction_hash_idx ON receipts (originated_from_transaction_hash);
+    CREATE INDEX receipts_receiver_account_id_idx ON receipts (receiver_account_id);
+    CREATE INDEX execution_outcomes_block_timestamp_idx ON execution_outcomes (executed_in_block_timestamp);
+    CREATE INDEX action_receipt_actions_receipt_included_in_block_timestamp_idx
+        ON action_receipt_actions (receipt_included_in_block_timestamp);
+    CREATE INDEX action_receipt_actions_receipt_receiver_account_id_idx
+        ON action_receipt_actions (receipt_receiver_account_id);
+    CREATE UNIQUE INDEX accounts_account_id_idx ON accounts (account_id);
+    CREATE INDEX accounts_created_by_receipt_id_idx ON accounts (created_by_receipt_id);
+    CREATE INDEX accounts_deleted_by_receipt_id_idx ON accounts (deleted_by_receipt_id);
+    ANALYZE
+"""
+
+SQL_DROP_TABLES = """
+    DROP TABLE IF EXISTS blocks, chunks, transactions, receipts,
+        execution_outcomes, action_receipt_actions, accounts;
+    DROP TYPE IF EXISTS action_kind, execution_outcome_status
+"""
+
+# The accounts and the contracts existing from the genesis: `account_<n>.near` and `contract_<n>.near`
+SQL_INSERT_GENESIS_ACCOUNTS = """
+    INSERT INTO accounts (account_id, created_by_receipt_id, deleted_by_receipt_id, last_update_block_height)
+    SELECT 'account_' || n || '.near', NULL, NULL, 0
+    FROM generate_series(0, %(accounts)s - 1) AS n
+    UNION ALL
+    SELECT 'contract_' || n || '.near', NULL, NULL, 0
+    FROM generate_series(0, %(contracts)s - 1) AS n
+"""
+
+# The blocks of the day go with the same interval, each block has one chunk per shard
+SQL_INSERT_BLOCKS = """
+    INSERT INTO blocks
+    SELECT
+        height,
+        'block_' || height,
+        'block_' || (height - 1),
+        %(day_start)s + (height - %(first_height)s) * %(block_interval)s,
+        1000000000000000000000000000000000,
+        100000000,
+        'validator_' || height %% 100 || '.near'
+    FROM generate_series(%(first_height)s, %(first_height)s + %(blocks_per_day)s - 1) AS height;
+
+    INSERT INTO chunks
+    SELECT
+        'block_' || height,
+        'chunk_' || height || '_' || shard,
+        shard,
+        1000000000000000,
+        floor(random() * 1000000000000000),
+        'validator_' || (height + shard) %% 100 || '.near'
+    FROM generate_series(%(first_height)s, %(first_height)s + %(blocks_per_day)s - 1) AS height,
+        generate_series(0, %(shards)s - 1) AS shard
+"""
+
+# `power(random(), k)` makes the small account numbers much more frequent than the big ones.
+# The receipt and its outcome are in the next block after the transaction,
+# so the receipts of the last transactions of the day are on the next day, as in the real data
+SQL_INSERT_TRANSACTIONS = """
+    WITH generated AS (
+        SELECT
+            n,
+            %(day_index)s || '_' || n AS suffix,
+            floor(random() * %(blocks_per_day)s)::bigint AS block_offset,
+            'account_' || floor(%(accounts)s * power(random(), 3))::bigint || '.near' AS signer,
+            'account_' || floor(%(accounts)s * random())::bigint || '.near' AS other_account,
+            'contract_' || floor(%(contracts)s * power(random(), 2))::bigint || '.near' AS contract,
+            random() AS kind_roll,
+            random() AS outcome_roll
+        FROM generate_series(1, %(transactions)s) AS n
+    ), tx AS (
+        SELECT
+            generated.*,
+            %(first_height)s + block_offset AS height,
+            %(day_start)s + block_offset * %(block_interval)s AS block_timestamp,
+            CASE
+                WHEN kind_roll < %(function_call_share)s THEN 'FUNCTION_CALL'
+                WHEN kind_roll < %(function_call_share)s + %(deploy_contract_share)s THEN 'DEPLOY_CONTRACT'
+                WHEN kind_roll < %(function_call_share)s + %(deploy_contract_share)s + %(add_key_share)s
+                    THEN 'ADD_KEY'
+                ELSE 'TRANSFER'
+            END AS kind
+        FROM generated
+    ), tx_with_receiver AS (
+        SELECT
+            tx.*,
+            CASE kind
+                WHEN 'TRANSFER' THEN other_account
+                WHEN 'ADD_KEY' THEN signer
+                ELSE contract
+            END AS receiver
+        FROM tx
+    ), inserted_transactions AS (
+        INSERT INTO transactions
+        SELECT
+            'tx_' || suffix,
+            'block_' || height,
+            'chunk_' || height || '_0',
+            n,
+            block_timestamp,
+            signer,
+            receiver,
+            'receipt_' || suffix
+        FROM tx_with_receiver
+    ), inserted_receipts AS (
+        INSERT INTO receipts
+        SELECT
+            'receipt_' || suffix,
+            'block_' || (height + 1),
+            block_timestamp + %(block_interval)s,
+            signer,
+            receiver,
+            'tx_' || suffix
+        FROM tx_with_receiver
+    ), inserted_outcomes AS (
+        INSERT INTO execution_outcomes
+        SELECT
+            'receipt_' || suffix,
+            'block_' || (height + 1),
+            block_timestamp + %(block_interval)s,
+            floor(outcome_roll * 300000000000000),
+            floor(outcome_roll * 30000000000000000000),
+            receiver,
+            (CASE WHEN outcome_roll < %(failure_share)s THEN 'FAILURE' ELSE 'SUCCESS_VALUE' END)::execution_outcome_status
+        FROM tx_with_receiver
+    )
+    INSERT INTO action_receipt_actions
+    SELECT
+        'receipt_' || suffix,
+        0,
+        kind::action_kind,
+        CASE kind
+            WHEN 'FUNCTION_CALL' THEN jsonb_build_object(
+                'method_name', 'method_' || n %% 10,
+                'args_base64', '',
+                'gas', 30000000000000,
+                'deposit', CASE WHEN outcome_roll < 0.3 THEN '1000000000000000000000000' ELSE '0' END
+            )
+            WHEN 'DEPLOY_CONTRACT' THEN jsonb_build_object(
+                'code_sha256', md5('code_' || n %% %(contract_codes)s)
+            )
+            WHEN 'ADD_KEY' THEN jsonb_build_object(
+                'public_key', 'ed25519:' || suffix,
+                'access_key', jsonb_build_object(
+                    'nonce', 0,
+                    'permission', jsonb_build_object(
+                        'permission_kind', 'FUNCTION_CALL',
+                        'permission_details', jsonb_build_object(
+                            'receiver_id', contract,
+                            'method_names', '[]'::jsonb,
+                            'allowance', NULL
+                        )
+                    )
+                )
+            )
+            ELSE jsonb_build_object(
+                'deposit', (outcome_roll * 10000000000000000000000000)::numeric(45, 0)::text
+            )
+        END,
+        signer,
+        receiver,
+        block_timestamp + %(block_interval)s
+    FROM tx_with_receiver
+"""
+
+# Each new account is created by its own receipt with CREATE_ACCOUNT and TRANSFER actions,
+# the first `deleted_accounts` of them are deleted on the same day by DELETE_ACCOUNT receipt
+SQL_INSERT_NEW_ACCOUNTS = """
+    WITH generated AS (
+        SELECT
+            n,
+            %(day_index)s || '_' || n AS suffix,
+            'account_' || floor(%(accounts)s * random())::bigint || '.near' AS creator,
+            'created_' || %(day_index)s || '_' || n || '.near' AS account_id,
+            floor(random() * (%(blocks_per_day)s - 1))::bigint AS block_offset,
+            n <= %(deleted_accounts)s AS is_deleted
+        FROM generate_series(1, %(new_accounts)s) AS n
+    ), account_receipts AS (
+        SELECT
+            'create_' || suffix AS receipt_id,
+            %(first_height)s + block_offset AS height,
+            %(day_start)s + block_offset * %(block_interval)s AS block_timestamp,
+            creator AS predecessor,
+            account_id,
+            'CREATE_ACCOUNT' AS kind
+        FROM generated
+        UNION ALL
+        SELECT
+            'delete_' || suffix,
+            %(first_height)s + block_offset + 1,
+            %(day_start)s + (block_offset + 1) * %(block_interval)s,
+            account_id,
+            account_id,
+            'DELETE_ACCOUNT'
+        FROM generated
+        WHERE is_deleted
+    ), inserted_accounts AS (
+        INSERT INTO accounts (account_id, created_by_receipt_id, deleted_by_receipt_id, last_update_block_height)
+        SELECT
+            account_id,
+            'create_' || suffix,
+            CASE WHEN is_deleted THEN 'delete_' || suffix END,
+            %(first_height)s + block_offset
+        FROM generated
+    ), inserted_receipts AS (
+        INSERT INTO receipts
+        SELECT
+            receipt_id,
+            'block_' || height,
+            block_timestamp,
+            predecessor,
+            account_id,
+            'tx_' || receipt_id
+        FROM account_receipts
+    ), inserted_outcomes AS (
+        INSERT INTO execution_outcomes
+        SELECT
+            receipt_id,
+            'block_' || height,
+            block_timestamp,
+            4174947687500,
+            417494768750000000000,
+            account_id,
+            'SUCCESS_VALUE'
+        FROM account_receipts
+    )
+    INSERT INTO action_receipt_actions
+    SELECT receipt_id, 0, kind::action_kind, '{}'::jsonb, predecessor, account_id, block_timestamp
+    FROM account_receipts
+    UNION ALL
+    SELECT receipt_id, 1, 'TRANSFER', jsonb_build_object('deposit', '100000000000000000000000'),
+        predecessor, account_id, block_timestamp
+    FROM account_receipts
+    WHERE kind = 'CREATE_ACCOUNT'
+"""
+
+
+def generate(connection, args):
+    if (
+        not 0
+        <= args.function_call_share + args.deploy_contract_share + args.add_key_share
+        <= 1
+    ):
+        raise ValueError("The sum of the action shares should be between 0 and 1")
+    if args.deleted_accounts_per_day > args.new_accounts_per_day:
+        raise ValueError(
+            "Only the new accounts are deleted, there are not enough of them"
+        )
+
+    with connection.cursor() as cursor:
+        if args.drop:
+            cursor.execute(SQL_DROP_TABLES)
+        cursor.execute(SQL_CREATE_TABLES)
+        cursor.execute(
+            SQL_INSERT_GENESIS_ACCOUNTS,
+            {"accounts": args.accounts, "contracts": args.contracts},
+        )
+        connection.commit()
+
+        start_date = datetime.datetime.strptime(args.start_date, "%Y-%m-%d").replace(
+            tzinfo=datetime.timezone.utc
+        )
+        for day_index in range(args.days):
+            start_time = time.time()
+            day = start_date + datetime.timedelta(days=day_index)
+            parameters = {
+                "day_index": day_index,
+                "day_start": int(day.timestamp()) * NANOSECONDS,
+                "first_height": day_index * args.blocks_per_day,
+                "blocks_per_day": args.blocks_per_day,
+                "block_interval": 24 * 60 * 60 * NANOSECONDS // args.blocks_per_day,
+                "shards": args.shards,
+                "transactions": args.transactions_per_day,
+                "accounts": args.accounts,
+                "contracts": args.contracts,
+                "contract_codes": args.contract_codes,
+                "function_call_share": args.function_call_share,
+                "deploy_contract_share": args.deploy_contract_share,
+                "add_key_share": args.add_key_share,
+                "failure_share": args.failure_share,
+                "new_accounts": args.new_accounts_per_day,
+                "deleted_accounts": args.deleted_accounts_per_day,
+            }
+            cursor.execute(SQL_INSERT_BLOCKS, parameters)
+            if args.transactions_per_day > 0:
+                cursor.execute(SQL_INSERT_TRANSACTIONS, parameters)
+            if args.new_accounts_per_day > 0:
+                cursor.execute(SQL_INSERT_NEW_ACCOUNTS, parameters)
+            connection.commit()
+            print(
+                f"Generated {day.date()} in {round(time.time() - start_time, 1)} seconds"
+            )
+
+        start_time = time.time()
+        cursor.execute(SQL_CREATE_INDEXES)
+        connection.commit()
+        print(f"Created indexes in {round(time.time() - start_time, 1)} seconds")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate the synthetic Indexer DB for the benchmarks of the aggregations"
+    )
+    parser.add_argument(
+        "database_url",
+        help="The local database to fill, e.g. postgresql://localhost/synthetic_indexer",
+    )
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Drop the Indexer DB tables if they exist",
+    )
+    parser.add_argument("--start-date", default="2022-01-01")
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=40,
+        help="Enough for the monthly aggregations by default",
+    )
+    parser.add_argument("--blocks-per-day", type=int, default=86400)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--transactions-per-day", type=int, default=100000)
+    parser.add_argument(
+        "--accounts",
+        type=int,
+        default=100000,
+        help="The number of the genesis accounts sending and receiving the transactions",
+    )
+    parser.add_argument(
+        "--contracts",
+        type=int,
+        default=1000,
+        help="The number of the contracts called, deployed and given the access keys to",
+    )
+    parser.add_argument(
+        "--contract-codes",
+        type=int,
+        default=100,
+        help="The number of the distinct codes deployed",
+    )
+    parser.add_argument("--function-call-share", type=float, default=0.7)
+    parser.add_argument("--deploy-contract-share", type=float, default=0.01)
+    parser.add_argument(
+        "--add-key-share",
+        type=float,
+        default=0.05,
+        help="The rest of the transactions are transfers",
+    )
+    parser.add_argument("--failure-share", type=float, default=0.05)
+    parser.add_argument("--new-accounts-per-day", type=int, default=1000)
+    parser.add_argument("--deleted-accounts-per-day", type=int, default=10)
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(args.database_url)
+    try:
+        generate(connection, args)
+    finally:
+        connection.close()
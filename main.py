@@ -1,7 +1,14 @@
 import argparse
+import atexit
+import concurrent.futures
+import contextlib
 import dotenv
+import functools
+import multiprocessing
+import multiprocessing.util
 import os
-import psycopg2
+import signal
+import sys
 import time
 import traceback
 import typing
@@ -24,11 +31,30 @@ from aggregations import (
     DailyTransactionCountByGasBurntRanges,
     DailyTransactionsCount,
     DeployedContracts,
+    MonthlyActiveAccountsCount,
+    MonthlyGasUsed,
+    MonthlyNewAccountsCount,
+    MonthlyTokensSpentOnFees,
+    MonthlyTransactionsCount,
     UniqueContracts,
     WeeklyActiveAccountsCount,
     NearEcosystemEntities,
 )
-from aggregations.db_tables import DAY_LEN_SECONDS, query_genesis_timestamp
+from aggregations.connection_pool import ConnectionPool
+from aggregations.daemon import RetryBackoff, due_window
+from aggregations.db_tables import DAY_LEN_SECONDS
+from aggregations.intraday import refresh_intraday
+from aggregations.journal import BackfillJournal
+from aggregations.metrics import METRICS, TimedRows, configure_metrics
+from aggregations.periodic_aggregations import PeriodicAggregations
+from aggregations.planner import dependencies_of, execute_plan, plan_statistics
+from aggregations.query_plans import capture_query_plan
+from aggregations.scan_groups import clear_shared_scans
+from aggregations.watermark import (
+    DEFAULT_TTL_SECONDS,
+    WATERMARK,
+    configure_watermark,
+)
 
 from datetime import datetime
 
@@ -51,96 +77,603 @@ STATS = {
     "daily_transaction_count_by_gas_burnt_ranges": DailyTransactionCountByGasBurntRanges,
     "daily_transactions_count": DailyTransactionsCount,
     "deployed_contracts": DeployedContracts,
+    "monthly_active_accounts_count": MonthlyActiveAccountsCount,
+    "monthly_gas_used": MonthlyGasUsed,
+    "monthly_new_accounts_count": MonthlyNewAccountsCount,
+    "monthly_tokens_spent_on_fees": MonthlyTokensSpentOnFees,
+    "monthly_transactions_count": MonthlyTransactionsCount,
     "unique_contracts": UniqueContracts,
     "weekly_active_accounts_count": WeeklyActiveAccountsCount,
     "near_ecosystem_entities": NearEcosystemEntities,
 }
 
 
+# Each request for `--all` covers a month, it's much faster than asking for each day separately
+BACKFILL_WINDOW_SECONDS = 31 * DAY_LEN_SECONDS
+
+
+# The windows of `--all` covering [from_timestamp, to_timestamp), aligned to the periods of the aggregation.
+# The window covers at least one period, even if the period is longer than `BACKFILL_WINDOW_SECONDS`
+def backfill_windows(
+    statistics: PeriodicAggregations, from_timestamp: int, to_timestamp: int
+) -> typing.List[typing.Tuple[int, int]]:
+    windows = []
+    current_day = from_timestamp
+    while current_day < to_timestamp:
+        next_day = max(
+            statistics.end_of_range(statistics.start_of_range(current_day)),
+            statistics.start_of_range(current_day + BACKFILL_WINDOW_SECONDS),
+        )
+        windows.append((current_day, next_day))
+        current_day = next_day
+    return windows
+
+
 def compute(
     analytics_connection,
     indexer_connection,
     statistics_type: str,
     statistics,
     timestamp: int,
+    to_timestamp: typing.Optional[int] = None,
 ):
     start_time = time.time()
-    try:
-        print(
-            f"Started computing {statistics_type} for {datetime.utcfromtimestamp(timestamp).date()}"
-        )
+    with METRICS.labels(statistics_type=statistics_type):
+        inserted_before = METRICS.counter_value("aggregation_rows_inserted_total")
+        try:
+            period = datetime.utcfromtimestamp(timestamp).date()
+            if to_timestamp is not None:
+                period = f"{period} - {datetime.utcfromtimestamp(to_timestamp).date()}"
+            print(f"Started computing {statistics_type} for {period}")
 
-        statistics.create_table()
-        result = statistics.collect(timestamp)
-        statistics.store(result)
+            statistics.create_table()
+            # The streaming aggregations store the rows while the next ones are still being read
+            streaming = (
+                isinstance(statistics, PeriodicAggregations) and statistics.STREAMING
+            )
+            collect_start_time = time.monotonic()
+            if to_timestamp is None:
+                result = (
+                    statistics.iter_collect(timestamp)
+                    if streaming
+                    else statistics.collect(timestamp)
+                )
+            else:
+                result = (
+                    statistics.iter_collect_range(timestamp, to_timestamp)
+                    if streaming
+                    else statistics.collect_range(timestamp, to_timestamp)
+                )
+            rows = TimedRows(result)
+            collect_seconds = time.monotonic() - collect_start_time
+            rows_count = statistics.store(rows)
+            duration_seconds = time.monotonic() - collect_start_time
+            # The streaming rows are read while `store` is running
+            collect_seconds += rows.seconds
 
-        print(
-            f"Finished computing {statistics_type} in {round(time.time() - start_time, 1)} seconds"
-        )
-    except Exception as e:
-        print(
-            f"Failed to compute {statistics_type} (spent {round(time.time() - start_time, 1)} seconds)"
-        )
-        # psycopg2 does not provide proper exception if the connection is closed.
-        # The given exception is too broad, and sometimes psycopg2 gives different error types on a same reason.
-        # As a result, we can fail here if we try to rollback the transaction on the closed connection.
-        # We anyway handle the exception further, so I decided to ignore this issue here
-        analytics_connection.rollback()
-        indexer_connection.rollback()
-        raise e
+            METRICS.observe("aggregation_collect_seconds", collect_seconds)
+            METRICS.observe(
+                "aggregation_store_seconds", duration_seconds - collect_seconds
+            )
+            METRICS.increment("aggregation_rows_collected_total", rows.rows_count)
+            METRICS.set_gauge("aggregation_last_success_timestamp_seconds", time.time())
+            with METRICS.without_labels():
+                watermark_lag_seconds = METRICS.gauge_value(
+                    "indexer_watermark_lag_seconds"
+                )
+            METRICS.event(
+                status="ok",
+                from_timestamp=timestamp,
+                to_timestamp=to_timestamp,
+                collect_seconds=collect_seconds,
+                store_seconds=duration_seconds - collect_seconds,
+                rows_collected=rows.rows_count,
+                rows_inserted=METRICS.counter_value("aggregation_rows_inserted_total")
+                - inserted_before,
+                watermark_lag_seconds=watermark_lag_seconds,
+            )
+            print(
+                f"Finished computing {statistics_type} in {round(time.time() - start_time, 1)} seconds"
+            )
+            return rows_count
+        except Exception as e:
+            print(
+                f"Failed to compute {statistics_type} (spent {round(time.time() - start_time, 1)} seconds)"
+            )
+            METRICS.increment("aggregation_failures_total")
+            METRICS.event(
+                status="failed",
+                from_timestamp=timestamp,
+                to_timestamp=to_timestamp,
+                duration_seconds=time.time() - start_time,
+                error=repr(e),
+            )
+            # psycopg2 does not provide proper exception if the connection is closed.
+            # The given exception is too broad, and sometimes psycopg2 gives different error types on a same reason.
+            # As a result, we can fail here if we try to rollback the transaction on the closed connection.
+            # We anyway handle the exception further, so I decided to ignore this issue here
+            analytics_connection.rollback()
+            indexer_connection.rollback()
+            raise e
 
 
-def compute_statistics(
+# Each process has its own connection pools, see `init_connection_pools`
+CONNECTION_POOLS: typing.Dict[str, ConnectionPool] = {}
+
+
+def init_connection_pools(analytics_database_url, indexer_database_url):
+    close_connection_pools()
+    CONNECTION_POOLS["analytics"] = ConnectionPool(analytics_database_url)
+    CONNECTION_POOLS["indexer"] = ConnectionPool(indexer_database_url)
+    # `atexit` handlers are not called in the worker processes, but these finalizers are
+    multiprocessing.util.Finalize(None, close_connection_pools, exitpriority=10)
+
+
+def close_connection_pools():
+    for pool in CONNECTION_POOLS.values():
+        pool.close()
+    CONNECTION_POOLS.clear()
+
+
+@contextlib.contextmanager
+def connections():
+    with CONNECTION_POOLS["analytics"].connection() as analytics_connection:
+        with CONNECTION_POOLS["indexer"].connection() as indexer_connection:
+            yield analytics_connection, indexer_connection
+
+
+# The options passed to each aggregation, e.g. `rollup`. See `BaseAggregations`
+STATISTICS_OPTIONS = {}
+
+
+def create_statistics(statistics_type: str, analytics_connection, indexer_connection):
+    return STATS[statistics_type](
+        analytics_connection, indexer_connection, **STATISTICS_OPTIONS
+    )
+
+
+def init_worker(
     analytics_database_url,
     indexer_database_url,
+    statistics_options,
+    watermark_ttl_seconds,
+    metrics_jsonl_path,
+):
+    init_connection_pools(analytics_database_url, indexer_database_url)
+    STATISTICS_OPTIONS.update(statistics_options)
+    configure_watermark(watermark_ttl_seconds)
+    # The workers write the events themselves, the totals are returned to the parent, see `metrics.py`
+    configure_metrics(None, metrics_jsonl_path)
+
+
+def worker_pool_parameters() -> dict:
+    return {
+        "initializer": init_worker,
+        "initargs": (
+            CONNECTION_POOLS["analytics"].database_url,
+            CONNECTION_POOLS["indexer"].database_url,
+            STATISTICS_OPTIONS,
+            WATERMARK.ttl_seconds,
+            METRICS.jsonl_path,
+        ),
+    }
+
+
+def compute_window(statistics_type: str, from_timestamp: int, to_timestamp: int):
+    for attempt in range(10, 0, -1):
+        try:
+            with connections() as (analytics_connection, indexer_connection):
+                start_time = time.time()
+                statistics = create_statistics(
+                    statistics_type, analytics_connection, indexer_connection
+                )
+                # The last periods could be not finished yet, we have to compute them again next time.
+                # The window ends together with its last period, so it's enough to check its end
+                is_window_finished = statistics.is_indexer_ready(to_timestamp)
+                rows_count = compute(
+                    analytics_connection,
+                    indexer_connection,
+                    statistics_type,
+                    statistics,
+                    from_timestamp,
+                    to_timestamp,
+                )
+                if is_window_finished:
+                    BackfillJournal(analytics_connection).record(
+                        statistics_type,
+                        from_timestamp,
+                        to_timestamp,
+                        rows_count,
+                        time.time() - start_time,
+                    )
+            return
+        except Exception:
+            # The broken connections are replaced by the pool on the next attempt
+            print(f"Compute for {from_timestamp} failed. See details below.")
+            traceback.print_exc()
+            if attempt == 1:
+                raise
+            METRICS.increment(
+                "aggregation_retries_total", statistics_type=statistics_type
+            )
+            print(f"Retrying...")
+
+
+# `compute_window` for the worker process, returns the metrics of the worker to the parent.
+# If it fails, the metrics stay in the worker and go with the next window
+def compute_window_in_worker(
+    statistics_type: str, from_timestamp: int, to_timestamp: int
+) -> dict:
+    compute_window(statistics_type, from_timestamp, to_timestamp)
+    return METRICS.drain()
+
+
+def compute_statistics(
     statistics_type: str,
     timestamp: typing.Optional[int],
     collect_all,
+    jobs: int = 1,
+    resume: bool = False,
 ):
-    statistics_cls = STATS[statistics_type]
-
-    for cls in statistics_cls.DEPENDENCIES:
-        compute_statistics(
-            analytics_database_url, indexer_database_url, cls, timestamp, collect_all
-        )
-
-    analytics_connection = psycopg2.connect(analytics_database_url)
-    indexer_connection = psycopg2.connect(indexer_database_url)
-    if collect_all:
-        statistics = statistics_cls(analytics_connection, indexer_connection)
-        statistics.drop_table()
-        current_day = query_genesis_timestamp(indexer_connection)
-        while current_day < int(time.time()):
-            for attempt in range(10, 0, -1):
-                try:
-                    compute(
-                        analytics_connection,
-                        indexer_connection,
+    # The dependencies are not computed here, see `plan_statistics`
+    if not collect_all:
+        # Computing for yesterday by default
+        timestamp = timestamp or int(time.time() - DAY_LEN_SECONDS)
+        with connections() as (analytics_connection, indexer_connection):
+            compute(
+                analytics_connection,
+                indexer_connection,
+                statistics_type,
+                create_statistics(
+                    statistics_type, analytics_connection, indexer_connection
+                ),
+                timestamp,
+            )
+        return
+
+    with connections() as (analytics_connection, indexer_connection):
+        statistics = create_statistics(
+            statistics_type, analytics_connection, indexer_connection
+        )
+        journal = BackfillJournal(analytics_connection)
+        journal.create_table()
+        if not resume:
+            statistics.drop_table()
+            journal.clear(statistics_type)
+        if not isinstance(statistics, PeriodicAggregations):
+            # Such aggregations do not depend on the time, computing them once is enough
+            compute(
+                analytics_connection,
+                indexer_connection,
+                statistics_type,
+                statistics,
+                int(time.time()),
+            )
+            return
+
+        # The table is created before the workers start, concurrent `CREATE TABLE` may fail
+        statistics.create_table()
+        # The windows are aligned to the periods, so no period is computed twice.
+        # They are also the same from run to run, so we can skip the ones from the journal
+        completed_windows = journal.completed_periods(statistics_type)
+        windows = [
+            window
+            for window in backfill_windows(
+                statistics,
+                WATERMARK.genesis_timestamp(indexer_connection),
+                int(time.time()),
+            )
+            if window not in completed_windows
+        ]
+        if completed_windows:
+            print(
+                f"Resuming {statistics_type}: {len(windows)} windows left, {len(completed_windows)} already computed"
+            )
+
+    if jobs == 1 or not statistics.ORDER_INDEPENDENT:
+        for from_timestamp, to_timestamp in windows:
+            compute_window(statistics_type, from_timestamp, to_timestamp)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        **worker_pool_parameters(),
+    ) as executor:
+        futures = [
+            executor.submit(compute_window_in_worker, statistics_type, *window)
+            for window in windows
+        ]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                METRICS.merge(future.result())
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+# Updates the partial aggregates of the unfinished periods, see `intraday.py`.
+# Returns the types of the aggregations that failed
+def compute_intraday(stats_types: typing.List[str]) -> typing.List[str]:
+    failed = []
+    for statistics_type in stats_types:
+        start_time = time.time()
+        try:
+            with connections() as (analytics_connection, indexer_connection):
+                with METRICS.timer(
+                    "intraday_refresh_seconds", statistics_type=statistics_type
+                ):
+                    rows_count = refresh_intraday(
                         statistics_type,
-                        statistics_cls(analytics_connection, indexer_connection),
-                        current_day,
+                        create_statistics(
+                            statistics_type, analytics_connection, indexer_connection
+                        ),
                     )
-                except Exception:
-                    print(f"Compute for {current_day} failed. See details below.")
-                    traceback.print_exc()
-                    if attempt == 0:
-                        raise
-                    print(f"Retrying...")
-                    analytics_connection = psycopg2.connect(analytics_database_url)
-                    indexer_connection = psycopg2.connect(indexer_database_url)
-                else:
-                    break
-            current_day += DAY_LEN_SECONDS
+            print(
+                f"Refreshed intraday {statistics_type} in {round(time.time() - start_time, 1)} seconds, "
+                f"{rows_count} rows finalized"
+            )
+        except Exception:
+            print(f"Failed to refresh intraday {statistics_type}. See details below.")
+            METRICS.increment(
+                "intraday_failures_total", statistics_type=statistics_type
+            )
+            traceback.print_exc()
+            failed.append(statistics_type)
+    return failed
+
+
+# The aggregations among the given ones that could be partitioned by months, see `partitions.py`
+def partitioned_stats_types(stats_types: typing.Iterable[str]) -> typing.List[str]:
+    return [
+        stats_type
+        for stats_type in stats_types
+        if getattr(STATS[stats_type], "PARTITION_COLUMN", None) is not None
+    ]
+
+
+# Detaches the partitions of the months finished before the timestamp.
+# The detached tables are kept, archive or drop them separately
+def detach_partitions(stats_types: typing.Iterable[str], before_timestamp: int):
+    for statistics_type in partitioned_stats_types(stats_types):
+        with connections() as (analytics_connection, indexer_connection):
+            statistics = create_statistics(
+                statistics_type, analytics_connection, indexer_connection
+            )
+            detached = statistics.partitions.detach_before(before_timestamp)
+        for name in detached:
+            print(f"Detached {name} from {statistics_type}")
+
+
+# Recomputes the month with the timestamp and swaps it into the partitioned tables.
+# Returns the types of the aggregations that failed
+def rebuild_partitions(
+    stats_types: typing.Iterable[str], timestamp: int
+) -> typing.List[str]:
+    failed = []
+    for statistics_type in partitioned_stats_types(stats_types):
+        start_time = time.time()
+        try:
+            with connections() as (analytics_connection, indexer_connection):
+                statistics = create_statistics(
+                    statistics_type, analytics_connection, indexer_connection
+                )
+                with METRICS.labels(statistics_type=statistics_type):
+                    rows_count = statistics.rebuild_partition(timestamp)
+            print(
+                f"Rebuilt the partition of {statistics_type} in {round(time.time() - start_time, 1)} seconds, "
+                f"{rows_count} rows stored"
+            )
+        except Exception:
+            print(
+                f"Failed to rebuild the partition of {statistics_type}. See details below."
+            )
+            traceback.print_exc()
+            failed.append(statistics_type)
+    return failed
+
+
+# The aggregations among the given ones keeping the daily sketches of their rows, see `sketches.py`
+def sketched_stats_types(stats_types: typing.Iterable[str]) -> typing.List[str]:
+    return [
+        stats_type
+        for stats_type in partitioned_stats_types(stats_types)
+        if getattr(STATS[stats_type], "SKETCH_TYPE", None) is not None
+    ]
+
+
+# Builds the sketches of the days stored before the sketches were kept.
+# Returns the types of the aggregations that failed
+def build_missing_sketches(stats_types: typing.Iterable[str]) -> typing.List[str]:
+    failed = []
+    for statistics_type in sketched_stats_types(stats_types):
+        start_time = time.time()
+        try:
+            with connections() as (analytics_connection, indexer_connection):
+                statistics = create_statistics(
+                    statistics_type, analytics_connection, indexer_connection
+                )
+                days = statistics.build_missing_sketches()
+            print(
+                f"Built the sketches of {statistics_type} in {round(time.time() - start_time, 1)} seconds, "
+                f"{len(days)} days"
+            )
+        except Exception:
+            print(
+                f"Failed to build the sketches of {statistics_type}. See details below."
+            )
+            traceback.print_exc()
+            failed.append(statistics_type)
+    return failed
+
+
+# Captures the query plans of the aggregations for the period, see `query_plans.py`.
+# Returns the regressions found: {statistics_type: description}
+def explain_statistics(
+    stats_types: typing.Iterable[str], timestamp: int
+) -> typing.Dict[str, str]:
+    regressions = {}
+    # The scan group query is run once, see `capture_query_plan`
+    captured_plans = {}
+    for statistics_type in stats_types:
+        with connections() as (analytics_connection, indexer_connection):
+            statistics = create_statistics(
+                statistics_type, analytics_connection, indexer_connection
+            )
+            if not isinstance(statistics, PeriodicAggregations):
+                continue
+            try:
+                regression = capture_query_plan(
+                    statistics_type, statistics, timestamp, captured_plans
+                )
+            except NotImplementedError:
+                # The aggregation does not query Indexer DB
+                continue
+        if regression:
+            print(f"WARN: Query plan regression for {statistics_type}: {regression}")
+            regressions[statistics_type] = regression
+        else:
+            print(f"Captured the query plan for {statistics_type}")
+    return regressions
+
+
+# Computes the periods of the aggregation in `window`, records them in the journal.
+# Returns the number of the stored rows
+def compute_daemon_window(
+    analytics_connection,
+    indexer_connection,
+    statistics_type: str,
+    statistics,
+    window: typing.Tuple[int, int],
+) -> int:
+    start_time = time.time()
+    from_timestamp, to_timestamp = window
+    if isinstance(statistics, PeriodicAggregations):
+        rows_count = compute(
+            analytics_connection,
+            indexer_connection,
+            statistics_type,
+            statistics,
+            from_timestamp,
+            to_timestamp,
+        )
     else:
-        # Computing for yesterday by default
-        timestamp = timestamp or int(time.time() - DAY_LEN_SECONDS)
-        compute(
+        rows_count = compute(
             analytics_connection,
             indexer_connection,
             statistics_type,
-            statistics_cls(analytics_connection, indexer_connection),
-            timestamp,
+            statistics,
+            from_timestamp,
         )
+    BackfillJournal(analytics_connection).record(
+        statistics_type,
+        from_timestamp,
+        to_timestamp,
+        rows_count,
+        time.time() - start_time,
+    )
+    return rows_count
+
+
+# Runs until SIGTERM/SIGINT: computes each aggregation as soon as its period is finished in Indexer DB.
+# The connections, the watermark and other caches of the process are reused by all the cycles
+def run_daemon(
+    stats_types: typing.Iterable[str],
+    poll_interval_seconds: float,
+    rollup: bool = False,
+    intraday: bool = False,
+):
+    plan = plan_statistics(STATS, stats_types, rollup=rollup)
+    intraday_types = [
+        stats_type
+        for stats_type in plan
+        if getattr(STATS[stats_type], "ADDITIVE", False)
+    ]
+    backoff = RetryBackoff()
+    # The end of the latest computed period for each aggregation
+    computed_until: typing.Dict[str, typing.Optional[int]] = {}
+    stopping = []
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, lambda *_: stopping.append(True))
+
+    print(f"Daemon started for [{' '.join(plan)}]")
+    while not stopping:
+        cycle_start_time = time.time()
+        try:
+            with connections() as (analytics_connection, indexer_connection):
+                journal = BackfillJournal(analytics_connection)
+                journal.create_table()
+                latest_timestamp = WATERMARK.latest_timestamp(indexer_connection)
+                for statistics_type in plan:
+                    if stopping:
+                        break
+                    if statistics_type not in computed_until:
+                        computed_until[statistics_type] = journal.computed_until(
+                            statistics_type
+                        )
+                    dependencies_until = [
+                        computed_until.get(dependency)
+                        for dependency in dependencies_of(
+                            STATS, statistics_type, rollup
+                        )
+                        if dependency in plan
+                    ]
+                    if None in dependencies_until:
+                        # The dependency has not computed anything yet
+                        continue
+                    statistics = create_statistics(
+                        statistics_type, analytics_connection, indexer_connection
+                    )
+                    window = due_window(
+                        statistics,
+                        computed_until[statistics_type],
+                        latest_timestamp,
+                        BACKFILL_WINDOW_SECONDS,
+                        min(dependencies_until, default=None),
+                    )
+                    if window is None:
+                        continue
+                    key = (statistics_type, window[0])
+                    if not backoff.is_ready(key):
+                        continue
+                    try:
+                        compute_daemon_window(
+                            analytics_connection,
+                            indexer_connection,
+                            statistics_type,
+                            statistics,
+                            window,
+                        )
+                    except Exception:
+                        traceback.print_exc()
+                        METRICS.increment(
+                            "aggregation_retries_total",
+                            statistics_type=statistics_type,
+                        )
+                        delay = backoff.record_failure(key)
+                        print(
+                            f"Retrying {statistics_type} from {datetime.utcfromtimestamp(window[0]).date()} "
+                            f"in {round(delay)} seconds"
+                        )
+                        continue
+                    backoff.record_success(key)
+                    computed_until[statistics_type] = window[1]
+        except Exception:
+            # The broken connections are replaced by the pools in the next cycle
+            print("The connection is probably lost. See details below.")
+            traceback.print_exc()
+        if intraday and intraday_types and not stopping:
+            compute_intraday(intraday_types)
+        # The results shared by the scan group members are not kept till the next cycle
+        clear_shared_scans()
+        METRICS.write_textfile()
+        # The watermark is cached for `--watermark-ttl`, polling more often is useless.
+        # Sleeping by short steps, so the stop signal is handled quickly
+        next_cycle_time = cycle_start_time + poll_interval_seconds
+        while not stopping and time.time() < next_cycle_time:
+            time.sleep(max(0.0, min(1.0, next_cycle_time - time.time())))
+    print("Daemon stopped")
 
 
 if __name__ == "__main__":
@@ -171,32 +704,288 @@ if __name__ == "__main__":
         help="Drop all previous data for given `stats-types` and fulfill the DB "
         "with all values till now. Can't be used with `--timestamp`",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of aggregations computed at the same time. "
+        "Each of them uses separate connections to both DBs. "
+        "The aggregation starts only after all its dependencies are computed. "
+        "With `--all`, the aggregations are computed one by one, "
+        "but the periods of each aggregation are split between `jobs` workers.",
+    )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        action="store_true",
+        help="Use with `--all`. Do not drop the previous data and skip the periods "
+        "already stored by the previous `--all` run, see `backfill_journal` table.",
+    )
+    parser.add_argument(
+        "--rollup",
+        action="store_true",
+        help="Compute the aggregations from the detailed tables in Analytics DB where it's possible "
+        "(e.g. `daily_active_accounts_count` from `daily_outgoing_transactions_per_account_count`) "
+        "instead of querying Indexer DB. The detailed tables are computed first.",
+    )
+    parser.add_argument(
+        "--watermark-ttl",
+        type=float,
+        default=DEFAULT_TTL_SECONDS,
+        help="How long (in seconds) the latest Indexer DB block timestamp is cached. "
+        "Use a negative value to refresh it only when the period is not finished "
+        "according to the cached value.",
+    )
+    parser.add_argument(
+        "--intraday",
+        action="store_true",
+        help="Update the values of the current (unfinished) period by the finished hours "
+        "and store the periods finished since the previous run. Only for the additive aggregations, "
+        "by default all of them. Run it often (e.g. hourly), each run reads only the new hours. "
+        "Can't be used with `--all` or `--timestamp`.",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Do not compute anything, run the Indexer DB queries of the aggregations for the period "
+        "with `EXPLAIN (ANALYZE, BUFFERS)` and store the plans in `query_plans` table. "
+        "Fails if the plan shape or the number of the touched buffers has changed a lot "
+        "since the last good plan. Use with `--timestamp` to choose the period, yesterday by default.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run forever, computing each aggregation as soon as its period is finished in Indexer DB. "
+        "The periods missed since the last stored one (see `backfill_journal`) are caught up, "
+        "the failed periods are retried with the exponential backoff. "
+        "The aggregations are computed one by one in this process, reusing the connections. "
+        "Could be combined with `--intraday` and `--rollup`.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60,
+        help="Use with `--daemon`. How often (in seconds) Indexer DB is checked for the finished periods.",
+    )
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Create the big per-account tables (e.g. `daily_outgoing_transactions_per_account_count`) "
+        "partitioned by months. The partitions are created as the new months come. "
+        "The existing table is not converted, recompute it with `--all` to partition it.",
+    )
+    parser.add_argument(
+        "--detach-partitions-before",
+        type=int,
+        help="Do not compute anything, detach the partitions of the months finished before "
+        "this timestamp (in seconds) from the partitioned tables. The detached tables are not dropped.",
+    )
+    parser.add_argument(
+        "--rebuild-partition",
+        action="store_true",
+        help="Recompute the month of `--timestamp` for the partitioned tables in a separate table "
+        "and swap it with the month partition at once.",
+    )
+    parser.add_argument(
+        "--build-sketches",
+        action="store_true",
+        help="Do not compute anything, build the missing daily sketches of the days already stored "
+        "in the per-account tables (e.g. `daily_outgoing_transactions_per_account_count`) from their rows. "
+        "The estimations (e.g. `monthly_active_accounts_count`) fail for the months with the missing sketches.",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        help="Write the metrics of the run (durations, rows, retries, Indexer DB lag) to this file "
+        "in Prometheus text format at exit, e.g. for node_exporter textfile collector. "
+        "With `--daemon`, the file is updated after each cycle.",
+    )
+    parser.add_argument(
+        "--metrics-jsonl",
+        help="Append one JSON line per computed aggregation and period to this file: "
+        "collect and store time, collected and inserted rows, Indexer DB lag, errors.",
+    )
     args = parser.parse_args()
     if args.all and args.timestamp:
         raise ValueError("`timestamp` parameter can't be combined with `all` option")
+    if args.resume and not args.all:
+        raise ValueError("`resume` option can be used only with `all` option")
+    if args.jobs < 1:
+        raise ValueError("`jobs` parameter should be positive")
+    if args.daemon and (args.all or args.timestamp or args.resume):
+        raise ValueError(
+            "`daemon` option can't be combined with `all`, `timestamp` or `resume`"
+        )
+    if args.explain and (args.all or args.daemon or args.intraday):
+        raise ValueError(
+            "`explain` option can't be combined with `all`, `daemon` or `intraday`"
+        )
+    if args.poll_interval <= 0:
+        raise ValueError("`poll-interval` parameter should be positive")
+    if args.daemon and args.jobs != 1:
+        raise ValueError("`daemon` option computes the aggregations one by one")
+    if args.intraday and (args.all or args.timestamp):
+        raise ValueError(
+            "`intraday` option can't be combined with `all` or `timestamp`"
+        )
+    if args.rebuild_partition and not args.timestamp:
+        raise ValueError("`rebuild-partition` option requires `timestamp` parameter")
+    partition_maintenance = args.rebuild_partition or args.detach_partitions_before
+    if partition_maintenance and (
+        args.all or args.daemon or args.intraday or args.explain
+    ):
+        raise ValueError(
+            "`rebuild-partition` and `detach-partitions-before` can't be combined with "
+            "`all`, `daemon`, `intraday` or `explain`"
+        )
+    if args.build_sketches and (
+        args.all
+        or args.timestamp
+        or args.daemon
+        or args.intraday
+        or args.explain
+        or partition_maintenance
+    ):
+        raise ValueError(
+            "`build-sketches` option can't be combined with `all`, `timestamp`, `daemon`, "
+            "`intraday`, `explain`, `rebuild-partition` or `detach-partitions-before`"
+        )
+    not_sketched = [
+        stats_type
+        for stats_type in args.stats_types
+        if stats_type not in sketched_stats_types([stats_type])
+    ]
+    if args.build_sketches and not_sketched:
+        raise ValueError(
+            f"Only the per-account aggregations keep the daily sketches: [{' '.join(not_sketched)}]"
+        )
+    not_partitioned = [
+        stats_type
+        for stats_type in args.stats_types
+        if getattr(STATS[stats_type], "PARTITION_COLUMN", None) is None
+    ]
+    if partition_maintenance and not_partitioned:
+        raise ValueError(
+            f"Only the partitioned aggregations have partitions: [{' '.join(not_partitioned)}]"
+        )
+    not_additive = [
+        stats_type
+        for stats_type in args.stats_types
+        if not getattr(STATS[stats_type], "ADDITIVE", False)
+    ]
+    if args.intraday and not args.daemon and not_additive:
+        raise ValueError(
+            f"Only additive aggregations could be computed with `intraday`: [{' '.join(not_additive)}]"
+        )
 
     dotenv.load_dotenv()
     ANALYTICS_DATABASE_URL = os.getenv("ANALYTICS_DATABASE_URL")
     INDEXER_DATABASE_URL = os.getenv("INDEXER_DATABASE_URL")
 
+    STATISTICS_OPTIONS["rollup"] = args.rollup
+    STATISTICS_OPTIONS["partitioned"] = args.partitioned
+    configure_metrics(args.metrics_textfile, args.metrics_jsonl)
+    # Called on any exit, including the failed runs
+    atexit.register(METRICS.write_textfile)
+    configure_watermark(None if args.watermark_ttl < 0 else args.watermark_ttl)
+    # The connections are reused by all the aggregations computed in this process
+    init_connection_pools(ANALYTICS_DATABASE_URL, INDEXER_DATABASE_URL)
+
+    if args.explain:
+        regressions = explain_statistics(
+            args.stats_types or STATS.keys(),
+            args.timestamp or int(time.time() - DAY_LEN_SECONDS),
+        )
+        close_connection_pools()
+        if regressions:
+            raise RuntimeError(
+                f"Query plan regressions found: [{' '.join(regressions)}]"
+            )
+        sys.exit(0)
+
+    if args.detach_partitions_before:
+        detach_partitions(
+            args.stats_types or STATS.keys(), args.detach_partitions_before
+        )
+        close_connection_pools()
+        sys.exit(0)
+
+    if args.rebuild_partition:
+        failed = rebuild_partitions(args.stats_types or STATS.keys(), args.timestamp)
+        close_connection_pools()
+        if failed:
+            raise RuntimeError(
+                f"Some partitions could not be rebuilt: [{' '.join(failed)}]"
+            )
+        sys.exit(0)
+
+    if args.build_sketches:
+        failed = build_missing_sketches(args.stats_types or STATS.keys())
+        close_connection_pools()
+        if failed:
+            raise RuntimeError(
+                f"Some sketches could not be built: [{' '.join(failed)}]"
+            )
+        sys.exit(0)
+
+    if args.daemon:
+        run_daemon(
+            args.stats_types or STATS.keys(),
+            args.poll_interval,
+            rollup=args.rollup,
+            intraday=args.intraday,
+        )
+        close_connection_pools()
+        sys.exit(0)
+
+    if args.intraday:
+        failed = compute_intraday(
+            args.stats_types
+            or [
+                stats_type
+                for stats_type, statistics_class in STATS.items()
+                if getattr(statistics_class, "ADDITIVE", False)
+            ]
+        )
+        close_connection_pools()
+        if failed:
+            raise RuntimeError(
+                f"Some intraday aggregations could not be refreshed: [{' '.join(failed)}]"
+            )
+        sys.exit(0)
+
     stats_need_to_compute = set(args.stats_types or STATS.keys())
+    # Fails fast if there are unknown or circular dependencies
+    plan_statistics(STATS, stats_need_to_compute, rollup=args.rollup)
+    stats_computed = set()
     for i in range(1, 6):
         print(f"Attempt {i}...")
-        stats_computed = set()
         try:
-            for stats_type in stats_need_to_compute:
-                try:
-                    compute_statistics(
-                        ANALYTICS_DATABASE_URL,
-                        INDEXER_DATABASE_URL,
-                        stats_type,
-                        args.timestamp,
-                        args.all,
-                    )
-                    stats_computed.add(stats_type)
-                except Exception:
-                    print(f"Failed to compute the value for {stats_type}")
-                    traceback.print_exc()
+            # Each aggregation is computed once per run, even if several others depend on it.
+            # The aggregations computed at the previous attempts are not recomputed.
+            computed, _ = execute_plan(
+                STATS,
+                plan_statistics(
+                    STATS,
+                    stats_need_to_compute,
+                    skip_types=stats_computed,
+                    rollup=args.rollup,
+                ),
+                functools.partial(
+                    compute_statistics,
+                    timestamp=args.timestamp,
+                    collect_all=args.all,
+                    jobs=args.jobs,
+                    # The next attempts continue the backfill started by the first one
+                    resume=args.resume or i > 1,
+                ),
+                jobs=1 if args.all else args.jobs,
+                **worker_pool_parameters(),
+                # The members of the scan group share one query if they run in the same process
+                batch_key=lambda stats_type: STATS[stats_type].SCAN_GROUP,
+                rollup=args.rollup,
+            )
+            stats_computed |= computed
 
         except Exception as e:
             # If we lost connection and try to catch related DB exception here,
@@ -210,6 +999,8 @@ if __name__ == "__main__":
         if not stats_need_to_compute:
             break
 
+    close_connection_pools()
+
     # It's important to have non-zero exit code in case of any errors,
     # It helps AWX to identify and report the problem
     if stats_need_to_compute:
@@ -0,0 +1,77 @@
+import psycopg2.sql
+
+"""
+The fake psycopg2 connection for the tests: it records the executed statements
+and answers the queries with `responder`.
+The statements composed with `psycopg2.sql` are rendered without the real connection.
+"""
+
+
+class FakeCursor:
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.itersize = None
+        self.rowcount = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def execute(self, statement, parameters=None):
+        statement = render(statement)
+        self.connection.log.append((statement, parameters))
+        self._rows = list(self.connection.responder(statement, parameters) or [])
+        self.rowcount = len(self._rows)
+
+    def copy_expert(self, statement, file):
+        self.connection.log.append((render(statement), file.read()))
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+class FakeConnection:
+    def __init__(self, responder=lambda statement, parameters: []):
+        self.responder = responder
+        # (statement, parameters), "COMMIT" and "ROLLBACK" in the order they were sent
+        self.log = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def commit(self):
+        self.log.append(("COMMIT", None))
+
+    def rollback(self):
+        self.log.append(("ROLLBACK", None))
+
+    def statements(self) -> list:
+        return [" ".join(statement.split()) for statement, _ in self.log]
+
+
+def render(statement) -> str:
+    if isinstance(statement, str):
+        return statement
+    if isinstance(statement, psycopg2.sql.Composed):
+        return "".join(render(part) for part in statement.seq)
+    if isinstance(statement, psycopg2.sql.SQL):
+        return statement.string
+    if isinstance(statement, psycopg2.sql.Identifier):
+        return ".".join(
+            '"' + string.replace('"', '""') + '"' for string in statement.strings
+        )
+    if isinstance(statement, psycopg2.sql.Literal):
+        return repr(statement.wrapped)
+    if isinstance(statement, psycopg2.sql.Placeholder):
+        return f"%({statement.name})s" if statement.name else "%s"
+    raise TypeError(f"Unknown statement type {type(statement)}")
@@ -0,0 +1,49 @@
+import unittest
+
+from aggregations.granularity import DAILY, MONTHLY, Granularity
+from main import backfill_windows
+
+# 2021-01-15 and 2022-01-15
+FROM_TIMESTAMP = 1610668800
+TO_TIMESTAMP = 1642204800
+
+
+class FakeStatistics:
+    def __init__(self, granularity: Granularity):
+        self.granularity = granularity
+
+    def start_of_range(self, timestamp: int) -> int:
+        return self.granularity.start_of_range(timestamp)
+
+    def end_of_range(self, start_of_range: int) -> int:
+        return self.granularity.end_of_range(start_of_range)
+
+
+class BackfillWindowsTest(unittest.TestCase):
+    def assert_windows_cover_range(self, windows: list):
+        self.assertEqual(windows[0][0], FROM_TIMESTAMP)
+        self.assertGreaterEqual(windows[-1][1], TO_TIMESTAMP)
+        for (_, previous_end), (start, end) in zip(windows, windows[1:]):
+            self.assertEqual(previous_end, start)
+            self.assertLess(start, end)
+
+    def test_monthly_windows_advance(self):
+        statistics = FakeStatistics(MONTHLY)
+        windows = backfill_windows(statistics, FROM_TIMESTAMP, TO_TIMESTAMP)
+        self.assert_windows_cover_range(windows)
+        for _, end in windows:
+            self.assertEqual(statistics.start_of_range(end), end)
+        # Each window after the first one is exactly one month
+        for start, end in windows[1:]:
+            self.assertEqual(statistics.start_of_range(start), start)
+            self.assertEqual(statistics.end_of_range(start), end)
+        self.assertEqual(len(windows), 13)
+
+    def test_daily_windows_are_about_a_month(self):
+        windows = backfill_windows(FakeStatistics(DAILY), FROM_TIMESTAMP, TO_TIMESTAMP)
+        self.assert_windows_cover_range(windows)
+        self.assertEqual(len(windows), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+import base64
+import hashlib
+import http.server
+import json
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+import near_api
+
+from aggregations import contract_code
+from aggregations.code_cache import ContractCodeCache
+from aggregations.contract_code import (
+    ContractClassifier,
+    ContractToClassify,
+    download_contract_code,
+    get_contract_sdk_type,
+)
+
+RUST_CODE = b"\x00asm...__data_end...__heap_base..."
+JS_CODE = b"\x00asm...JS_TAG_MODULE...quickjs-libc-min...."
+
+
+# NEAR RPC answering `view_code` queries: the code is taken from `codes` by the account id.
+# The first `failures` requests of each account get HTTP 500
+class FakeRpcServer(http.server.ThreadingHTTPServer):
+    def __init__(self, codes: dict, failures: int = 0, delay_seconds: float = 0):
+        super().__init__(("127.0.0.1", 0), _FakeRpcHandler)
+        self.codes = codes
+        self.failures = failures
+        self.delay_seconds = delay_seconds
+        self.requests = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class _FakeRpcHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        account_id = request["params"]["account_id"]
+        with server.lock:
+            server.requests[account_id] = server.requests.get(account_id, 0) + 1
+            attempt = server.requests[account_id]
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if server.delay_seconds:
+                time.sleep(server.delay_seconds)
+            if attempt <= server.failures:
+                self.send_response(500)
+                self.end_headers()
+                return
+            if account_id in server.codes:
+                body = {
+                    "result": {
+                        "code_base64": base64.b64encode(
+                            server.codes[account_id]
+                        ).decode()
+                    }
+                }
+            else:
+                body = {"error": {"cause": {"name": "UNKNOWN_ACCOUNT"}}}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.mock.patch.object(contract_code, "RETRY_BASE_DELAY_SECONDS", 0.01)
+class DownloadContractCodeTest(unittest.TestCase):
+    def test_retries_until_success(self):
+        with FakeRpcServer({"app.near": RUST_CODE}, failures=2) as server:
+            with unittest.mock.patch("time.sleep") as sleep:
+                code = download_contract_code(
+                    near_api.providers.JsonProvider(server.url), "app.near", "block"
+                )
+        self.assertEqual(code, RUST_CODE)
+        self.assertEqual(server.requests, {"app.near": 3})
+        # The delay is doubled after each attempt, the jitter takes up to a half of it
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0.005 <= delays[0] <= 0.01)
+        self.assertTrue(0.01 <= delays[1] <= 0.02)
+
+    def test_gives_up_after_attempts(self):
+        with FakeRpcServer({"app.near": RUST_CODE}, failures=10) as server:
+            with self.assertRaises(Exception):
+                download_contract_code(
+                    near_api.providers.JsonProvider(server.url),
+                    "app.near",
+                    "block",
+                    attempts=3,
+                )
+        self.assertEqual(server.requests, {"app.near": 3})
+
+    def test_unknown_account_is_not_retried(self):
+        with FakeRpcServer({}) as server:
+            code = download_contract_code(
+                near_api.providers.JsonProvider(server.url), "gone.near", "block"
+            )
+        self.assertEqual(code, b"")
+        self.assertEqual(server.requests, {"gone.near": 1})
+
+
+@unittest.mock.patch.object(contract_code, "RETRY_BASE_DELAY_SECONDS", 0.01)
+class ContractClassifierTest(unittest.TestCase):
+    codes = {
+        f"app{index}.near": RUST_CODE if index % 2 else JS_CODE for index in range(8)
+    }
+    contracts = [
+        ContractToClassify(f"sha{index}", f"app{index}.near", "block")
+        for index in range(8)
+    ]
+    expected = {
+        f"sha{index}": get_contract_sdk_type(
+            RUST_CODE if index % 2 else JS_CODE, f"sha{index}"
+        )
+        for index in range(8)
+    }
+
+    def test_classifies_in_current_process(self):
+        with FakeRpcServer(self.codes, failures=1, delay_seconds=0.05) as server:
+            with ContractClassifier(
+                server.url, fetch_workers=4, classify_workers=0
+            ) as classifier:
+                result = dict(classifier.classify(self.contracts))
+        self.assertEqual(result, self.expected)
+        self.assertEqual(set(result.values()), {"RS", "JS"})
+        # The downloads go in parallel, and each of them is retried once
+        self.assertGreater(server.max_in_flight, 1)
+        self.assertEqual(set(server.requests.values()), {2})
+
+    def test_classifies_in_shared_process_pool(self):
+        with FakeRpcServer(self.codes) as server:
+            with ContractClassifier(
+                server.url, fetch_workers=4, classify_workers=2
+            ) as classifier:
+                first_pool = classifier._classify_pool
+                result = dict(classifier.classify(self.contracts))
+            with ContractClassifier(
+                server.url, fetch_workers=4, classify_workers=2
+            ) as classifier:
+                # The processes are not started again for the next store
+                self.assertIs(classifier._classify_pool, first_pool)
+                self.assertEqual(
+                    dict(classifier.classify(self.contracts[:2])),
+                    {sha: self.expected[sha] for sha in ("sha0", "sha1")},
+                )
+        self.assertEqual(result, self.expected)
+
+    def test_skips_failed_downloads(self):
+        with FakeRpcServer(self.codes, failures=10) as server:
+            with unittest.mock.patch.object(
+                contract_code, "DOWNLOAD_ATTEMPTS", 2
+            ), unittest.mock.patch("time.sleep"):
+                with ContractClassifier(
+                    server.url, fetch_workers=4, classify_workers=0
+                ) as classifier:
+                    result = list(classifier.classify(self.contracts))
+        self.assertEqual(result, [])
+
+
+class ContractCodeCacheTest(unittest.TestCase):
+    def test_base64_keys_do_not_collide(self):
+        # The keys differ only by `+` and `/`, neither is allowed in the file names as is
+        plus_sha = "a+" + base64.b64encode(b"x" * 30).decode()
+        slash_sha = "a/" + base64.b64encode(b"x" * 30).decode()
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ContractCodeCache(directory)
+            self.assertNotEqual(cache._paths(plus_sha), cache._paths(slash_sha))
+
+    def test_put_and_get_base64_key(self):
+        sha = base64.b64encode(hashlib.sha256(RUST_CODE).digest()).decode()
+        with tempfile.TemporaryDirectory() as directory:
+            ContractCodeCache(directory).put(sha, RUST_CODE)
+            self.assertEqual(ContractCodeCache(directory).get(sha), RUST_CODE)
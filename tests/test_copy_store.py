@@ -0,0 +1,95 @@
+import unittest
+
+from aggregations import DailyReceiptsPerContractCount, DeployedContracts
+from tests.fakes import FakeConnection
+
+
+class UpsertingReceiptsPerContractCount(DailyReceiptsPerContractCount):
+    @property
+    def sql_copy_on_conflict(self):
+        return """
+            ON CONFLICT (collected_for_day, contract_id) DO UPDATE SET
+                receipts_count = EXCLUDED.receipts_count
+        """
+
+
+class CopyStoreTest(unittest.TestCase):
+    def test_statements(self):
+        analytics_connection = FakeConnection()
+        statistics = DeployedContracts(analytics_connection, FakeConnection())
+        rows_count = statistics.copy_store(
+            [
+                ("sha", "alice.near", "receipt1", 1, "hash1"),
+                ("sha", "bob.near", "receipt2", 2, None),
+            ]
+        )
+        self.assertEqual(rows_count, 2)
+        columns = (
+            '"contract_code_sha256", "deployed_to_account_id", "deployed_by_receipt_id", '
+            '"deployed_at_block_timestamp", "deployed_at_block_hash"'
+        )
+        self.assertEqual(
+            analytics_connection.statements(),
+            [
+                'CREATE TEMPORARY TABLE "deployed_contracts_staging" '
+                '(LIKE "deployed_contracts" INCLUDING DEFAULTS) ON COMMIT DROP',
+                f'COPY "deployed_contracts_staging" ({columns}) FROM STDIN',
+                f'INSERT INTO "deployed_contracts" ({columns}) '
+                f'SELECT {columns} FROM "deployed_contracts_staging" ON CONFLICT DO NOTHING',
+                "COMMIT",
+            ],
+        )
+        self.assertEqual(
+            analytics_connection.log[1][1],
+            b"sha\talice.near\treceipt1\t1\thash1\nsha\tbob.near\treceipt2\t2\t\\N\n",
+        )
+
+    def test_conflict_clause_of_the_class(self):
+        analytics_connection = FakeConnection()
+        statistics = UpsertingReceiptsPerContractCount(
+            analytics_connection, FakeConnection()
+        )
+        statistics.copy_store([("2021-01-01", "app.near", 3)])
+        self.assertEqual(
+            analytics_connection.statements()[2],
+            'INSERT INTO "daily_receipts_per_contract_count" '
+            'SELECT * FROM "daily_receipts_per_contract_count_staging" '
+            "ON CONFLICT (collected_for_day, contract_id) DO UPDATE SET "
+            "receipts_count = EXCLUDED.receipts_count",
+        )
+
+    def test_other_table(self):
+        analytics_connection = FakeConnection()
+        statistics = DailyReceiptsPerContractCount(
+            analytics_connection, FakeConnection()
+        )
+        statistics.copy_store(
+            [("2021-01-01", "app.near", 3)],
+            table="daily_receipts_per_contract_count_p2021_01_rebuild",
+        )
+        self.assertTrue(
+            analytics_connection.statements()[2].startswith(
+                'INSERT INTO "daily_receipts_per_contract_count_p2021_01_rebuild" '
+            )
+        )
+
+    def test_nothing_to_store(self):
+        analytics_connection = FakeConnection()
+        statistics = DeployedContracts(analytics_connection, FakeConnection())
+        self.assertEqual(statistics.copy_store(iter([])), 0)
+        self.assertEqual(analytics_connection.log, [])
+
+    def test_failure_rolls_back(self):
+        def responder(statement, parameters):
+            if statement.lstrip().startswith("INSERT"):
+                raise RuntimeError("connection lost")
+            return []
+
+        analytics_connection = FakeConnection(responder)
+        statistics = DailyReceiptsPerContractCount(
+            analytics_connection, FakeConnection()
+        )
+        with self.assertRaises(RuntimeError):
+            statistics.copy_store([("2021-01-01", "app.near", 3)])
+        self.assertEqual(analytics_connection.statements()[-1], "ROLLBACK")
+        self.assertNotIn("COMMIT", analytics_connection.statements())
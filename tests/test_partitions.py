@@ -0,0 +1,183 @@
+import unittest
+import unittest.mock
+
+from aggregations import DailyReceiptsPerContractCount
+from aggregations.partitions import MonthlyPartitions
+from tests.fakes import FakeConnection
+
+JANUARY_2021 = 1609459200
+FEBRUARY_2021 = 1612137600
+TABLE = "daily_receipts_per_contract_count"
+
+
+def responder(partition_names):
+    def respond(statement, parameters):
+        if "FROM pg_partitioned_table" in statement:
+            return [(True,)]
+        if "FROM pg_inherits" in statement:
+            return [(name,) for name in partition_names]
+        return []
+
+    return respond
+
+
+def failing_on(prefix, partition_names):
+    respond = responder(partition_names)
+
+    def fail(statement, parameters):
+        if statement.lstrip().startswith(prefix):
+            raise RuntimeError("connection lost")
+        return respond(statement, parameters)
+
+    return fail
+
+
+# The statements without the catalog queries, they are not interesting here
+def ddl(connection) -> list:
+    return [
+        statement
+        for statement in connection.statements()
+        if "pg_partitioned_table" not in statement
+        and "pg_inherits" not in statement
+        and "pg_advisory_xact_lock" not in statement
+    ]
+
+
+class MonthlyPartitionsTest(unittest.TestCase):
+    def test_create(self):
+        analytics_connection = FakeConnection(responder([f"{TABLE}_p2021_01"]))
+        partitions = MonthlyPartitions(analytics_connection, TABLE, "collected_for_day")
+        partitions.create(JANUARY_2021, FEBRUARY_2021 + 1)
+        self.assertEqual(
+            ddl(analytics_connection),
+            [
+                f'CREATE TABLE "{TABLE}_p2021_02" PARTITION OF "{TABLE}" '
+                "FOR VALUES FROM (%(from_day)s) TO (%(to_day)s)",
+                "COMMIT",
+            ],
+        )
+        self.assertEqual(
+            analytics_connection.log[-2][1],
+            {"from_day": "2021-02-01", "to_day": "2021-03-01"},
+        )
+
+    def test_detach_before(self):
+        analytics_connection = FakeConnection(
+            responder([f"{TABLE}_p2021_01", f"{TABLE}_p2021_02", f"{TABLE}_default"])
+        )
+        partitions = MonthlyPartitions(analytics_connection, TABLE, "collected_for_day")
+        self.assertEqual(
+            partitions.detach_before(FEBRUARY_2021 + 1), [f"{TABLE}_p2021_01"]
+        )
+        self.assertEqual(
+            ddl(analytics_connection),
+            [f'ALTER TABLE "{TABLE}" DETACH PARTITION "{TABLE}_p2021_01"', "COMMIT"],
+        )
+
+    def test_identifiers_are_quoted(self):
+        analytics_connection = FakeConnection()
+        partitions = MonthlyPartitions(
+            analytics_connection, 'odd"table', "collected_for_day"
+        )
+        partitions.drop_replacement('odd"table_p2021_01_rebuild')
+        self.assertEqual(
+            analytics_connection.statements()[0],
+            'DROP TABLE IF EXISTS "odd""table_p2021_01_rebuild"',
+        )
+
+
+class RebuildPartitionTest(unittest.TestCase):
+    def rebuild(self, analytics_connection, rows):
+        statistics = DailyReceiptsPerContractCount(
+            analytics_connection, FakeConnection()
+        )
+        with unittest.mock.patch.object(
+            statistics, "iter_collect_range", return_value=rows
+        ):
+            return statistics.rebuild_partition(JANUARY_2021 + 1)
+
+    def test_swap_order(self):
+        analytics_connection = FakeConnection(responder([f"{TABLE}_p2021_01"]))
+        rows_count = self.rebuild(analytics_connection, [("2021-01-01", "app.near", 3)])
+        self.assertEqual(rows_count, 1)
+        replacement = f"{TABLE}_p2021_01_rebuild"
+        self.assertEqual(
+            ddl(analytics_connection),
+            [
+                f'DROP TABLE IF EXISTS "{replacement}"; '
+                f'CREATE TABLE "{replacement}" '
+                f'(LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES); '
+                f'ALTER TABLE "{replacement}" ADD CONSTRAINT "rebuild_range_check" '
+                'CHECK ("collected_for_day" >= %(from_day)s AND "collected_for_day" < %(to_day)s)',
+                "COMMIT",
+                f'CREATE TEMPORARY TABLE "{TABLE}_staging" '
+                f'(LIKE "{TABLE}" INCLUDING DEFAULTS) ON COMMIT DROP',
+                f'COPY "{TABLE}_staging" FROM STDIN',
+                f'INSERT INTO "{replacement}" SELECT * FROM "{TABLE}_staging" '
+                "ON CONFLICT DO NOTHING",
+                "COMMIT",
+                f'ALTER TABLE "{TABLE}" DETACH PARTITION "{TABLE}_p2021_01"; '
+                f'DROP TABLE "{TABLE}_p2021_01"',
+                f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{replacement}" '
+                "FOR VALUES FROM (%(from_day)s) TO (%(to_day)s); "
+                f'ALTER TABLE "{replacement}" RENAME TO "{TABLE}_p2021_01"; '
+                f'ALTER TABLE "{TABLE}_p2021_01" DROP CONSTRAINT "rebuild_range_check"',
+                "COMMIT",
+                # The sketch of the rebuilt day is built from the swapped partition
+                f"SELECT contract_id FROM {TABLE} "
+                "WHERE collected_for_day >= %(from_day)s AND collected_for_day < %(to_day)s",
+                "INSERT INTO distinct_count_sketches "
+                "VALUES (%(sketch_type)s, %(collected_for_day)s, %(sketch)s) "
+                "ON CONFLICT ON CONSTRAINT distinct_count_sketches_pk DO UPDATE SET sketch = EXCLUDED.sketch",
+                "COMMIT",
+            ],
+        )
+
+    def test_failed_build_keeps_the_partition(self):
+        def failing_rows():
+            yield ("2021-01-01", "app.near", 3)
+            raise RuntimeError("Indexer DB is gone")
+
+        analytics_connection = FakeConnection(responder([f"{TABLE}_p2021_01"]))
+        with self.assertRaises(RuntimeError):
+            self.rebuild(analytics_connection, failing_rows())
+        statements = ddl(analytics_connection)
+        self.assertFalse(any("DETACH" in statement for statement in statements))
+        self.assertEqual(
+            statements[-3:],
+            ["ROLLBACK", f'DROP TABLE IF EXISTS "{TABLE}_p2021_01_rebuild"', "COMMIT"],
+        )
+
+    def test_failed_attach_keeps_the_partition(self):
+        analytics_connection = FakeConnection(
+            failing_on('ALTER TABLE "' + TABLE + '" ATTACH', [f"{TABLE}_p2021_01"])
+        )
+        with self.assertRaises(RuntimeError):
+            self.rebuild(analytics_connection, [("2021-01-01", "app.near", 3)])
+        statements = ddl(analytics_connection)
+        detach = next(
+            index
+            for index, statement in enumerate(statements)
+            if "DETACH PARTITION" in statement
+        )
+        # The DETACH is never committed: the rollback attaches the old partition back
+        self.assertIn("ATTACH PARTITION", statements[detach + 1])
+        self.assertEqual(
+            statements[detach + 2 :],
+            [
+                "ROLLBACK",
+                f'DROP TABLE IF EXISTS "{TABLE}_p2021_01_rebuild"',
+                "COMMIT",
+            ],
+        )
+
+    def test_nothing_collected_keeps_the_partition(self):
+        analytics_connection = FakeConnection(responder([f"{TABLE}_p2021_01"]))
+        with self.assertRaises(ValueError):
+            self.rebuild(analytics_connection, [])
+        statements = ddl(analytics_connection)
+        self.assertFalse(any("DETACH" in statement for statement in statements))
+        self.assertEqual(
+            statements[-2:],
+            [f'DROP TABLE IF EXISTS "{TABLE}_p2021_01_rebuild"', "COMMIT"],
+        )
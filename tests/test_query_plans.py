@@ -0,0 +1,72 @@
+import json
+import unittest
+
+from aggregations import DailyActiveAccountsCount, DailyTransactionsCount
+from aggregations.query_plans import capture_query_plan
+from tests.fakes import FakeConnection
+
+TIMESTAMP = 1609459200
+PLAN = [
+    {
+        "Plan": {
+            "Node Type": "Seq Scan",
+            "Relation Name": "transactions",
+            "Shared Hit Blocks": 10,
+            "Shared Read Blocks": 5,
+        },
+        "Planning Time": 0.1,
+        "Execution Time": 2.5,
+    }
+]
+
+
+def indexer_responder(statement, parameters):
+    if statement.startswith("EXPLAIN"):
+        return [(json.dumps(PLAN),)]
+    return []
+
+
+def recorded_types(analytics_connection) -> list:
+    return [
+        parameters["statistics_type"]
+        for statement, parameters in analytics_connection.log
+        if statement.lstrip().startswith("INSERT INTO query_plans")
+    ]
+
+
+class CaptureQueryPlanTest(unittest.TestCase):
+    def capture(self, statistics_classes, captured_plans):
+        indexer_connection = FakeConnection(indexer_responder)
+        analytics_connection = FakeConnection()
+        for statistics_type, statistics_class in statistics_classes:
+            statistics = statistics_class(analytics_connection, indexer_connection)
+            self.assertEqual(
+                capture_query_plan(
+                    statistics_type, statistics, TIMESTAMP, captured_plans
+                ),
+                "",
+            )
+        explains = [
+            statement
+            for statement in indexer_connection.statements()
+            if statement.startswith("EXPLAIN")
+        ]
+        return explains, recorded_types(analytics_connection)
+
+    def test_scan_group_is_explained_once(self):
+        members = [
+            ("daily_transactions_count", DailyTransactionsCount),
+            ("daily_active_accounts_count", DailyActiveAccountsCount),
+        ]
+        explains, recorded = self.capture(members, {})
+        self.assertEqual(len(explains), 1)
+        self.assertEqual(recorded, [statistics_type for statistics_type, _ in members])
+
+    def test_without_shared_plans_each_query_is_explained(self):
+        members = [
+            ("daily_transactions_count", DailyTransactionsCount),
+            ("daily_active_accounts_count", DailyActiveAccountsCount),
+        ]
+        explains, recorded = self.capture(members, None)
+        self.assertEqual(len(explains), 2)
+        self.assertEqual(len(recorded), 2)
@@ -0,0 +1,18 @@
+import unittest
+
+from main import STATS
+from tests.fakes import FakeConnection
+
+
+class RangeQueriesTest(unittest.TestCase):
+    # `iter_collect_range` groups the rows by the period as they come
+    def test_range_queries_are_sorted(self):
+        for statistics_type, statistics_class in STATS.items():
+            statistics = statistics_class(FakeConnection(), FakeConnection())
+            for name in ("sql_select_range", "sql_rollup_select_range"):
+                query = getattr(statistics, name, None)
+                if query is None:
+                    continue
+                with self.subTest(statistics_type=statistics_type, query=name):
+                    last_line = query.strip().splitlines()[-1].strip()
+                    self.assertTrue(last_line.startswith("ORDER BY"), last_line)
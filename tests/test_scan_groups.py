@@ -0,0 +1,61 @@
+import unittest
+
+from aggregations import DailyActiveAccountsCount, DailyTransactionsCount
+from aggregations.planner import _compute_batch
+from aggregations.scan_groups import _latest_scans, clear_shared_scans
+from main import STATS
+from tests.fakes import FakeConnection
+
+PARAMETERS = {"from_timestamp": 0, "to_timestamp": 86400 * 10**9}
+
+
+def responder(statement, parameters):
+    if "FROM transactions" in statement:
+        return [(3, 2)]
+    return []
+
+
+class SharedScanTest(unittest.TestCase):
+    def setUp(self):
+        clear_shared_scans()
+
+    def tearDown(self):
+        clear_shared_scans()
+
+    # The group result is kept in memory, the streamed rows should never get there
+    def test_streaming_aggregations_are_not_members(self):
+        for statistics_type, statistics_class in STATS.items():
+            with self.subTest(statistics_type=statistics_type):
+                self.assertFalse(
+                    getattr(statistics_class, "STREAMING", False)
+                    and statistics_class.SCAN_GROUP is not None
+                )
+
+    def test_members_share_the_aggregated_scan(self):
+        indexer_connection = FakeConnection(responder)
+        transactions_count = DailyTransactionsCount(
+            FakeConnection(), indexer_connection
+        )
+        active_accounts_count = DailyActiveAccountsCount(
+            FakeConnection(), indexer_connection
+        )
+        self.assertEqual(transactions_count._select_from_indexer(PARAMETERS), [(3,)])
+        self.assertEqual(active_accounts_count._select_from_indexer(PARAMETERS), [(2,)])
+        self.assertEqual(len(indexer_connection.log), 1)
+        self.assertIn("transactions", _latest_scans)
+
+    def test_batch_clears_the_shared_scans(self):
+        indexer_connection = FakeConnection(responder)
+
+        def compute(statistics_type):
+            DailyTransactionsCount(
+                FakeConnection(), indexer_connection
+            )._select_from_indexer(PARAMETERS)
+
+        results = _compute_batch(compute, [("daily_transactions_count", [])])
+        self.assertEqual(results, [("daily_transactions_count", None)])
+        self.assertEqual(_latest_scans, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
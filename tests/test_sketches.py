@@ -0,0 +1,98 @@
+import unittest
+
+from aggregations import (
+    DailyOutgoingTransactionsPerAccountCount,
+    MonthlyActiveAccountsCount,
+)
+from aggregations.sketches import HyperLogLog, MissingSketchesError
+from tests.fakes import FakeConnection
+
+JANUARY_2022 = 1640995200
+FEBRUARY_2022 = 1643673600
+TABLE = "daily_outgoing_transactions_per_account_count"
+
+
+def january_days(*days) -> list:
+    return [f"2022-01-{day:02}" for day in days]
+
+
+def responder(sketch_days, stored_days=()):
+    sketch = HyperLogLog()
+    sketch.update(["alice.near", "bob.near"])
+
+    def respond(statement, parameters):
+        if "SELECT collected_for_day FROM distinct_count_sketches" in " ".join(
+            statement.split()
+        ):
+            return [(day,) for day in sketch_days]
+        if "SELECT sketch" in statement:
+            return [(sketch.to_bytes(),) for _ in sketch_days]
+        if "SELECT MIN(" in statement:
+            return (
+                [(min(stored_days), max(stored_days))]
+                if stored_days
+                else [(None, None)]
+            )
+        if "UNNEST" in statement:
+            return [(day,) for day in parameters["days"] if day in stored_days]
+        return []
+
+    return respond
+
+
+class MonthlyActiveAccountsTest(unittest.TestCase):
+    def collect(self, analytics_connection):
+        statistics = MonthlyActiveAccountsCount(analytics_connection, FakeConnection())
+        statistics.is_indexer_ready = lambda timestamp: True
+        return statistics.collect(JANUARY_2022 + 1)
+
+    def test_estimated_from_the_whole_month(self):
+        analytics_connection = FakeConnection(responder(january_days(*range(1, 32))))
+        self.assertEqual(self.collect(analytics_connection), [("2022-01-01", 2)])
+
+    def test_missing_days_are_not_estimated(self):
+        analytics_connection = FakeConnection(responder(january_days(*range(1, 30))))
+        with self.assertRaises(MissingSketchesError) as error:
+            self.collect(analytics_connection)
+        self.assertIn("[2022-01-30 2022-01-31]", str(error.exception))
+        self.assertFalse(
+            any(
+                "SELECT sketch" in statement
+                for statement in analytics_connection.statements()
+            )
+        )
+
+
+class BuildMissingSketchesTest(unittest.TestCase):
+    def test_builds_the_stored_days_only(self):
+        # The 3rd day has no sketch and the 4th one was never collected
+        analytics_connection = FakeConnection(
+            responder(january_days(1, 2, 5), stored_days=january_days(1, 2, 3, 5))
+        )
+        statistics = DailyOutgoingTransactionsPerAccountCount(
+            analytics_connection, FakeConnection()
+        )
+        self.assertEqual(statistics.build_missing_sketches(), ["2022-01-03"])
+        self.assertEqual(analytics_connection.log[2][1], {"days": january_days(3, 4)})
+        self.assertEqual(
+            analytics_connection.statements()[3],
+            f"SELECT account_id FROM {TABLE} "
+            "WHERE collected_for_day >= %(from_day)s AND collected_for_day < %(to_day)s",
+        )
+        self.assertEqual(
+            analytics_connection.log[3][1],
+            {
+                "from_timestamp": 1641168000000000000,
+                "to_timestamp": 1641254400000000000,
+                "from_day": "2022-01-03",
+                "to_day": "2022-01-04",
+            },
+        )
+
+    def test_empty_table(self):
+        analytics_connection = FakeConnection(responder([]))
+        statistics = DailyOutgoingTransactionsPerAccountCount(
+            analytics_connection, FakeConnection()
+        )
+        self.assertEqual(statistics.build_missing_sketches(), [])
+        self.assertEqual(len(analytics_connection.log), 1)